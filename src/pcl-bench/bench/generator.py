@@ -0,0 +1,118 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+
+
+class Shape(object):
+    """The size and shape of a synthetic PCL pipeline: the number of leaf components imported by the node component, the number of declarations in it, the depth of >>> and &&& nesting in its expression, the number of if expressions its expression is nested in, and, in each leaf, the number of commands in the do block and the number of let commands after them."""
+    def __init__(self, no_imports = 4, no_declarations = 8, depth = 4, no_node_ifs = 1, do_length = 10, no_lets = 1):
+        self.no_imports = max(1, no_imports)
+        self.no_declarations = max(1, no_declarations)
+        self.depth = max(0, depth)
+        self.no_node_ifs = max(0, no_node_ifs)
+        self.do_length = max(1, do_length)
+        self.no_lets = max(0, no_lets)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def generate_leaf(name, shape):
+    """Returns the source of a leaf component, with input and output a, whose do block is shaped as given."""
+    lines = ["import pcl.util.list as list",
+             "",
+             "component %s" % name,
+             "  input a",
+             "  output a",
+             "  do",
+             "    v0 <- list.cons(a)"]
+    for i in xrange(1, shape.do_length):
+        fn = "list.cons" if i % 2 == 0 else "list.head"
+        lines.append("    v%d <- %s(v%d)" % (i, fn, i - 1))
+    result = "v%d" % (shape.do_length - 1)
+
+    # pclc cannot generate if commands in do blocks, nor name the do block's
+    # variables in let commands, so lets are bound from the component's input
+    for i in xrange(shape.no_lets):
+        lines.extend(["    x%d <- let" % i,
+                      "            w <- list.cons(a)",
+                      "          in",
+                      "            list.head(w)"])
+        result = "x%d" % i
+    lines.extend(["", "    return a <- %s" % result, ""])
+    return "\n".join(lines)
+
+
+def __expression(shape, depth, counter):
+    if depth == 0:
+        name = "c%d" % (counter[0] % shape.no_declarations)
+        counter[0] += 1
+        return name
+
+    left = __expression(shape, depth - 1, counter)
+    right = __expression(shape, depth - 1, counter)
+    if depth % 2 == 0:
+        return "(%s >>> %s)" % (left, right)
+    # Fan out and merge the tuple of outputs back into a
+    return "((%s &&& %s) >>> merge top[a] -> a, bottom[a] -> _)" % (left, right)
+
+
+def generate_node(name, leaf_names, shape):
+    """Returns the source of a node component, with input and output a, which declares and composes the leaf components as shaped."""
+    lines = ["import %s as %s" % (leaf, leaf) for leaf in leaf_names]
+    lines.extend(["",
+                  "component %s" % name,
+                  "  input a",
+                  "  output a"])
+    if shape.no_node_ifs > 0:
+        lines.append("  configuration flag")
+    lines.append("  declare")
+    for i in xrange(shape.no_declarations):
+        lines.append("    c%d := new %s" % (i, leaf_names[i % len(leaf_names)]))
+    lines.append("  as")
+
+    # Use every declaration at least once
+    counter = [0]
+    depth = shape.depth
+    while 2 ** depth < shape.no_declarations:
+        depth += 1
+    expressions = [__expression(shape, depth, counter) for i in xrange(shape.no_node_ifs + 1)]
+    expression = expressions[-1]
+    for i, then_expression in enumerate(reversed(expressions[:-1])):
+        expression = "(if @flag == %s %s %s)" % ("True" if i % 2 == 0 else "False", then_expression, expression)
+    lines.extend(["    %s" % expression, ""])
+    return "\n".join(lines)
+
+
+def generate_pipeline(directory, shape, name = "pipeline"):
+    """Writes the PCL files of a synthetic pipeline to a directory. Returns the leaf component files, which must be compiled first, and the node component file."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    leaf_names = ["%s_leaf_%d" % (name, i) for i in xrange(shape.no_imports)]
+    leaf_filenames = list()
+    for leaf_name in leaf_names:
+        leaf_filenames.append(os.path.join(directory, "%s.pcl" % leaf_name))
+        with open(leaf_filenames[-1], "w") as f:
+            f.write(generate_leaf(leaf_name, shape))
+
+    node_filename = os.path.join(directory, "%s.pcl" % name)
+    with open(node_filename, "w") as f:
+        f.write(generate_node(name, leaf_names, shape))
+    return (leaf_filenames, node_filename)
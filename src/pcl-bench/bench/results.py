@@ -0,0 +1,83 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import json
+import os
+import platform
+import subprocess
+import time
+
+
+def get_commit():
+    """Returns the commit the benchmarks are run on, or None outside a git working copy."""
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                           cwd = os.path.dirname(os.path.abspath(__file__)),
+                                           stderr = devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_report(suite, parameters, results):
+    """Returns a benchmark report: the results, keyed by benchmark name, and what they were measured with."""
+    return {'suite' : suite,
+            'commit' : get_commit(),
+            'time' : time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python' : platform.python_version(),
+            'platform' : platform.platform(),
+            'parameters' : parameters,
+            'results' : results}
+
+
+def write_report(report, filename):
+    with open(filename, "w") as f:
+        json.dump(report, f, indent = 2, sort_keys = True)
+
+
+def read_report(filename):
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, report, tolerance):
+    """Compares the measurements in a report with a baseline. A measurement regresses if it is more than tolerance, a fraction, greater than the baseline's. Returns a list of (benchmark, measurement, baseline value, value, ratio, is regression) tuples for the measurements in both."""
+    comparisons = list()
+    for name in sorted(report['results']):
+        if name not in baseline['results']:
+            continue
+        measurements = report['results'][name]
+        baseline_measurements = baseline['results'][name]
+        for measurement in sorted(measurements):
+            value = measurements[measurement]
+            baseline_value = baseline_measurements.get(measurement)
+            if not isinstance(value, (int, long, float)) or \
+               not isinstance(baseline_value, (int, long, float)) or \
+               baseline_value <= 0:
+                continue
+            ratio = float(value) / baseline_value
+            comparisons.append((name, measurement, baseline_value, value, ratio, ratio > 1.0 + tolerance))
+    return comparisons
+
+
+def format_comparisons(comparisons):
+    lines = list()
+    for name, measurement, baseline_value, value, ratio, is_regression in comparisons:
+        lines.append("%-40s %-20s %12.6g %12.6g %7.2fx%s" % \
+                     (name, measurement, baseline_value, value, ratio, "  REGRESSION" if is_regression else ""))
+    return "\n".join(lines)
@@ -0,0 +1,145 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+
+
+#
+# Small PCL pipelines, each dominated by one kind of arrow combinator. Every
+# pipeline has input and output a, and is built from leaf components which
+# do nothing but return their input, so evaluation time is the combinators'.
+#
+__IDENTITY_LEAF = """component %(name)s
+  input a
+  output a
+  do
+    return a <- a
+"""
+
+__SCOPED_LEAF = """component %(name)s
+  input a
+  output a
+  configuration x
+  do
+    return a <- a
+"""
+
+
+def __node(name, expression, declarations = (), imports = (), configuration = None):
+    lines = ["import %s as %s" % (i, i) for i in imports]
+    lines.extend(["", "component %s" % name, "  input a", "  output a"])
+    if configuration:
+        lines.append("  configuration %s" % configuration)
+    if declarations:
+        lines.append("  declare")
+        lines.extend(["    %s" % d for d in declarations])
+    lines.extend(["  as", "    %s" % expression, ""])
+    return (name, "\n".join(lines))
+
+
+def __fanout(names):
+    if len(names) == 1:
+        return names[0]
+    middle = len(names) // 2
+    return "((%s &&& %s) >>> merge top[a] -> a, bottom[a] -> _)" % (__fanout(names[:middle]), __fanout(names[middle:]))
+
+
+def composition_chain(size):
+    """size identity components composed with >>>."""
+    names = ["c%d" % i for i in xrange(size)]
+    return ({'bench_identity' : __IDENTITY_LEAF % {'name' : 'bench_identity'}},
+            __node("bench_chain",
+                   " >>> ".join(names),
+                   ["%s := new bench_identity" % n for n in names],
+                   ["bench_identity"]))
+
+
+def fanout(size):
+    """size identity components evaluated in parallel with &&&, merged back pairwise."""
+    names = ["c%d" % i for i in xrange(size)]
+    return ({'bench_identity' : __IDENTITY_LEAF % {'name' : 'bench_identity'}},
+            __node("bench_fanout",
+                   __fanout(names),
+                   ["%s := new bench_identity" % n for n in names],
+                   ["bench_identity"]))
+
+
+def wire_glue(size):
+    """size wires, renaming a to b and back again."""
+    wires = ["wire a -> b" if i % 2 == 0 else "wire b -> a" for i in xrange(size + size % 2)]
+    return (dict(), __node("bench_wires", " >>> ".join(wires)))
+
+
+def split_merge_glue(size):
+    """size repetitions of split, parallel wires and merge."""
+    glue = "(split >>> (wire a -> a *** wire a -> b) >>> merge top[a] -> a, bottom[b] -> _)"
+    return (dict(), __node("bench_split_merge", " >>> ".join([glue] * size)))
+
+
+def state_mapping(size):
+    """size components, each declared with a configuration mapping, composed with >>>."""
+    names = ["c%d" % i for i in xrange(size)]
+    return ({'bench_scoped' : __SCOPED_LEAF % {'name' : 'bench_scoped'}},
+            __node("bench_state_mapping",
+                   " >>> ".join(names),
+                   ["%s := new bench_scoped with x -> x" % n for n in names],
+                   ["bench_scoped"],
+                   "x"))
+
+
+def nested_imports(size):
+    """size node components, each declaring the one below with a configuration mapping, above a leaf component."""
+    levels = [('bench_scoped', __SCOPED_LEAF % {'name' : 'bench_scoped'})]
+    for i in xrange(1, size):
+        levels.append(__node("bench_level_%d" % i,
+                             "c",
+                             ["c := new %s with x -> x" % levels[-1][0]],
+                             [levels[-1][0]],
+                             "x"))
+    return (levels,
+            __node("bench_nested_imports",
+                   "c",
+                   ["c := new %s with x -> x" % levels[-1][0]],
+                   [levels[-1][0]],
+                   "x"))
+
+
+SHAPES = (('composition_chain', composition_chain),
+          ('fanout', fanout),
+          ('wire_glue', wire_glue),
+          ('split_merge_glue', split_merge_glue),
+          ('state_mapping', state_mapping),
+          ('nested_imports', nested_imports))
+
+
+def write_shape(directory, shape_fn, size):
+    """Writes a shape's PCL files to a directory. Returns the imported component files, to be compiled first, and the pipeline's module name and file. Shapes give their imported components in a dictionary, or, if they import each other, in a list in compilation order."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    leaves, (module_name, node_source) = shape_fn(size)
+
+    leaf_filenames = list()
+    for name, source in (sorted(leaves.iteritems()) if isinstance(leaves, dict) else leaves):
+        leaf_filenames.append(os.path.join(directory, "%s.pcl" % name))
+        with open(leaf_filenames[-1], "w") as f:
+            f.write(source)
+
+    node_filename = os.path.join(directory, "%s.pcl" % module_name)
+    with open(node_filename, "w") as f:
+        f.write(node_source)
+    return (leaf_filenames, module_name, node_filename)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from optparse import OptionParser
+
+__SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path[1:1] = [os.path.join(__SRC_DIR, "pclc"), os.path.join(__SRC_DIR, "pcl-run"), os.path.join(__SRC_DIR, "runtime")]
+
+from bench.results import make_report, write_report, read_report, compare_reports, format_comparisons
+from bench.shapes import SHAPES, write_shape
+from build.compiler import CompilerError, compile_component
+from concurrent.futures import ThreadPoolExecutor
+from runner.runner import load_pipeline
+
+
+class CountingExecutor(object):
+    """Passes work on to an executor, counting the tasks submitted, i.e., the hand-offs between threads."""
+    def __init__(self, executor):
+        self.__executor = executor
+        self.__lock = threading.Lock()
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self.__lock:
+            self.submitted += 1
+        return self.__executor.submit(fn, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.__executor, name)
+
+
+def compile_shape(directory, shape_fn, size):
+    """Writes and compiles a shape. Returns the pipeline's module name."""
+    leaf_filenames, module_name, node_filename = write_shape(directory, shape_fn, size)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        for pcl_filename in leaf_filenames + [node_filename]:
+            compile_component(os.path.basename(pcl_filename), ".", "bench")
+    finally:
+        os.chdir(cwd)
+    return module_name
+
+
+def forget_shape_modules():
+    """Forgets the modules of previously compiled shapes, which share names with the next."""
+    for module in [m for m in sys.modules if m.startswith("bench_")]:
+        del sys.modules[module]
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure_pipeline(pipeline, executor, no_invocations):
+    """Evaluates a pipeline no_invocations times, one after another. Returns the latency percentiles and mean, in microseconds, the tasks handed to the executor and the objects retained per invocation."""
+    inputs = {'a' : 1}
+    for i in xrange(min(10, no_invocations)):
+        pipeline.run(inputs)
+
+    latencies = list()
+    gc.collect()
+    no_objects = len(gc.get_objects())
+    submitted = executor.submitted
+    for i in xrange(no_invocations):
+        start = time.time()
+        pipeline.run(inputs)
+        latencies.append((time.time() - start) * 1e6)
+    no_handoffs = executor.submitted - submitted
+    gc.collect()
+    no_retained = len(gc.get_objects()) - no_objects
+
+    latencies.sort()
+    return {'mean_us' : sum(latencies) / len(latencies),
+            'p50_us' : percentile(latencies, 0.5),
+            'p90_us' : percentile(latencies, 0.9),
+            'p99_us' : percentile(latencies, 0.99),
+            'handoffs_per_invocation' : float(no_handoffs) / no_invocations,
+            'retained_objects_per_invocation' : float(no_retained) / no_invocations}
+
+
+if __name__ == '__main__':
+    parser = OptionParser("Usage: %prog [options] [shape...]")
+    parser.add_option("-s",
+                      "--sizes",
+                      default = "1,8,64",
+                      dest = "sizes",
+                      help = "comma separated numbers of combinators in each shape [default: %default]")
+    parser.add_option("-n",
+                      "--invocations",
+                      type = "int",
+                      default = 1000,
+                      dest = "no_invocations",
+                      help = "number of evaluations of each pipeline [default: %default]")
+    parser.add_option("-w",
+                      "--workers",
+                      type = "int",
+                      default = 4,
+                      dest = "no_workers",
+                      help = "number of evaluation worker threads [default: %default]")
+    parser.add_option("-o",
+                      "--output",
+                      default = None,
+                      dest = "output_filename",
+                      help = "write the results, as JSON, to this file")
+    parser.add_option("-b",
+                      "--baseline",
+                      default = None,
+                      dest = "baseline_filename",
+                      help = "compare the results with those in this file, exiting with status 1 on a regression")
+    parser.add_option("-t",
+                      "--tolerance",
+                      type = "float",
+                      default = 0.1,
+                      dest = "tolerance",
+                      help = "fraction by which a measurement may exceed the baseline [default: %default]")
+    (options, args) = parser.parse_args()
+
+    shapes = [(name, fn) for name, fn in SHAPES if not args or name in args]
+    if not shapes:
+        print >> sys.stderr, "ERROR: Unknown shapes; choose from %s" % ", ".join([name for name, fn in SHAPES])
+        sys.exit(2)
+    sizes = [max(1, int(s)) for s in options.sizes.split(",") if s]
+
+    directory = tempfile.mkdtemp(prefix = "pcl-bench-")
+    sys.path.insert(0, directory)
+    executor = CountingExecutor(ThreadPoolExecutor(max_workers = max(1, options.no_workers)))
+    results = dict()
+    try:
+        for name, shape_fn in shapes:
+            for size in sizes:
+                # Each shape and size is compiled to its own directory, so
+                # modules of the same name are not confused
+                shape_directory = os.path.join(directory, "%s_%d" % (name, size))
+                sys.path[0] = shape_directory
+                forget_shape_modules()
+                try:
+                    module_name = compile_shape(shape_directory, shape_fn, size)
+                except CompilerError as ex:
+                    print >> sys.stderr, "ERROR: Failed to compile %s: %s" % (name, "\n".join(ex.messages))
+                    sys.exit(1)
+                forget_shape_modules()
+
+                start = time.time()
+                pipeline = load_pipeline(executor, shape_directory, module_name, lambda keys: dict([(k, 1) for k in keys]))
+                construction_time = time.time() - start
+
+                measurements = measure_pipeline(pipeline, executor, max(1, options.no_invocations))
+                measurements['construction_ms'] = construction_time * 1000.0
+                measurements['per_combinator_us'] = measurements['mean_us'] / size
+                results["%s_%d" % (name, size)] = measurements
+                print "%-24s mean %9.1fus  p50 %9.1fus  p99 %9.1fus  %6.1f hand-offs  %6.1f objects retained" % \
+                      ("%s_%d" % (name, size),
+                       measurements['mean_us'],
+                       measurements['p50_us'],
+                       measurements['p99_us'],
+                       measurements['handoffs_per_invocation'],
+                       measurements['retained_objects_per_invocation'])
+    finally:
+        executor.shutdown(True)
+        shutil.rmtree(directory, ignore_errors = True)
+
+    report = make_report("combinators",
+                         {'sizes' : sizes, 'invocations' : options.no_invocations, 'workers' : options.no_workers},
+                         results)
+    if options.output_filename:
+        write_report(report, options.output_filename)
+
+    if options.baseline_filename:
+        comparisons = compare_reports(read_report(options.baseline_filename), report, options.tolerance)
+        print format_comparisons(comparisons)
+        if [c for c in comparisons if c[-1]]:
+            sys.exit(1)
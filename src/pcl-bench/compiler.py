@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pclc"))
+
+from bench.generator import Shape, generate_pipeline
+from bench.results import make_report, write_report, read_report, compare_reports, format_comparisons
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def compile_leaves(leaf_filenames):
+    """Compiles the leaf components, which the node component imports."""
+    from build.compiler import CompilerError, compile_component
+
+    os.chdir(os.path.dirname(leaf_filenames[0]))
+    for leaf_filename in leaf_filenames:
+        try:
+            compile_component(os.path.basename(leaf_filename), ".", "bench")
+        except CompilerError as ex:
+            raise BenchmarkError("\n".join(ex.messages) or "Failed to parse %s" % leaf_filename)
+
+
+def measure_compilation(pcl_filename, no_repeats):
+    """Compiles a PCL file no_repeats times and returns the fastest time, in seconds, of each phase, the number of tokens and the peak memory used, in kilobytes."""
+    from parser.executor import Executor
+    from parser.helpers import parse_component
+    from parser.pcl_lexer import PCLLexer
+    from visitors.first_pass_resolver_visitor import FirstPassResolverVisitor
+    from visitors.second_pass_resolver_visitor import SecondPassResolverVisitor
+    from visitors.third_pass_resolver_visitor import ThirdPassResolverVisitor
+
+    os.chdir(os.path.dirname(pcl_filename))
+    pcl_filename = os.path.basename(pcl_filename)
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(pcl_filename, "r") as f:
+        source = f.read()
+    lexer = PCLLexer(logging.getLogger(), optimize = 1)
+    output_root = "____bench_%s" % pcl_filename.split(".")[0]
+
+    best = dict()
+    for i in xrange(no_repeats):
+        times = list()
+
+        start = time.time()
+        lexer.input(source)
+        no_tokens = 0
+        while lexer.token():
+            no_tokens += 1
+        times.append(('lex', time.time() - start))
+
+        # Parsing includes the lexing it drives
+        start = time.time()
+        ast = parse_component(pcl_filename, "WARN")
+        times.append(('parse', time.time() - start))
+        if not ast:
+            raise BenchmarkError("Failed to parse %s" % pcl_filename)
+
+        for name, visitor in (('resolve_first_pass', FirstPassResolverVisitor(".")),
+                              ('resolve_second_pass', SecondPassResolverVisitor()),
+                              ('resolve_third_pass', ThirdPassResolverVisitor())):
+            start = time.time()
+            ast.accept(visitor)
+            times.append((name, time.time() - start))
+            if visitor.has_errors():
+                raise BenchmarkError("\n".join(visitor.get_errors()))
+
+        start = time.time()
+        Executor(output_root).execute(ast)
+        times.append(('codegen', time.time() - start))
+        os.unlink(output_root + ".py")
+
+        times.append(('total', sum([t for name, t in times if name != 'lex'])))
+        for name, t in times:
+            if name not in best or t < best[name]:
+                best[name] = t
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best['tokens'] = no_tokens
+    best['peak_rss_kb'] = peak_rss
+    best['rss_growth_kb'] = peak_rss - start_rss
+    return best
+
+
+def in_child_process(fn, *args):
+    # A fresh process for each measurement, so peak memory is the measurement's
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(fn, args)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+if __name__ == '__main__':
+    parser = OptionParser("Usage: %prog [options]")
+    parser.add_option("--imports",
+                      type = "int",
+                      default = 4,
+                      dest = "no_imports",
+                      help = "number of leaf components imported by the pipeline [default: %default]")
+    parser.add_option("--declarations",
+                      type = "int",
+                      default = 8,
+                      dest = "no_declarations",
+                      help = "number of component declarations in the pipeline [default: %default]")
+    parser.add_option("--depth",
+                      type = "int",
+                      default = 4,
+                      dest = "depth",
+                      help = "depth of >>> and &&& nesting in the pipeline [default: %default]")
+    parser.add_option("--ifs",
+                      type = "int",
+                      default = 1,
+                      dest = "no_node_ifs",
+                      help = "number of nested if expressions in the pipeline [default: %default]")
+    parser.add_option("--do-length",
+                      type = "int",
+                      default = 10,
+                      dest = "do_length",
+                      help = "number of commands in each leaf component's do block [default: %default]")
+    parser.add_option("--lets",
+                      type = "int",
+                      default = 1,
+                      dest = "no_lets",
+                      help = "number of let commands in each leaf component [default: %default]")
+    parser.add_option("-r",
+                      "--repeats",
+                      type = "int",
+                      default = 5,
+                      dest = "no_repeats",
+                      help = "number of compilations of each file; the fastest is reported [default: %default]")
+    parser.add_option("-o",
+                      "--output",
+                      default = None,
+                      dest = "output_filename",
+                      help = "write the results, as JSON, to this file")
+    parser.add_option("-b",
+                      "--baseline",
+                      default = None,
+                      dest = "baseline_filename",
+                      help = "compare the results with those in this file, exiting with status 1 on a regression")
+    parser.add_option("-t",
+                      "--tolerance",
+                      type = "float",
+                      default = 0.1,
+                      dest = "tolerance",
+                      help = "fraction by which a measurement may exceed the baseline [default: %default]")
+    parser.add_option("-k",
+                      "--keep",
+                      default = None,
+                      dest = "keep_dir",
+                      help = "generate the PCL files in this directory, and keep them")
+    (options, args) = parser.parse_args()
+
+    shape = Shape(options.no_imports,
+                  options.no_declarations,
+                  options.depth,
+                  options.no_node_ifs,
+                  options.do_length,
+                  options.no_lets)
+    directory = os.path.abspath(options.keep_dir) if options.keep_dir else tempfile.mkdtemp(prefix = "pcl-bench-")
+    try:
+        leaf_filenames, node_filename = generate_pipeline(directory, shape)
+        try:
+            in_child_process(compile_leaves, leaf_filenames)
+            results = {'leaf' : in_child_process(measure_compilation, leaf_filenames[0], max(1, options.no_repeats)),
+                       'node' : in_child_process(measure_compilation, node_filename, max(1, options.no_repeats))}
+        except BenchmarkError as ex:
+            print >> sys.stderr, "ERROR: %s" % ex
+            sys.exit(1)
+    finally:
+        if not options.keep_dir:
+            shutil.rmtree(directory, ignore_errors = True)
+
+    for name in sorted(results):
+        measurements = results[name]
+        print "%s: %d tokens, peak RSS %dKB" % (name, measurements['tokens'], measurements['peak_rss_kb'])
+        for phase in ('lex', 'parse', 'resolve_first_pass', 'resolve_second_pass', 'resolve_third_pass', 'codegen', 'total'):
+            print "  %-20s %9.3fms" % (phase, measurements[phase] * 1000.0)
+
+    report = make_report("compiler", {'shape' : shape.to_dict(), 'repeats' : options.no_repeats}, results)
+    if options.output_filename:
+        write_report(report, options.output_filename)
+
+    if options.baseline_filename:
+        comparisons = compare_reports(read_report(options.baseline_filename), report, options.tolerance)
+        print format_comparisons(comparisons)
+        if [c for c in comparisons if c[-1]]:
+            sys.exit(1)
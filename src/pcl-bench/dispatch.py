@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import sys
+import time
+
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pclc"))
+
+import visitors.multimethod
+
+from visitors.multimethod import multimethod, multimethodclass
+
+
+#
+# A synthetic AST, shaped like the PCL one: nodes accept a visitor, visit
+# their children first and then themselves
+#
+class Node(object):
+    def __init__(self, children):
+        self.children = children
+
+    def accept(self, visitor):
+        for child in self.children:
+            child.accept(visitor)
+        visitor.visit(self)
+
+NODE_CLASSES = [type("Node%d" % i, (Node,), {}) for i in xrange(24)]
+
+
+def build_tree(no_nodes, fan_out):
+    """Builds a tree of about no_nodes nodes, of mixed classes, with the given number of children per node."""
+    nodes = [NODE_CLASSES[i % len(NODE_CLASSES)]([]) for i in xrange(no_nodes)]
+    for i, node in enumerate(nodes):
+        node.children = nodes[i * fan_out + 1:(i + 1) * fan_out + 1]
+    return nodes[0]
+
+
+def uncached_multimethod(*types):
+    """The multi-method decorator as it was before dispatch was memoised: every call walks the target's class hierarchy."""
+    def decorator(method):
+        multimethod(*types)(method)
+        def wrapper(target_obj, *args, **kwargs):
+            registry = visitors.multimethod.registry
+            for klass in target_obj.__class__.__mro__:
+                keys = tuple([klass] + [arg.__class__ for arg in args])
+                if registry.has_key(keys):
+                    return registry[keys](target_obj, *args, **kwargs)
+            raise LookupError("Method not registered on class %s for type %s" % \
+                              (type(target_obj), [arg.__class__ for arg in args]))
+        return wrapper
+    return decorator
+
+
+class BaseVisitor(object):
+    def __init__(self):
+        self.count = 0
+
+
+def __make_visitor_class(name, decorator):
+    # One visit method per node class, as the resolver visitors have
+    namespace = {'__init__' : lambda self: BaseVisitor.__init__(self)}
+    for i, node_class in enumerate(NODE_CLASSES):
+        def visit(self, node):
+            self.count += 1
+        namespace["visit%d" % i] = decorator(node_class)(visit)
+    namespace['visit'] = namespace["visit%d" % (len(NODE_CLASSES) - 1)]
+    return multimethodclass(type(name, (BaseVisitor,), namespace))
+
+Visitor = __make_visitor_class("Visitor", multimethod)
+UncachedVisitor = __make_visitor_class("UncachedVisitor", uncached_multimethod)
+
+
+def time_visits(visitor_class, tree, no_repeats):
+    """Returns the best time, in seconds, of no_repeats walks of the tree and the number of nodes visited."""
+    best = None
+    for i in xrange(no_repeats):
+        visitor = visitor_class()
+        start = time.time()
+        tree.accept(visitor)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return (best, visitor.count)
+
+
+if __name__ == '__main__':
+    parser = OptionParser("Usage: %prog [options]")
+    parser.add_option("-n",
+                      "--nodes",
+                      type = "int",
+                      default = 100000,
+                      dest = "no_nodes",
+                      help = "number of nodes in the synthetic AST [default: %default]")
+    parser.add_option("--fan-out",
+                      type = "int",
+                      default = 3,
+                      dest = "fan_out",
+                      help = "number of children per node [default: %default]")
+    parser.add_option("-r",
+                      "--repeats",
+                      type = "int",
+                      default = 5,
+                      dest = "no_repeats",
+                      help = "number of walks of the AST; the fastest is reported [default: %default]")
+    (options, args) = parser.parse_args()
+
+    tree = build_tree(max(1, options.no_nodes), max(1, options.fan_out))
+    uncached_time, no_visits = time_visits(UncachedVisitor, tree, max(1, options.no_repeats))
+    cached_time, no_visits = time_visits(Visitor, tree, max(1, options.no_repeats))
+
+    print "Nodes visited:      %d" % no_visits
+    print "Uncached dispatch:  %.3fs (%.2fus per visit)" % (uncached_time, uncached_time * 1e6 / no_visits)
+    print "Memoised dispatch:  %.3fs (%.2fus per visit)" % (cached_time, cached_time * 1e6 / no_visits)
+    print "Speed up:           %.2fx" % (uncached_time / cached_time)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import ConfigParser
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from optparse import OptionParser
+
+__SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path[1:1] = [os.path.join(__SRC_DIR, "pclc"), os.path.join(__SRC_DIR, "pcl-run"), os.path.join(__SRC_DIR, "runtime")]
+
+from build.make import MakeError, make
+from concurrent.futures import ThreadPoolExecutor
+from examples import DEFAULT_EXAMPLES_DIR, find_examples, suppress_output
+from runner import configuration as config_file
+from runner.runner import get_default_worker_count, import_module, load_pipeline
+
+
+class EquivalenceError(Exception):
+    pass
+
+
+def count_arrows(arrow_graph):
+    """Returns the number of arrows in a compiled component's arrow graph. Leaf components have no arrow graph."""
+    if arrow_graph is None:
+        return 0
+    return 1 + sum([count_arrows(g) for g in arrow_graph[1:] if isinstance(g, tuple)])
+
+
+def evaluate_example(directory, module_name, input_overrides):
+    """Loads an example pipeline, as pcl-run does, and evaluates it once. Returns the outputs and the component's arrow graph."""
+    try:
+        return _evaluate_example(directory, module_name, input_overrides)
+    except Exception as ex:
+        # Not every exception can be passed back from the child process
+        raise EquivalenceError("%s: %s" % (ex.__class__.__name__, ex))
+
+
+def _evaluate_example(directory, module_name, input_overrides):
+    suppress_output()
+    os.chdir(directory)
+    config_filename = "%s.cfg" % module_name
+    config_parser = ConfigParser.ConfigParser()
+    config_parser.read(config_filename)
+    for key, value in input_overrides:
+        if config_parser.has_option('Inputs', key):
+            config_parser.set('Inputs', key, value)
+
+    pcl = import_module(directory, module_name)
+    executor = ThreadPoolExecutor(max_workers = get_default_worker_count(pcl))
+    try:
+        pipeline = load_pipeline(executor,
+                                 directory,
+                                 module_name,
+                                 lambda keys: dict([(k, config_file.get_configuration(config_parser, config_filename, k)) \
+                                                    for k in keys]))
+        inputs = config_file.get_input_values(config_parser, config_filename, pipeline.get_inputs())
+        outputs = pipeline.run(inputs)
+    finally:
+        executor.shutdown(True)
+
+    return (outputs, getattr(pcl, "get_arrow_graph", lambda: None)())
+
+
+def compile_and_evaluate(directory, pcl_filename, input_overrides, **executor_options):
+    """Compiles an example, and everything it imports, in a copy of its directory and evaluates it in a fresh process. Executor options are passed on to the compiler."""
+    work_dir = tempfile.mkdtemp(prefix = "pcl-equivalence-")
+    try:
+        example_dir = os.path.join(work_dir, os.path.basename(directory))
+        shutil.copytree(directory, example_dir)
+        pcl_filename = os.path.join(example_dir, os.path.basename(pcl_filename))
+
+        cwd = os.getcwd()
+        try:
+            make(pcl_filename, example_dir, "equivalence", "WARN", 1, True, **executor_options)
+        except MakeError as ex:
+            raise EquivalenceError("\n".join(ex.messages))
+        finally:
+            os.chdir(cwd)
+
+        pool = multiprocessing.Pool(1)
+        try:
+            return pool.apply(evaluate_example,
+                              (example_dir,
+                               os.path.basename(pcl_filename)[:-len(".pcl")],
+                               input_overrides))
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors = True)
+
+
+if __name__ == '__main__':
+    parser = OptionParser("Usage: %prog [options] [example...]\n\n" \
+                          "Checks that the examples compiled with, and without, pclc -O evaluate to the same outputs.")
+    parser.add_option("-L",
+                      "--link",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_linked",
+                      help = "also link the examples compiled with -O, inlining the PCL components they import")
+    parser.add_option("-d",
+                      "--examples-dir",
+                      default = DEFAULT_EXAMPLES_DIR,
+                      dest = "examples_dir",
+                      help = "directory of examples, one per sub-directory [default: the repository's examples]")
+    parser.add_option("-i",
+                      "--input",
+                      action = "append",
+                      default = [],
+                      dest = "input_overrides",
+                      metavar = "KEY=VALUE",
+                      help = "override an input in the examples' configuration files, e.g., sleep_time=2")
+    (options, args) = parser.parse_args()
+
+    input_overrides = list()
+    for override in options.input_overrides:
+        if "=" not in override:
+            print >> sys.stderr, "ERROR: Input override %s should be KEY=VALUE" % override
+            sys.exit(2)
+        input_overrides.append(tuple(override.split("=", 1)))
+
+    examples = [e for e in find_examples(options.examples_dir) if not args or e[0] in args]
+    if not examples:
+        print >> sys.stderr, "ERROR: No examples found"
+        sys.exit(2)
+
+    status = 0
+    for name, directory, pcl_filename in examples:
+        key = "%s/%s" % (name, os.path.basename(pcl_filename)[:-len(".pcl")])
+        try:
+            outputs, arrow_graph = compile_and_evaluate(directory, pcl_filename, input_overrides)
+            optimised_outputs, optimised_arrow_graph = compile_and_evaluate(directory,
+                                                                            pcl_filename,
+                                                                            input_overrides,
+                                                                            is_optimised = True,
+                                                                            is_linked = options.is_linked)
+        except Exception as ex:
+            print >> sys.stderr, "ERROR: %s: %s" % (key, ex)
+            status = 1
+            continue
+
+        is_equivalent = outputs == optimised_outputs
+        print "%-40s %-10s arrows %3d -> %3d" % \
+              (key,
+               "ok" if is_equivalent else "DIFFERENT",
+               count_arrows(arrow_graph),
+               count_arrows(optimised_arrow_graph))
+        if not is_equivalent:
+            print >> sys.stderr, "ERROR: %s: outputs differ:\n\twithout -O %s\n\twith -O    %s" % \
+                  (key, outputs, optimised_outputs)
+            status = 1
+    sys.exit(status)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import ConfigParser
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from optparse import OptionParser
+
+__SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path[1:1] = [os.path.join(__SRC_DIR, "pclc"), os.path.join(__SRC_DIR, "pcl-run"), os.path.join(__SRC_DIR, "runtime")]
+
+from bench.results import make_report, write_report, read_report, compare_reports, format_comparisons
+from build.make import MakeError, find_pcl_imports, make
+from concurrent.futures import ThreadPoolExecutor
+from runner import configuration as config_file
+from runner.runner import get_default_worker_count, import_module, load_pipeline
+
+
+DEFAULT_EXAMPLES_DIR = os.path.join(__SRC_DIR, "..", "examples")
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def find_examples(examples_dir):
+    """Returns the example pipelines: (name, directory, PCL file) triples for each PCL file with a configuration file which is not imported by another PCL file in its directory."""
+    examples = list()
+    for name in sorted(os.listdir(examples_dir)):
+        directory = os.path.abspath(os.path.join(examples_dir, name))
+        if not os.path.isdir(directory):
+            continue
+        pcl_filenames = sorted([os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".pcl")])
+        imported = set()
+        for pcl_filename in pcl_filenames:
+            imported.update(find_pcl_imports(pcl_filename, [directory]))
+        for pcl_filename in pcl_filenames:
+            if pcl_filename not in imported and os.path.isfile(pcl_filename[:-len(".pcl")] + ".cfg"):
+                examples.append((name, directory, pcl_filename))
+    return examples
+
+
+def suppress_output():
+    """Discards the standard output of this process, and of the processes it starts, so a pipeline's output is not interleaved with a report. Only for the child processes pipelines are evaluated in."""
+    sys.stdout.flush()
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), sys.stdout.fileno())
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_example(directory, module_name, no_workers, no_invocations, input_overrides):
+    """Loads an example pipeline, as pcl-run does, and evaluates it no_invocations times. Returns the start-up time, the evaluation latency percentiles and the peak memory used."""
+    suppress_output()
+    os.chdir(directory)
+    config_filename = "%s.cfg" % module_name
+    config_parser = ConfigParser.ConfigParser()
+    config_parser.read(config_filename)
+    for key, value in input_overrides:
+        if config_parser.has_option('Inputs', key):
+            config_parser.set('Inputs', key, value)
+
+    start = time.time()
+    pcl = import_module(directory, module_name)
+    if no_workers is None:
+        no_workers = get_default_worker_count(pcl)
+    executor = ThreadPoolExecutor(max_workers = no_workers)
+    try:
+        pipeline = load_pipeline(executor,
+                                 directory,
+                                 module_name,
+                                 lambda keys: dict([(k, config_file.get_configuration(config_parser, config_filename, k)) \
+                                                    for k in keys]))
+        startup_time = time.time() - start
+
+        inputs = config_file.get_input_values(config_parser, config_filename, pipeline.get_inputs())
+        latencies = list()
+        for i in xrange(no_invocations):
+            start = time.time()
+            pipeline.run(inputs)
+            latencies.append((time.time() - start) * 1000.0)
+    finally:
+        executor.shutdown(True)
+
+    latencies.sort()
+    return {'startup_ms' : startup_time * 1000.0,
+            'mean_ms' : sum(latencies) / len(latencies),
+            'p50_ms' : percentile(latencies, 0.5),
+            'p90_ms' : percentile(latencies, 0.9),
+            'p99_ms' : percentile(latencies, 0.99),
+            'peak_rss_kb' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def benchmark_example(directory, pcl_filename, no_workers, no_invocations, input_overrides):
+    """Compiles an example, and everything it imports, in a copy of its directory and runs it in a fresh process."""
+    work_dir = tempfile.mkdtemp(prefix = "pcl-bench-")
+    try:
+        example_dir = os.path.join(work_dir, os.path.basename(directory))
+        shutil.copytree(directory, example_dir)
+        pcl_filename = os.path.join(example_dir, os.path.basename(pcl_filename))
+
+        cwd = os.getcwd()
+        start = time.time()
+        try:
+            make(pcl_filename, example_dir, "bench", "WARN", 1, True)
+        except MakeError as ex:
+            raise BenchmarkError("\n".join(ex.messages))
+        finally:
+            os.chdir(cwd)
+        compile_time = time.time() - start
+
+        pool = multiprocessing.Pool(1)
+        try:
+            results = pool.apply(run_example,
+                                 (example_dir,
+                                  os.path.basename(pcl_filename)[:-len(".pcl")],
+                                  no_workers,
+                                  no_invocations,
+                                  input_overrides))
+        finally:
+            pool.terminate()
+            pool.join()
+        results['compile_ms'] = compile_time * 1000.0
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors = True)
+
+
+if __name__ == '__main__':
+    parser = OptionParser("Usage: %prog [options] [example...]")
+    parser.add_option("-d",
+                      "--examples-dir",
+                      default = DEFAULT_EXAMPLES_DIR,
+                      dest = "examples_dir",
+                      help = "directory of examples, one per sub-directory [default: the repository's examples]")
+    parser.add_option("-n",
+                      "--invocations",
+                      type = "int",
+                      default = 20,
+                      dest = "no_invocations",
+                      help = "number of evaluations of each example [default: %default]")
+    parser.add_option("-w",
+                      "--workers",
+                      type = "int",
+                      default = None,
+                      dest = "no_workers",
+                      help = "number of evaluation worker threads [default: as pcl-run, from the pipeline's parallel width]")
+    parser.add_option("-i",
+                      "--input",
+                      action = "append",
+                      default = [],
+                      dest = "input_overrides",
+                      metavar = "KEY=VALUE",
+                      help = "override an input in the examples' configuration files, e.g., sleep_time=0")
+    parser.add_option("-o",
+                      "--output",
+                      default = None,
+                      dest = "output_filename",
+                      help = "write the results, as JSON, to this file, e.g., to keep as a baseline")
+    parser.add_option("-b",
+                      "--baseline",
+                      default = None,
+                      dest = "baseline_filename",
+                      help = "compare the results with those in this file, exiting with status 1 on a regression")
+    parser.add_option("-t",
+                      "--tolerance",
+                      type = "float",
+                      default = 0.2,
+                      dest = "tolerance",
+                      help = "fraction by which a measurement may exceed the baseline [default: %default]")
+    (options, args) = parser.parse_args()
+
+    input_overrides = list()
+    for override in options.input_overrides:
+        if "=" not in override:
+            print >> sys.stderr, "ERROR: Input override %s should be KEY=VALUE" % override
+            sys.exit(2)
+        input_overrides.append(tuple(override.split("=", 1)))
+
+    examples = [e for e in find_examples(options.examples_dir) if not args or e[0] in args]
+    if not examples:
+        print >> sys.stderr, "ERROR: No examples found"
+        sys.exit(2)
+
+    results = dict()
+    for name, directory, pcl_filename in examples:
+        key = "%s/%s" % (name, os.path.basename(pcl_filename)[:-len(".pcl")])
+        try:
+            results[key] = benchmark_example(directory,
+                                             pcl_filename,
+                                             options.no_workers,
+                                             max(1, options.no_invocations),
+                                             input_overrides)
+        except Exception as ex:
+            print >> sys.stderr, "ERROR: %s: %s" % (key, ex)
+            continue
+        measurements = results[key]
+        print "%-40s compile %8.1fms  start-up %8.1fms  p50 %8.2fms  p90 %8.2fms  p99 %8.2fms  RSS %dKB" % \
+              (key,
+               measurements['compile_ms'],
+               measurements['startup_ms'],
+               measurements['p50_ms'],
+               measurements['p90_ms'],
+               measurements['p99_ms'],
+               measurements['peak_rss_kb'])
+
+    report = make_report("examples",
+                         {'invocations' : options.no_invocations,
+                          'workers' : options.no_workers,
+                          'inputs' : dict(input_overrides)},
+                         results)
+    if options.output_filename:
+        write_report(report, options.output_filename)
+
+    status = 0 if len(results) == len(examples) else 1
+    if options.baseline_filename:
+        comparisons = compare_reports(read_report(options.baseline_filename), report, options.tolerance)
+        print format_comparisons(comparisons)
+        if [c for c in comparisons if c[-1]]:
+            status = 1
+    sys.exit(status)
@@ -0,0 +1,39 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import subprocess
+import sys
+import unittest
+
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+class CompilerBenchmarkSmokeTest(unittest.TestCase):
+    def test_default_options(self):
+        process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "compiler.py")],
+                                   stdout = subprocess.PIPE,
+                                   stderr = subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        self.assertEqual(process.returncode, 0, stderr)
+        self.assertIn("total", stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from equivalence import compile_and_evaluate, count_arrows
+from examples import DEFAULT_EXAMPLES_DIR, find_examples
+
+
+# Keeps the sleeping examples short
+INPUT_OVERRIDES = [("sleep_time", "1")]
+
+
+class OptimiserEquivalenceTest(unittest.TestCase):
+    def assert_equivalent(self, **executor_options):
+        examples = find_examples(DEFAULT_EXAMPLES_DIR)
+        self.assertTrue(examples)
+        for name, directory, pcl_filename in examples:
+            outputs, arrow_graph = compile_and_evaluate(directory, pcl_filename, INPUT_OVERRIDES)
+            optimised_outputs, optimised_arrow_graph = compile_and_evaluate(directory,
+                                                                            pcl_filename,
+                                                                            INPUT_OVERRIDES,
+                                                                            is_optimised = True,
+                                                                            **executor_options)
+            self.assertEqual(outputs, optimised_outputs, "%s: outputs differ" % name)
+            self.assertLessEqual(count_arrows(optimised_arrow_graph), count_arrows(arrow_graph),
+                                 "%s: more arrows when optimised" % name)
+
+    def test_optimised_outputs_are_equal(self):
+        self.assert_equivalent()
+
+    def test_optimised_and_linked_outputs_are_equal(self):
+        self.assert_equivalent(is_linked = True)
+
+    def test_glue_is_fused(self):
+        directory = os.path.join(DEFAULT_EXAMPLES_DIR, "split_merge")
+        pcl_filename = os.path.join(directory, "split_merge.pcl")
+        arrow_graph = compile_and_evaluate(directory, pcl_filename, [])[1]
+        optimised_arrow_graph = compile_and_evaluate(directory, pcl_filename, [], is_optimised = True)[1]
+        self.assertEqual(count_arrows(arrow_graph), 7)
+        self.assertEqual(count_arrows(optimised_arrow_graph), 1)
+
+    def test_linked_glue_is_fused(self):
+        # The glue of stub_components surrounds its declared components, so
+        # is only fused once they are inlined
+        directory = os.path.join(DEFAULT_EXAMPLES_DIR, "debug_stubbing")
+        pcl_filename = os.path.join(directory, "stub_components.pcl")
+        arrow_graph = compile_and_evaluate(directory, pcl_filename, [])[1]
+        optimised_arrow_graph = compile_and_evaluate(directory, pcl_filename, [],
+                                                     is_optimised = True,
+                                                     is_linked = True)[1]
+        self.assertLess(count_arrows(optimised_arrow_graph), count_arrows(arrow_graph))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import json
+import sys
+
+from optparse import OptionParser
+from runner.server import PipelineClient, PipelineServerError
+
+
+__VERSION = "1.0.0"
+
+
+if __name__ == '__main__':
+    # The option parser
+    parser = OptionParser("Usage: %prog [options] SOCKET [JSON inputs]")
+    parser.add_option("-v",
+                      "--version",
+                      action = "store_true",
+                      default = False,
+                      dest = "version",
+                      help = "show version and exit")
+    parser.add_option("-f",
+                      "--inputs-from",
+                      default = "-",
+                      dest = "inputs_from",
+                      metavar = "FILE",
+                      help = "read JSON input records, one per line, from FILE when no inputs are given on the " \
+                             "command line [default: standard input]")
+    (options, args) = parser.parse_args()
+
+    # Show version?
+    if options.version is True:
+        print >> sys.stdout, __VERSION
+        sys.exit(0)
+
+    if len(args) < 1:
+        print >> sys.stderr, "ERROR: no server socket specified"
+        sys.exit(2)
+
+    try:
+        client = PipelineClient(args[0])
+    except PipelineServerError as ex:
+        print >> sys.stderr, "ERROR: %s" % ex
+        sys.exit(1)
+
+    try:
+        # Evaluate the inputs given on the command line once...
+        if len(args) > 1:
+            try:
+                print >> sys.stdout, json.dumps(client.evaluate(json.loads(args[1])))
+            except ValueError as ex:
+                print >> sys.stderr, "ERROR: Inputs are not valid JSON: %s" % ex
+                sys.exit(2)
+            except PipelineServerError as ex:
+                print >> sys.stderr, "ERROR: %s" % ex
+                sys.exit(1)
+        else:
+            # ...or once for every input record
+            stream = sys.stdin if options.inputs_from == "-" else open(options.inputs_from, "r")
+            no_failures = 0
+            try:
+                for line_no, line in enumerate(stream, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        inputs = json.loads(line)
+                    except ValueError as ex:
+                        print >> sys.stderr, "ERROR: Record at line %d is not valid JSON: %s" % (line_no, ex)
+                        sys.exit(1)
+                    response = client.request(inputs, line_no)
+                    if 'error' in response:
+                        no_failures += 1
+                    print >> sys.stdout, json.dumps(response)
+                    sys.stdout.flush()
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+
+            if no_failures > 0:
+                sys.exit(1)
+    except (PipelineServerError, IOError) as ex:
+        print >> sys.stderr, "ERROR: %s" % ex
+        sys.exit(1)
+    finally:
+        client.close()
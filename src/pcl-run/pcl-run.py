@@ -18,59 +18,27 @@
 # along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
 #
 import ConfigParser
+import multiprocessing
 import os
-import re
+import socket
 import sys
 
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from optparse import OptionParser
-from runner.runner import PCLImportError, execute_module
+from runner import configuration as config_file
+from runner.analysis import analyse, format_report
+from runner.journal import DEFAULT_JOURNAL_DIR, JournalError, new_run_id, start_run, finish_run, fail_run
+from runner.process import load_process_pipeline, route_to_processes
+from runner.records import RecordError, record_readers, format_output_record
+from runner.runner import PCLImportError, get_default_worker_count, import_module, load_pipeline
+from runner.server import PipelineServerError, serve
 
 
-__VERSION = "1.3.0"
+__VERSION = "1.4.0"
 
 
 if __name__ == '__main__':
-    def replace_environment_variables(value):
-        pattern = re.compile("\$\((?P<VAR_NAME>\w+)\)")
-        m = pattern.search(value)
-        while m is not None:
-            environ_var = m.group('VAR_NAME')
-            try:
-                environ_value = os.environ[environ_var]
-            except KeyError:
-                raise Exception("Environment variable %s is not set" % environ_var)
-            value = value[:m.start()] + environ_value + value[m.end():]
-            m = pattern.search(value)
-
-        return value
-
-
-    def get_key_from_section(config_parser, section, config_key, replace_environ_vars = True):
-        try:
-            value = config_parser.getboolean(section, config_key)
-        except ValueError:
-            try:
-                value = config_parser.getint(section, config_key)
-            except ValueError:
-                try:
-                    value = config_parser.getfloat(section, config_key)
-                except ValueError:
-                    value = config_parser.get(section, config_key)
-                    if replace_environ_vars:
-                        value = replace_environment_variables(value)
-        except ConfigParser.NoOptionError as ex:
-            raise Exception("Configuration file %s: %s" % (config_filename, ex))
-        except ConfigParser.NoSectionError:
-            raise Exception("Configuration file %s is missing the '%s' section" % \
-                            (config_filename, section))
-
-        return value
-
-
-    get_configuration = lambda c, k: get_key_from_section(c, 'Configuration', k)
-    get_input = lambda c, k: get_key_from_section(c, 'Inputs', k, False)
-
+    get_configuration = lambda c, k: config_file.get_configuration(c, config_filename, k)
 
     # The option parser
     parser = OptionParser("Usage: %prog [options] [PCL configuration]")
@@ -83,9 +51,116 @@ if __name__ == '__main__':
     parser.add_option("-n",
                       "--noworkers",
                       type = "int",
-                      default = 5,
+                      default = None,
                       dest = "no_workers",
-                      help = "number of pipeline evaluation workers [default: %default]")
+                      help = "number of pipeline evaluation workers, per worker process with the process executor " \
+                             "[default: the pipeline's parallel width, at most the number of CPUs]")
+    parser.add_option("-e",
+                      "--executor",
+                      type = "choice",
+                      choices = ["thread", "process", "hybrid"],
+                      default = "thread",
+                      dest = "executor",
+                      help = "evaluate components with a pool of threads (thread), evaluate the pipeline in a pool of " \
+                             "processes (process), or evaluate the components named by --process-components in a pool " \
+                             "of processes and the rest with threads (hybrid) [default: %default]")
+    parser.add_option("--process-workers",
+                      type = "int",
+                      default = multiprocessing.cpu_count(),
+                      dest = "no_process_workers",
+                      help = "number of worker processes for the process and hybrid executors [default: %default]")
+    parser.add_option("--process-components",
+                      default = None,
+                      dest = "process_components",
+                      metavar = "MODULE[,MODULE]",
+                      help = "comma separated, fully qualified, PCL modules whose components are evaluated in worker " \
+                             "processes by the hybrid executor")
+    parser.add_option("-f",
+                      "--inputs-from",
+                      default = None,
+                      dest = "inputs_from",
+                      metavar = "FILE",
+                      help = "evaluate the pipeline once for every input record read from FILE, " \
+                             "or standard input if FILE is -, and write the outputs to standard output as JSON lines")
+    parser.add_option("--input-format",
+                      type = "choice",
+                      choices = sorted(record_readers.keys()),
+                      default = None,
+                      dest = "input_format",
+                      help = "input record format, one of %s [default: tsv if FILE ends in .tsv, otherwise jsonl]" % \
+                             ", ".join(sorted(record_readers.keys())))
+    parser.add_option("--max-in-flight",
+                      type = "int",
+                      default = None,
+                      dest = "max_in_flight",
+                      help = "maximum number of input records evaluated concurrently [default: number of workers]")
+    parser.add_option("--ordered",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_ordered",
+                      help = "write output records in input order rather than completion order")
+    parser.add_option("--serve",
+                      default = None,
+                      dest = "socket_path",
+                      metavar = "SOCKET",
+                      help = "load the pipeline once and evaluate requests received on the Unix domain socket SOCKET")
+    parser.add_option("--max-concurrency",
+                      type = "int",
+                      default = None,
+                      dest = "max_concurrency",
+                      help = "maximum number of requests evaluated concurrently when serving [default: number of workers]")
+    parser.add_option("--cache-dir",
+                      default = None,
+                      dest = "cache_dir",
+                      metavar = "DIR",
+                      help = "directory of the component output cache used by components compiled with pclc --cache " \
+                             "[default: $PCL_CACHE_DIR or ~/.pcl/cache]")
+    parser.add_option("--cache-size",
+                      default = None,
+                      dest = "cache_size",
+                      metavar = "SIZE",
+                      help = "maximum size of the component output cache, e.g., 512M [default: $PCL_CACHE_SIZE or 1G]")
+    parser.add_option("--no-cache",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_not_cached",
+                      help = "do not use the component output cache")
+    parser.add_option("--journal",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_journalled",
+                      help = "journal the outputs of components, compiled with pclc --journal, so that the run can be " \
+                             "resumed with --resume if it fails")
+    parser.add_option("--resume",
+                      default = None,
+                      dest = "resumed_run_id",
+                      metavar = "RUN_ID",
+                      help = "resume a failed run, replaying the outputs of components, compiled with pclc --journal, " \
+                             "which completed")
+    parser.add_option("--journal-dir",
+                      default = os.getenv("PCL_JOURNAL_DIR", DEFAULT_JOURNAL_DIR),
+                      dest = "journal_dir",
+                      metavar = "DIR",
+                      help = "directory of run journals [default: $PCL_JOURNAL_DIR or %default]")
+    parser.add_option("--profile",
+                      default = None,
+                      dest = "profile_filename",
+                      metavar = "FILE",
+                      help = "write the timings of components, compiled with pclc -i, evaluated in this process to FILE " \
+                             "as Chrome trace event JSON")
+    parser.add_option("--report",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_reported",
+                      help = "print the critical path, parallelism and thread utilisation of the run, whose components " \
+                             "must be compiled with pclc -i")
+    parser.add_option("--resources",
+                      default = None,
+                      dest = "resources",
+                      metavar = "NAME=AMOUNT[,NAME=AMOUNT]",
+                      help = "resources available to components compiled with pclc --schedule, whose requirements " \
+                             "are given in the [Resources] section of the configuration file [default: cpu=%d]" % \
+                             multiprocessing.cpu_count())
     (options, args) = parser.parse_args()
 
     # Show version?
@@ -97,6 +172,18 @@ if __name__ == '__main__':
         print >> sys.stderr, "ERROR: no configuration file specified"
         sys.exit(2)
 
+    if options.socket_path and options.inputs_from:
+        print >> sys.stderr, "ERROR: --serve and --inputs-from cannot be used together"
+        sys.exit(2)
+
+    if options.socket_path and (options.is_journalled or options.resumed_run_id):
+        print >> sys.stderr, "ERROR: --serve cannot be used with --journal or --resume"
+        sys.exit(2)
+
+    if options.executor == "hybrid" and not options.process_components:
+        print >> sys.stderr, "ERROR: the hybrid executor requires --process-components"
+        sys.exit(2)
+
     # Add the PCL extension is one is missing
     basename = os.path.basename(args[0])
     basename_bits = basename.split(".")
@@ -104,6 +191,15 @@ if __name__ == '__main__':
         # Add the CFG extension on
         basename_bits.append("cfg")
 
+    # The component output cache is configured through the environment so
+    # that worker processes see the same settings
+    if options.cache_dir:
+        os.environ["PCL_CACHE_DIR"] = options.cache_dir
+    if options.cache_size:
+        os.environ["PCL_CACHE_SIZE"] = options.cache_size
+    if options.is_not_cached:
+        os.environ["PCL_NO_CACHE"] = "1"
+
     # PCL import path
     pcl_import_path = os.getenv("PCL_IMPORT_PATH", ".")
 
@@ -137,36 +233,179 @@ if __name__ == '__main__':
 
     # Read the inputs from the configuration file
     def get_input_values(expected_inputs):
-        # Create inputs
-        def build_inputs_fn(inputs):
-            input_dict = dict()
-            for an_input in inputs:
-                input_dict[an_input] = get_input(config_parser, an_input)
-            return input_dict
-
-        if isinstance(expected_inputs, tuple):
-            pipeline_inputs = list()
-            for set_inputs in expected_inputs:
-                pipeline_inputs.append(build_inputs_fn(set_inputs))
-            pipeline_inputs = tuple(pipeline_inputs)
-        else:
-            pipeline_inputs = build_inputs_fn(expected_inputs)
+        return config_file.get_input_values(config_parser, config_filename, expected_inputs)
+
+    # Evaluate a stream of input records with one initialised pipeline
+    def run_batch(pipeline):
+        input_format = options.input_format
+        if input_format is None:
+            input_format = "tsv" if options.inputs_from.endswith(".tsv") else "jsonl"
+        try:
+            stream = sys.stdin if options.inputs_from == "-" else open(options.inputs_from, "r")
+        except IOError as ex:
+            raise RecordError("Cannot open %s: %s" % (options.inputs_from, ex))
+
+        # Only failures to read the records are record errors; components'
+        # failures are the outputs of their records
+        def read_records():
+            try:
+                for record in record_readers[input_format](stream, pipeline.get_inputs()):
+                    yield record
+            except IOError as ex:
+                raise RecordError("Cannot read %s: %s" % (options.inputs_from, ex))
+
+        no_failures = 0
+        try:
+            records = read_records()
+            for idx, outputs in pipeline.imap(records,
+                                              options.max_in_flight,
+                                              options.is_ordered,
+                                              True):
+                if isinstance(outputs, Exception):
+                    no_failures += 1
+                print >> sys.stdout, format_output_record(idx, outputs)
+                sys.stdout.flush()
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        return no_failures
+
+    # Resource requirements of declarations are case sensitive
+    resources_parser = ConfigParser.RawConfigParser()
+    resources_parser.optionxform = str
+    resources_parser.read(config_filename)
+    if resources_parser.has_section("Resources") or options.resources:
+        try:
+            import pcl.runtime.scheduler
+        except ImportError as ex:
+            print >> sys.stderr, "ERROR: Cannot schedule, the PCL runtime is not available: %s" % ex
+            sys.exit(1)
+        try:
+            capacities = {'cpu' : multiprocessing.cpu_count()}
+            capacities.update(pcl.runtime.scheduler.parse_resources(options.resources or ""))
+            requirements = dict()
+            if resources_parser.has_section("Resources"):
+                requirements = dict([(decl, pcl.runtime.scheduler.parse_resources(value)) \
+                                     for decl, value in resources_parser.items("Resources")])
+            pcl.runtime.scheduler.configure(capacities, requirements)
+        except pcl.runtime.scheduler.SchedulerError as ex:
+            print >> sys.stderr, "ERROR: %s" % ex
+            sys.exit(1)
 
-        return pipeline_inputs
+    # Record instrumented components
+    tracer = None
+    if options.profile_filename or options.is_reported:
+        try:
+            import pcl.runtime.trace
+        except ImportError as ex:
+            print >> sys.stderr, "ERROR: Cannot profile, the PCL runtime is not available: %s" % ex
+            sys.exit(1)
+        tracer = pcl.runtime.trace.start_tracing()
+
+    # The PCL module sizes the workers from the pipeline's shape, and
+    # describes it to the report
+    imported_module = None
+    if options.no_workers is None or options.is_reported:
+        try:
+            imported_module = import_module(pcl_import_path, pcl_module)
+        except PCLImportError as ex:
+            print >> sys.stderr, "ERROR: Failed to import PCL module %s: %s" % (pcl_module, ex)
+            sys.exit(1)
+    if options.no_workers is None:
+        options.no_workers = get_default_worker_count(imported_module)
+
+    # Journal the run, if asked to, so it can be resumed if it fails.
+    # Components compiled with journalling find the journal through the
+    # environment.
+    run_id = None
+    if options.is_journalled or options.resumed_run_id:
+        run_id = options.resumed_run_id or new_run_id()
+        try:
+            start_run(options.journal_dir, run_id, pcl_module, options.resumed_run_id is not None)
+        except (JournalError, IOError, OSError) as ex:
+            print >> sys.stderr, "ERROR: %s" % ex
+            sys.exit(1)
+        os.environ["PCL_JOURNAL_DIR"] = options.journal_dir
+        os.environ["PCL_RUN_ID"] = run_id
+        print >> sys.stderr, "Run ID: %s" % run_id
 
     # The execution environment
     executor = ThreadPoolExecutor(max_workers = options.no_workers)
+    process_executor = None
+    if options.executor != "thread":
+        process_executor = ProcessPoolExecutor(max_workers = options.no_process_workers)
+    is_completed = False
     try:
-        print >> sys.stderr, execute_module(executor,
-                                            pcl_import_path,
-                                            pcl_module,
-                                            get_configuration_values,
-                                            get_input_values)[1]
+        # A single run's inputs are read, as they always were, before the
+        # pipeline is configured and initialised
+        pipeline_inputs = None
+        if not options.socket_path and not options.inputs_from:
+            pipeline_inputs = get_input_values(import_module(pcl_import_path, pcl_module).get_inputs())
+
+        if options.executor == "process":
+            pipeline = load_process_pipeline(process_executor,
+                                             pcl_import_path,
+                                             pcl_module,
+                                             get_configuration_values,
+                                             options.no_workers)
+        else:
+            if options.executor == "hybrid":
+                route_to_processes(process_executor,
+                                   pcl_import_path,
+                                   [m.strip() for m in options.process_components.split(",") if m.strip()],
+                                   options.no_workers)
+            pipeline = load_pipeline(executor,
+                                     pcl_import_path,
+                                     pcl_module,
+                                     get_configuration_values)
+
+        if options.socket_path:
+            max_concurrency = options.max_concurrency
+            if max_concurrency is None:
+                max_concurrency = options.no_process_workers if options.executor == "process" else options.no_workers
+            serve(options.socket_path, pipeline, max_concurrency)
+        elif options.inputs_from:
+            if run_batch(pipeline) > 0:
+                sys.exit(1)
+            is_completed = True
+        else:
+            print >> sys.stderr, pipeline.run(pipeline_inputs)
+            is_completed = True
     except PCLImportError as ex:
         print >> sys.stderr, "ERROR: Failed to import PCL module %s: %s" % (pcl_module, ex)
         sys.exit(1)
     except AttributeError as ex:
         print >> sys.stderr, "ERROR: PCL module %s does not have required functions: %s" % (pcl_module, ex)
         sys.exit(1)
+    except RecordError as ex:
+        print >> sys.stderr, "ERROR: Failed to read input records: %s" % ex
+        sys.exit(1)
+    except (PipelineServerError, socket.error) as ex:
+        print >> sys.stderr, "ERROR: Failed to serve on %s: %s" % (options.socket_path, ex)
+        sys.exit(1)
     finally:
         executor.shutdown(True)
+        if process_executor is not None:
+            process_executor.shutdown(True)
+        # The run's journal was started if it has an identifier. Failing to
+        # finish it must not hide how the run ended.
+        if run_id is not None:
+            try:
+                if is_completed:
+                    finish_run(options.journal_dir, run_id)
+                else:
+                    fail_run(options.journal_dir, run_id)
+                    print >> sys.stderr, "Run %s failed; resume it with --resume %s" % (run_id, run_id)
+            except (JournalError, IOError, OSError) as ex:
+                print >> sys.stderr, "WARNING: %s" % ex
+        if tracer is not None:
+            tracer.end_unfinished()
+            events = tracer.get_events()
+            if not events:
+                print >> sys.stderr, "WARNING: No components were profiled; compile them with pclc -i"
+            if options.profile_filename:
+                tracer.write(options.profile_filename)
+            if options.is_reported and events:
+                arrow_graph = getattr(imported_module, "get_arrow_graph", lambda: None)()
+                print >> sys.stderr, format_report(analyse(arrow_graph, events, imported_module.get_name()))
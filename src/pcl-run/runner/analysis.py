@@ -0,0 +1,148 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import collections
+
+
+#
+# Post-run analysis of a pipeline's recorded timings, see pcl.runtime.trace,
+# against the structure of its arrow expression, as returned by the
+# get_arrow_graph function that pclc generates for node components.
+#
+def __component_intervals(events):
+    begins = dict()
+    intervals = list()
+    for event in events:
+        if event.get('cat') != 'component':
+            continue
+        if event['ph'] == 'b':
+            begins[event['id']] = event
+        elif event['ph'] == 'e' and event['id'] in begins:
+            begin = begins.pop(event['id'])
+            intervals.append((begin['args']['component'],
+                              begin['args']['declaration'],
+                              begin['ts'],
+                              event['ts']))
+    return intervals
+
+
+def __critical_path(graph, durations):
+    node_type = graph[0]
+    if node_type == 'component':
+        return (durations.get(graph[1], 0.0), [graph[1]])
+    elif node_type == '>>>':
+        left_length, left_path = __critical_path(graph[1], durations)
+        right_length, right_path = __critical_path(graph[2], durations)
+        return (left_length + right_length, left_path + right_path)
+    elif node_type in ('&&&', '***', 'if'):
+        return max([__critical_path(g, durations) for g in graph[1:]])
+    elif node_type in ('first', 'second'):
+        return __critical_path(graph[1], durations)
+    else:
+        return (0.0, [])
+
+
+def __peak_concurrency(intervals):
+    edges = sorted([(start, 1) for start, end in intervals] + \
+                   [(end, -1) for start, end in intervals])
+    peak = current = 0
+    for ts, step in edges:
+        current += step
+        peak = max(peak, current)
+    return peak
+
+
+def analyse(arrow_graph, events, component_name):
+    """Analyses the trace events recorded while evaluating a node component. Returns a dictionary with the wall time, the critical path and its length, the realised and available parallelism, per-thread utilisation and the declared components ranked by their contribution to the critical path. Times are in microseconds."""
+    intervals = __component_intervals(events)
+    top_intervals = [i for i in intervals if i[0] == component_name]
+
+    # Mean duration of each evaluation of the top level declarations
+    totals = collections.defaultdict(float)
+    counts = collections.defaultdict(int)
+    for component, decl_id, start, end in top_intervals:
+        totals[decl_id] += end - start
+        counts[decl_id] += 1
+    durations = dict([(decl_id, totals[decl_id] / counts[decl_id]) for decl_id in totals])
+
+    # Wall time covers every recorded event
+    timed_events = [e for e in events if 'ts' in e]
+    if timed_events:
+        wall_start = min([e['ts'] for e in timed_events])
+        wall_end = max([e['ts'] + e.get('dur', 0) for e in timed_events])
+        wall_time = float(wall_end - wall_start)
+    else:
+        wall_time = 0.0
+
+    if arrow_graph is not None:
+        cp_length, cp_path = __critical_path(arrow_graph, durations)
+    else:
+        cp_length, cp_path = (0.0, [])
+    work = sum(durations.values())
+
+    # Utilisation of the threads which ran do commands
+    thread_names = dict([(e['tid'], e['args']['name']) for e in events if e.get('ph') == 'M'])
+    busy = collections.defaultdict(float)
+    for event in events:
+        if event.get('cat') == 'command' and event.get('ph') == 'X':
+            busy[event['tid']] += event['dur']
+    utilisation = [(thread_names.get(tid, str(tid)), busy[tid] / wall_time if wall_time else 0.0) \
+                   for tid in sorted(busy.keys())]
+
+    ranked = sorted([{'declaration' : decl_id,
+                      'evaluations' : counts[decl_id],
+                      'duration' : durations[decl_id],
+                      'on_critical_path' : decl_id in cp_path,
+                      'critical_path_share' : durations[decl_id] / cp_length \
+                                              if decl_id in cp_path and cp_length else 0.0} \
+                     for decl_id in durations],
+                    key = lambda r: (r['critical_path_share'], r['duration']),
+                    reverse = True)
+
+    return {'wall_time' : wall_time,
+            'critical_path' : cp_path,
+            'critical_path_length' : cp_length,
+            'work' : work,
+            'available_parallelism' : work / cp_length if cp_length else 0.0,
+            'average_concurrency' : sum([end - start for c, d, start, end in top_intervals]) / wall_time \
+                                    if wall_time else 0.0,
+            'peak_concurrency' : __peak_concurrency([(start, end) for c, d, start, end in top_intervals]),
+            'thread_utilisation' : utilisation,
+            'components' : ranked}
+
+
+def format_report(report):
+    """Formats an analysis as text."""
+    ms = lambda us: "%.1fms" % (us / 1000.0)
+    lines = ["Wall time: %s" % ms(report['wall_time']),
+             "Critical path: %s (%s)" % (ms(report['critical_path_length']),
+                                         " >>> ".join(report['critical_path']) or "none"),
+             "Component work: %s" % ms(report['work']),
+             "Available parallelism (work / critical path): %.2f" % report['available_parallelism'],
+             "Realised concurrency: average %.2f, peak %d" % (report['average_concurrency'],
+                                                             report['peak_concurrency'])]
+    if report['thread_utilisation']:
+        lines.append("Thread utilisation:")
+        lines.extend(["  %-24s %5.1f%%" % (name, 100.0 * u) for name, u in report['thread_utilisation']])
+    lines.append("Components by critical path contribution:")
+    lines.extend(["  %-24s %10s %6.1f%% %s" % (r['declaration'],
+                                               ms(r['duration']),
+                                               100.0 * r['critical_path_share'],
+                                               "(%d evaluations)" % r['evaluations'] if r['evaluations'] > 1 else "") \
+                  for r in report['components']])
+    return "\n".join(lines)
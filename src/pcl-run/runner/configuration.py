@@ -0,0 +1,82 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import ConfigParser
+import os
+import re
+
+
+__ENVIRONMENT_VARIABLE_PATTERN = re.compile("\$\((?P<VAR_NAME>\w+)\)")
+
+
+def replace_environment_variables(value):
+    m = __ENVIRONMENT_VARIABLE_PATTERN.search(value)
+    while m is not None:
+        environ_var = m.group('VAR_NAME')
+        try:
+            environ_value = os.environ[environ_var]
+        except KeyError:
+            raise Exception("Environment variable %s is not set" % environ_var)
+        value = value[:m.start()] + environ_value + value[m.end():]
+        m = __ENVIRONMENT_VARIABLE_PATTERN.search(value)
+
+    return value
+
+
+def get_key_from_section(config_parser, config_filename, section, config_key, replace_environ_vars = True):
+    """Returns a value from a section of a configuration file, as a boolean, integer, float or string, in that order of preference. Environment variables, written $(NAME), in string values are replaced if asked for."""
+    try:
+        value = config_parser.getboolean(section, config_key)
+    except ValueError:
+        try:
+            value = config_parser.getint(section, config_key)
+        except ValueError:
+            try:
+                value = config_parser.getfloat(section, config_key)
+            except ValueError:
+                value = config_parser.get(section, config_key)
+                if replace_environ_vars:
+                    value = replace_environment_variables(value)
+    except ConfigParser.NoOptionError as ex:
+        raise Exception("Configuration file %s: %s" % (config_filename, ex))
+    except ConfigParser.NoSectionError:
+        raise Exception("Configuration file %s is missing the '%s' section" % \
+                        (config_filename, section))
+
+    return value
+
+
+def get_configuration(config_parser, config_filename, config_key):
+    return get_key_from_section(config_parser, config_filename, 'Configuration', config_key)
+
+
+def get_input(config_parser, config_filename, input_key):
+    return get_key_from_section(config_parser, config_filename, 'Inputs', input_key, False)
+
+
+def get_input_values(config_parser, config_filename, expected_inputs):
+    """Returns the pipeline inputs, from the [Inputs] section of a configuration file, for a component's expected inputs: a dictionary, or a tuple of dictionaries for components with tuple inputs."""
+    def build_inputs_fn(inputs):
+        input_dict = dict()
+        for an_input in inputs:
+            input_dict[an_input] = get_input(config_parser, config_filename, an_input)
+        return input_dict
+
+    if isinstance(expected_inputs, tuple):
+        return tuple([build_inputs_fn(set_inputs) for set_inputs in expected_inputs])
+    return build_inputs_fn(expected_inputs)
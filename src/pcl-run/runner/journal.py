@@ -0,0 +1,82 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import datetime
+import json
+import os
+import shutil
+
+
+#
+# Run journals are kept in <journal directory>/<run id>. Components compiled
+# with pclc --journal record their outputs there, see pcl.runtime.journal.
+#
+DEFAULT_JOURNAL_DIR = os.path.join("~", ".pcl", "journal")
+__RUN_FILENAME = "run.json"
+
+
+class JournalError(Exception):
+    pass
+
+
+def new_run_id():
+    """Returns a new, unique, run identifier."""
+    return "%s-%d" % (datetime.datetime.now().strftime("%Y%m%d-%H%M%S"), os.getpid())
+
+
+def get_run_dir(journal_dir, run_id):
+    return os.path.join(os.path.abspath(os.path.expanduser(journal_dir)), run_id)
+
+
+def start_run(journal_dir, run_id, pcl_module, is_resumed):
+    """Creates the journal of a new run, or checks that the journal of a resumed run was made by the same PCL module."""
+    run_dir = get_run_dir(journal_dir, run_id)
+    run_filename = os.path.join(run_dir, __RUN_FILENAME)
+    if is_resumed:
+        try:
+            with open(run_filename, "r") as f:
+                run = json.load(f)
+        except (IOError, ValueError) as ex:
+            raise JournalError("Cannot resume run %s: %s" % (run_id, ex))
+        if run.get('module') != pcl_module:
+            raise JournalError("Cannot resume run %s: it was a run of %s" % (run_id, run.get('module')))
+    else:
+        if not os.path.isdir(run_dir):
+            os.makedirs(run_dir)
+        with open(run_filename, "w") as f:
+            json.dump({'module' : pcl_module,
+                       'started' : datetime.datetime.now().isoformat()}, f)
+    return run_dir
+
+
+def fail_run(journal_dir, run_id):
+    """Records that a run failed, keeping its journal so that the run can be resumed."""
+    run_filename = os.path.join(get_run_dir(journal_dir, run_id), __RUN_FILENAME)
+    try:
+        with open(run_filename, "r") as f:
+            run = json.load(f)
+        run['failed'] = datetime.datetime.now().isoformat()
+        with open(run_filename, "w") as f:
+            json.dump(run, f)
+    except (IOError, ValueError) as ex:
+        raise JournalError("Cannot record that run %s failed: %s" % (run_id, ex))
+
+
+def finish_run(journal_dir, run_id):
+    """Removes the journal of a completed run."""
+    shutil.rmtree(get_run_dir(journal_dir, run_id), True)
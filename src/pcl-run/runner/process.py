@@ -0,0 +1,160 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+from concurrent.futures import ThreadPoolExecutor
+from pypeline.core.arrows.kleisli_arrow import KleisliArrow
+from pypeline.helpers.parallel_helpers import eval_pipeline, cons_function_component
+from runner import import_module, imap_futures
+
+
+#
+# Worker process state. Each worker process imports a compiled PCL module
+# once and keeps its initialised components resident for later evaluations.
+#
+__worker_arrows = dict()
+__worker_executor = None
+__original_initialisers = dict()
+
+
+def __get_worker_executor(no_threads):
+    global __worker_executor
+    if __worker_executor is None:
+        __worker_executor = ThreadPoolExecutor(max_workers = no_threads)
+    return __worker_executor
+
+
+def __get_worker_arrow(pcl_import_path, pcl_module, config, is_configured):
+    key = (pcl_module, is_configured, repr(sorted(config.items())))
+    arrow = __worker_arrows.get(key)
+    if arrow is None:
+        module = import_module(pcl_import_path, pcl_module)
+        # A forked worker inherits any routing proxy installed in the parent
+        initialise_fn = __original_initialisers.get(pcl_module, getattr(module, "initialise"))
+        if not is_configured:
+            config = getattr(module, "configure")(config)
+        arrow = initialise_fn(config)
+        if not isinstance(arrow, KleisliArrow):
+            arrow = cons_function_component(arrow)
+        __worker_arrows[key] = arrow
+    return arrow
+
+
+def evaluate_in_worker(pcl_import_path, pcl_module, config, is_configured, state, no_threads, inputs):
+    """Evaluates a PCL component in a worker process. The component is imported and initialised the first time it is used by the worker. Pass is_configured as True if the configuration has already been filtered by the component's configure function."""
+    return eval_pipeline(__get_worker_executor(no_threads),
+                         __get_worker_arrow(pcl_import_path, pcl_module, config, is_configured),
+                         inputs,
+                         state)
+
+
+class ProcessPipeline(object):
+    """A handle on a PCL component which is evaluated in worker processes. It provides the same evaluation methods as runner.Pipeline. Inputs, configuration and outputs must be picklable."""
+    def __init__(self,
+                 process_executor,
+                 pcl_import_path,
+                 pcl_module,
+                 configuration,
+                 expected_inputs,
+                 expected_outputs,
+                 expected_configuration,
+                 no_threads):
+        self.__process_executor = process_executor
+        self.__pcl_import_path = pcl_import_path
+        self.__pcl_module = pcl_module
+        self.__configuration = configuration
+        self.__expected_inputs = expected_inputs
+        self.__expected_outputs = expected_outputs
+        self.__expected_configuration = expected_configuration
+        self.__no_threads = no_threads
+
+    def get_inputs(self):
+        return self.__expected_inputs
+
+    def get_outputs(self):
+        return self.__expected_outputs
+
+    def get_configuration(self):
+        return self.__expected_configuration
+
+    def submit(self, inputs):
+        """Submits one evaluation of the pipeline to the process pool and returns its future."""
+        return self.__process_executor.submit(evaluate_in_worker,
+                                              self.__pcl_import_path,
+                                              self.__pcl_module,
+                                              self.__configuration,
+                                              False,
+                                              self.__configuration,
+                                              self.__no_threads,
+                                              inputs)
+
+    def run(self, inputs):
+        return self.submit(inputs).result()
+
+    def run_many(self, inputs_iterable, max_in_flight = None):
+        return [outputs for idx, outputs in self.imap(inputs_iterable, max_in_flight)]
+
+    def imap(self, inputs_iterable, max_in_flight = None, ordered = True, return_exceptions = False):
+        if max_in_flight is None:
+            max_in_flight = getattr(self.__process_executor, '_max_workers', 5)
+        return imap_futures(self.submit,
+                            inputs_iterable,
+                            max(1, max_in_flight),
+                            ordered,
+                            return_exceptions)
+
+
+def load_process_pipeline(process_executor, pcl_import_path, pcl_module, get_configuration_fn, no_threads):
+    """Returns a ProcessPipeline for a PCL component. The component is only imported in this process to discover its interface; it is initialised in the worker processes. Each worker evaluates components with a pool of no_threads threads."""
+    pcl = import_module(pcl_import_path, pcl_module)
+    expected_configuration = getattr(pcl, "get_configuration")()
+    configuration = get_configuration_fn(expected_configuration)
+
+    return ProcessPipeline(process_executor,
+                           pcl_import_path,
+                           pcl_module,
+                           configuration,
+                           getattr(pcl, "get_inputs")(),
+                           getattr(pcl, "get_outputs")(),
+                           expected_configuration,
+                           no_threads)
+
+
+def route_to_processes(process_executor, pcl_import_path, pcl_modules, no_threads):
+    """Routes every declaration of the named, imported, PCL components to worker processes. Call this before loading the pipeline which declares them. The components' inputs, outputs and state must be picklable."""
+    for pcl_module in pcl_modules:
+        if pcl_module in __original_initialisers:
+            continue
+
+        module = import_module(pcl_import_path, pcl_module)
+        __original_initialisers[pcl_module] = getattr(module, "initialise")
+
+        def initialise(config, pcl_module = pcl_module):
+            def evaluate(a, s):
+                # The state chain of the enclosing components stays in this process
+                state = dict([(k, v) for k, v in s.iteritems() if k != '____prev_'])
+                return process_executor.submit(evaluate_in_worker,
+                                               pcl_import_path,
+                                               pcl_module,
+                                               config,
+                                               True,
+                                               state,
+                                               no_threads,
+                                               a).result()
+            return cons_function_component(evaluate)
+
+        setattr(module, "initialise", initialise)
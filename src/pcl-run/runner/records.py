@@ -0,0 +1,105 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import ConfigParser
+import json
+
+
+class RecordError(Exception):
+    pass
+
+
+# Values read from delimited text are given the same types as
+# values read from the [Inputs] section of a configuration file
+def coerce_value(value):
+    if value.lower() in ConfigParser.RawConfigParser._boolean_states:
+        return ConfigParser.RawConfigParser._boolean_states[value.lower()]
+    for type_fn in (int, float):
+        try:
+            return type_fn(value)
+        except ValueError:
+            pass
+    return value
+
+
+def __check_inputs(record, expected_inputs, where):
+    missing = [i for i in expected_inputs if i not in record]
+    if missing:
+        raise RecordError("%s is missing inputs: %s" % \
+                          (where, ", ".join(missing)))
+    return dict([(i, record[i]) for i in expected_inputs])
+
+
+def decode_input_record(record, expected_inputs, where):
+    """Converts a decoded JSON input record to pipeline inputs. The record is an object keyed by the expected input names or, for components with two input ports, a list of two such objects. The where string describes the record in error messages."""
+    if isinstance(expected_inputs, tuple):
+        if not isinstance(record, list) or len(record) != 2:
+            raise RecordError("%s should be a list of two input objects" % where)
+        return tuple([__check_inputs(r, e, where) for r, e in zip(record, expected_inputs)])
+    else:
+        if not isinstance(record, dict):
+            raise RecordError("%s should be an input object" % where)
+        return __check_inputs(record, expected_inputs, where)
+
+
+def read_jsonl_records(stream, expected_inputs):
+    """Reads one JSON input record per line. A record is an object keyed by the expected input names or, for components with two input ports, a list of two such objects."""
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as ex:
+            raise RecordError("Record at line %d is not valid JSON: %s" % (line_no, ex))
+
+        yield decode_input_record(record, expected_inputs, "Record at line %d" % line_no)
+
+
+def read_tsv_records(stream, expected_inputs):
+    """Reads one tab separated input record per line. The first line is a header naming the input of each column."""
+    if isinstance(expected_inputs, tuple):
+        raise RecordError("Tab separated records cannot be used with two input ports")
+
+    header = None
+    for line_no, line in enumerate(stream, 1):
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        fields = line.split("\t")
+        if header is None:
+            header = fields
+            continue
+        if len(fields) != len(header):
+            raise RecordError("Record at line %d has %d fields, expected %d" % \
+                              (line_no, len(fields), len(header)))
+        yield __check_inputs(dict(zip(header, [coerce_value(f) for f in fields])),
+                             expected_inputs,
+                             "Record at line %d" % line_no)
+
+
+record_readers = {'jsonl' : read_jsonl_records,
+                  'tsv' : read_tsv_records}
+
+
+def format_output_record(idx, outputs):
+    """Formats the outputs, or the exception, of one pipeline evaluation as a line of JSON."""
+    if isinstance(outputs, Exception):
+        record = {'record' : idx, 'error' : str(outputs)}
+    else:
+        record = {'record' : idx, 'outputs' : outputs}
+    return json.dumps(record, default = str)
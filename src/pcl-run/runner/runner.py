@@ -17,8 +17,11 @@
 # You should have received a copy of the GNU General Public License
 # along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
 #
+import collections
+import multiprocessing
 import sys
 
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pypeline.core.arrows.kleisli_arrow import KleisliArrow
 from pypeline.helpers.parallel_helpers import eval_pipeline, cons_function_component
 
@@ -34,8 +37,104 @@ class PCLImportError(Exception):
         return "PCLImportError(cause = %s)" % self.__cause.__repr__()
 
 
-def execute_module(executor, pcl_import_path, pcl_module, get_configuration_fn, get_inputs_fn):
-    """Executes a PCL component in a concurrent environment. Provide a the concurrent execution environment, a colon separated PCL import path, the fully qualified PCL module name, and getter two functions. The configuration function receives the expected configuration keys and should return a dictionary, whose keys are the expected configuration, with appropriate values. The input function received the expected inputs and should return a dictionary, whose keys are the expected inputs, with appropriate values."""
+class Pipeline(object):
+    """A handle on an imported, configured and initialised PCL component. The handle holds the initialised Kleisli arrow so that it can be evaluated with many sets of inputs without paying for the import and component construction each time. A handle is safe to use from many threads."""
+    def __init__(self,
+                 executor,
+                 pcl_module,
+                 arrow,
+                 configuration,
+                 expected_inputs,
+                 expected_outputs,
+                 expected_configuration):
+        self.__executor = executor
+        self.__pcl_module = pcl_module
+        self.__arrow = arrow
+        self.__configuration = configuration
+        self.__expected_inputs = expected_inputs
+        self.__expected_outputs = expected_outputs
+        self.__expected_configuration = expected_configuration
+
+    def get_module(self):
+        return self.__pcl_module
+
+    def get_inputs(self):
+        return self.__expected_inputs
+
+    def get_outputs(self):
+        return self.__expected_outputs
+
+    def get_configuration(self):
+        return self.__expected_configuration
+
+    def run(self, inputs):
+        """Evaluates the pipeline with one set of inputs and returns the outputs."""
+        return eval_pipeline(self.__executor,
+                             self.__arrow,
+                             inputs,
+                             self.__configuration)
+
+    def run_many(self, inputs_iterable, max_in_flight = None):
+        """Evaluates the pipeline for every set of inputs and returns a list of outputs, in input order."""
+        return [outputs for idx, outputs in self.imap(inputs_iterable, max_in_flight)]
+
+    def imap(self, inputs_iterable, max_in_flight = None, ordered = True, return_exceptions = False):
+        """Lazily evaluates the pipeline for every set of inputs, keeping at most max_in_flight evaluations running at once. Yields (index, outputs) pairs in input order, or in completion order if ordered is False. If return_exceptions is True a failed evaluation yields the exception in place of the outputs, otherwise the exception is raised."""
+        if max_in_flight is None:
+            max_in_flight = getattr(self.__executor, '_max_workers', 5)
+        max_in_flight = max(1, max_in_flight)
+
+        # Evaluations block waiting on the component futures, so they must
+        # *not* be driven from the component executor or it may deadlock.
+        driver = ThreadPoolExecutor(max_workers = max_in_flight)
+        try:
+            for result in imap_futures(lambda inputs: driver.submit(self.run, inputs),
+                                       inputs_iterable,
+                                       max_in_flight,
+                                       ordered,
+                                       return_exceptions):
+                yield result
+        finally:
+            driver.shutdown(False)
+
+
+def imap_futures(submit_fn, inputs_iterable, max_in_flight, ordered = True, return_exceptions = False):
+    """Submits every set of inputs with the submit function, which should return a future, keeping at most max_in_flight futures outstanding. Yields (index, result) pairs in input order, or in completion order if ordered is False."""
+    def unpack(idx, future):
+        try:
+            return (idx, future.result())
+        except Exception as ex:
+            if return_exceptions:
+                return (idx, ex)
+            raise
+
+    inputs_iter = enumerate(inputs_iterable)
+    in_flight = collections.OrderedDict()
+    exhausted = False
+    while True:
+        # Keep the executor saturated
+        while not exhausted and len(in_flight) < max_in_flight:
+            try:
+                idx, inputs = inputs_iter.next()
+            except StopIteration:
+                exhausted = True
+                break
+            in_flight[submit_fn(inputs)] = idx
+
+        if not in_flight:
+            break
+
+        if ordered:
+            future, idx = in_flight.popitem(last = False)
+            yield unpack(idx, future)
+        else:
+            done, not_done = wait(in_flight.keys(), return_when = FIRST_COMPLETED)
+            for future in done:
+                yield unpack(in_flight.pop(future), future)
+
+
+def import_module(pcl_import_path, pcl_module):
+    """Imports a compiled PCL module. Provide a colon separated PCL import path and the fully qualified PCL module name."""
     # Set up Python path to import compiled PCL modules
     pcl_import_path_bits = pcl_import_path.split(":")
     for pcl_import_path_bit in pcl_import_path_bits:
@@ -44,14 +143,37 @@ def execute_module(executor, pcl_import_path, pcl_module, get_configuration_fn,
 
     # Import PCL
     try:
-        pcl = __import__(pcl_module, fromlist = ['get_inputs',
-                                                 'get_outputs',
-                                                 'get_configuration',
-                                                 'configure',
-                                                 'initialise'])
+        return __import__(pcl_module, fromlist = ['get_inputs',
+                                                  'get_outputs',
+                                                  'get_configuration',
+                                                  'configure',
+                                                  'initialise'])
     except Exception as ex:
         raise PCLImportError(ex)
 
+
+def get_default_worker_count(pcl, default_workers = 5):
+    """Returns the number of evaluation workers for a compiled PCL module: its maximum parallel width, capped by the number of CPUs and the user's process limit. Modules compiled without a parallel width get the default number of workers."""
+    get_parallel_width_fn = getattr(pcl, "get_parallel_width", None)
+    if get_parallel_width_fn is None:
+        return default_workers
+
+    no_workers = min(get_parallel_width_fn(), multiprocessing.cpu_count())
+    try:
+        import resource
+        soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NPROC)
+        if soft_limit != resource.RLIM_INFINITY:
+            no_workers = min(no_workers, soft_limit)
+    except (ImportError, AttributeError, ValueError):
+        pass
+
+    return max(1, no_workers)
+
+
+def load_pipeline(executor, pcl_import_path, pcl_module, get_configuration_fn):
+    """Imports, configures and initialises a PCL component once and returns a Pipeline handle which can evaluate it many times in a concurrent environment. Provide the concurrent execution environment, a colon separated PCL import path, the fully qualified PCL module name, and a configuration getter function. The configuration function receives the expected configuration keys and should return a dictionary, whose keys are the expected configuration, with appropriate values."""
+    pcl = import_module(pcl_import_path, pcl_module)
+
     # Get the pipeline
     get_expected_inputs_fn = getattr(pcl, "get_inputs")
     get_expected_outputs_fn = getattr(pcl, "get_outputs")
@@ -59,12 +181,9 @@ def execute_module(executor, pcl_import_path, pcl_module, get_configuration_fn,
     configure_fn = getattr(pcl, "configure")
     initialise_fn = getattr(pcl, "initialise")
 
-    # Inputs, configuration values from the provided functions
-    pipeline_inputs = get_inputs_fn(get_expected_inputs_fn())
-    pipeline_configuration = get_configuration_fn(get_expected_configuration_fn())
-
-    # The expected outputs from the component
-    expected_outputs = get_expected_outputs_fn()
+    # Configuration values from the provided function
+    expected_configuration = get_expected_configuration_fn()
+    pipeline_configuration = get_configuration_fn(expected_configuration)
 
     # Configure the PCL...
     filtered_config = configure_fn(pipeline_configuration)
@@ -73,6 +192,21 @@ def execute_module(executor, pcl_import_path, pcl_module, get_configuration_fn,
     if not isinstance(pipeline, KleisliArrow):
         pipeline = cons_function_component(pipeline)
 
-    return (expected_outputs,
-            eval_pipeline(executor, pipeline, pipeline_inputs, pipeline_configuration))
-    
+    return Pipeline(executor,
+                    pcl,
+                    pipeline,
+                    pipeline_configuration,
+                    get_expected_inputs_fn(),
+                    get_expected_outputs_fn(),
+                    expected_configuration)
+
+
+def execute_module(executor, pcl_import_path, pcl_module, get_configuration_fn, get_inputs_fn):
+    """Executes a PCL component in a concurrent environment. Provide a the concurrent execution environment, a colon separated PCL import path, the fully qualified PCL module name, and getter two functions. The configuration function receives the expected configuration keys and should return a dictionary, whose keys are the expected configuration, with appropriate values. The input function received the expected inputs and should return a dictionary, whose keys are the expected inputs, with appropriate values."""
+    # Inputs from the provided function, before the PCL is configured and
+    # initialised
+    pipeline_inputs = get_inputs_fn(import_module(pcl_import_path, pcl_module).get_inputs())
+
+    pipeline = load_pipeline(executor, pcl_import_path, pcl_module, get_configuration_fn)
+
+    return (pipeline.get_outputs(), pipeline.run(pipeline_inputs))
@@ -0,0 +1,153 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import errno
+import json
+import os
+import socket
+import SocketServer
+import threading
+
+from records import RecordError, decode_input_record
+
+
+class PipelineServerError(Exception):
+    pass
+
+
+#
+# Protocol: one JSON object per line in each direction. A request is
+#   {"id" : <any>, "inputs" : <input record>}
+# and its response is
+#   {"id" : <same>, "outputs" : <outputs>} or {"id" : <same>, "error" : <message>}
+# Requests on one connection are answered in order; use several
+# connections for concurrent evaluations.
+#
+class PipelineRequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+
+            response = self.server.evaluate_request(line)
+            self.wfile.write(json.dumps(response, default = str) + "\n")
+
+
+class PipelineServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Evaluates requests to an initialised pipeline received over a Unix domain socket. At most max_concurrency evaluations run at the same time; other requests wait their turn."""
+    daemon_threads = True
+
+    def __init__(self, socket_path, pipeline, max_concurrency):
+        self.__pipeline = pipeline
+        self.__semaphore = threading.BoundedSemaphore(max(1, max_concurrency))
+        remove_stale_socket(socket_path)
+        SocketServer.UnixStreamServer.__init__(self, socket_path, PipelineRequestHandler)
+
+    def evaluate_request(self, line):
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as ex:
+                raise RecordError("Request is not valid JSON: %s" % ex)
+            if not isinstance(request, dict) or 'inputs' not in request:
+                raise RecordError("Request should be an object with an inputs member")
+            request_id = request.get('id')
+
+            inputs = decode_input_record(request['inputs'],
+                                         self.__pipeline.get_inputs(),
+                                         "Request inputs")
+            with self.__semaphore:
+                outputs = self.__pipeline.run(inputs)
+            return {'id' : request_id, 'outputs' : outputs}
+        except Exception as ex:
+            return {'id' : request_id, 'error' : str(ex)}
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def remove_stale_socket(socket_path):
+    """Removes a socket file left behind by a server which is no longer running. Raises PipelineServerError if a server is listening on it."""
+    if not os.path.exists(socket_path):
+        return
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error as ex:
+        if ex.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+            raise PipelineServerError("Cannot use socket %s: %s" % (socket_path, ex))
+        os.unlink(socket_path)
+    else:
+        raise PipelineServerError("A server is already listening on %s" % socket_path)
+    finally:
+        sock.close()
+
+
+def serve(socket_path, pipeline, max_concurrency):
+    """Serves evaluation requests to the pipeline on a Unix domain socket until interrupted."""
+    server = PipelineServer(socket_path, pipeline, max_concurrency)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class PipelineClient(object):
+    """A connection to a pipeline server. Evaluations on one client are made one at a time."""
+    def __init__(self, socket_path):
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.__socket.connect(socket_path)
+        except socket.error as ex:
+            self.__socket.close()
+            raise PipelineServerError("Cannot connect to %s: %s" % (socket_path, ex))
+        self.__rfile = self.__socket.makefile("rb")
+        self.__next_id = 0
+
+    def request(self, inputs, request_id = None):
+        """Sends the inputs to the server and returns the decoded response object."""
+        if request_id is None:
+            request_id = self.__next_id
+            self.__next_id += 1
+        self.__socket.sendall(json.dumps({'id' : request_id, 'inputs' : inputs}) + "\n")
+        line = self.__rfile.readline()
+        if not line:
+            raise PipelineServerError("Server closed the connection")
+        return json.loads(line)
+
+    def evaluate(self, inputs):
+        """Evaluates the pipeline with the inputs and returns its outputs. Raises PipelineServerError if the evaluation fails."""
+        response = self.request(inputs)
+        if 'error' in response:
+            raise PipelineServerError(response['error'])
+        return response['outputs']
+
+    def close(self):
+        self.__rfile.close()
+        self.__socket.close()
@@ -0,0 +1,77 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from concurrent.futures import ThreadPoolExecutor
+from runner.runner import execute_module
+
+
+# A compiled component which records the order it is used in
+COMPONENT = """
+from pypeline.helpers.parallel_helpers import cons_function_component
+calls = list()
+def get_name():
+  return 'ordered'
+def get_inputs():
+  return ['a']
+def get_outputs():
+  return ['b']
+def get_configuration():
+  return []
+def configure(args):
+  calls.append('configure')
+  return dict()
+def initialise(config):
+  calls.append('initialise')
+  return cons_function_component(lambda a, s: {'b' : a['a']})
+"""
+
+
+class ExecuteModuleTest(unittest.TestCase):
+    def setUp(self):
+        self.module_dir = tempfile.mkdtemp(prefix = "pcl-runner-test-")
+        with open(os.path.join(self.module_dir, "ordered.py"), "w") as f:
+            f.write(COMPONENT)
+
+    def tearDown(self):
+        shutil.rmtree(self.module_dir, ignore_errors = True)
+        sys.modules.pop("ordered", None)
+
+    def test_inputs_are_read_before_initialisation(self):
+        def get_inputs(expected_inputs):
+            sys.modules["ordered"].calls.append('inputs')
+            return dict([(i, 1) for i in expected_inputs])
+
+        executor = ThreadPoolExecutor(max_workers = 1)
+        try:
+            outputs = execute_module(executor, self.module_dir, "ordered", lambda keys: dict(), get_inputs)
+        finally:
+            executor.shutdown(True)
+        self.assertEqual(outputs, (['b'], {'b' : 1}))
+        self.assertEqual(sys.modules["ordered"].calls, ['inputs', 'configure', 'initialise'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+
+from store import SharedStore, file_signature
+
+
+class BuildCache(object):
+    """Records what each PCL file was compiled from: the content of the PCL file, the source files of its imported modules, the compiler version and options, and the generated module. A PCL file whose record still matches need not be compiled again. Files are hashed by content, but their size and modification time are checked first so unchanged files are not read. Several processes may share a cache; only the entries each changed are saved."""
+    __CACHE_FILENAME = ".pclc_cache"
+
+    def __init__(self, cache_dir = "."):
+        self.__store = SharedStore(os.path.join(cache_dir, BuildCache.__CACHE_FILENAME))
+
+    @staticmethod
+    def __is_unchanged(filename, previous):
+        signature = file_signature(filename, previous)
+        return signature is not None and signature['hash'] == previous['hash']
+
+    def is_up_to_date(self, pcl_filename, output_filename, version, options):
+        """Returns True if the PCL file was last compiled to the output file, with the same compiler version and options, and neither it, the output nor its dependencies have changed since."""
+        entry = self.__store.entries.get(os.path.abspath(pcl_filename))
+        if entry is None or \
+           entry['version'] != version or \
+           entry['options'] != options or \
+           entry['output'] != os.path.abspath(output_filename):
+            return False
+
+        files = [(pcl_filename, entry['source']), (output_filename, entry['output_signature'])] + \
+                entry['dependencies'].items()
+        for filename, signature in files:
+            if not BuildCache.__is_unchanged(filename, signature):
+                return False
+        return True
+
+    def record(self, pcl_filename, output_filename, dependencies, version, options):
+        """Records a successful compilation."""
+        entry = {'version' : version,
+                 'options' : options,
+                 'source' : file_signature(pcl_filename),
+                 'output' : os.path.abspath(output_filename),
+                 'output_signature' : file_signature(output_filename),
+                 'dependencies' : dict([(d, file_signature(d)) \
+                                        for d in dependencies \
+                                        if os.path.isfile(d)])}
+        self.__store.put(os.path.abspath(pcl_filename), entry)
+
+    def forget(self, pcl_filename):
+        """Forgets a PCL file, e.g., because it failed to compile."""
+        self.__store.remove(os.path.abspath(pcl_filename))
+
+    def save(self):
+        """Writes the changed entries to the cache, atomically."""
+        self.__store.save()
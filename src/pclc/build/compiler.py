@@ -0,0 +1,96 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import traceback
+
+from parser.helpers import parse_component
+from parser.linker import Linker
+from parser.resolver import Resolver
+from parser.executor import Executor
+
+
+class CompilerError(Exception):
+    """A PCL file failed to compile. The messages are the errors reported."""
+    def __init__(self, pcl_filename, messages):
+        Exception.__init__(self, "%s failed to compile" % pcl_filename)
+        self.pcl_filename = pcl_filename
+        self.messages = messages
+
+
+def get_output_filename(pcl_filename):
+    """Returns the filename of the Python module generated, in the working directory, for a PCL file."""
+    return "%s.py" % os.path.basename(pcl_filename).split(".")[0]
+
+
+def compile_component(pcl_filename,
+                      pcl_import_path,
+                      version,
+                      loglevel = "WARNING",
+                      build_cache = None,
+                      is_linked = False,
+                      **executor_options):
+    """Compiles a PCL file to a Python module in the working directory. If a build cache is given, the file is only compiled if it, its imports, the compiler version or options have changed. If linked, imported PCL node components are inlined into the generated module. Returns a (is compiled, warnings) pair, or raises CompilerError. Executor options are passed on to the code generator."""
+    output_filename = get_output_filename(pcl_filename)
+    # Modules found on a different import path may differ
+    options = dict(executor_options)
+    options['pcl_import_path'] = pcl_import_path
+    if is_linked:
+        options['is_linked'] = True
+    if build_cache is not None and \
+       build_cache.is_up_to_date(pcl_filename, output_filename, version, options):
+        return (False, ())
+
+    # Parse...
+    ast = parse_component(pcl_filename, loglevel)
+    if not ast:
+        raise CompilerError(pcl_filename, [])
+
+    # Resolve...
+    resolver = Resolver(pcl_import_path)
+    resolver.resolve(ast)
+    warnings = resolver.get_warnings()
+    if resolver.has_errors():
+        if build_cache is not None:
+            build_cache.forget(pcl_filename)
+        raise CompilerError(pcl_filename, list(warnings) + list(resolver.get_errors()))
+    dependencies = list(resolver.get_dependencies())
+
+    # Link...
+    if is_linked:
+        linker = Linker(pcl_import_path, loglevel)
+        linker.link(ast)
+        warnings = list(warnings) + list(linker.get_warnings())
+        dependencies.extend([d for d in linker.get_dependencies() if d not in dependencies])
+
+    # Execute.
+    executor = Executor(output_filename[:-len(".py")], **executor_options)
+    try:
+        executor.execute(ast)
+    except Exception as ex:
+        if build_cache is not None:
+            build_cache.forget(pcl_filename)
+        raise CompilerError(pcl_filename,
+                            list(warnings) + [traceback.format_exc(),
+                                              "ERROR: Code generation failed: %s" % ex])
+    warnings = list(warnings) + list(executor.get_warnings())
+
+    if build_cache is not None:
+        build_cache.record(pcl_filename, output_filename, dependencies, version, options)
+
+    return (True, warnings)
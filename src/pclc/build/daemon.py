@@ -0,0 +1,162 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import errno
+import json
+import os
+import socket
+import SocketServer
+import threading
+
+from cache import BuildCache
+from compiler import CompilerError, compile_component
+
+
+class CompileServerError(Exception):
+    pass
+
+
+#
+# Protocol: one JSON object per line in each direction. A request is
+#   {"file" : <PCL file>, "cwd" : <directory>, "import_path" : <PCL import path>,
+#    "options" : <executor options>, "force" : <boolean>}
+# and its response is
+#   {"compiled" : <boolean>, "warnings" : [...], "errors" : [...]}
+# The generated module is written to the request's directory.
+#
+class CompileRequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+
+            response = self.server.compile_request(line)
+            self.wfile.write(json.dumps(response, default = str) + "\n")
+
+
+class CompileServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Compiles PCL files for clients connected to a Unix domain socket. The parser, and the modules imported by the resolver, stay loaded between requests. Compilations change the working directory so are made one at a time."""
+    daemon_threads = True
+
+    def __init__(self, socket_path, version, loglevel):
+        self.__version = version
+        self.__loglevel = loglevel
+        self.__lock = threading.Lock()
+        remove_stale_socket(socket_path)
+        SocketServer.UnixStreamServer.__init__(self, socket_path, CompileRequestHandler)
+
+    def compile_request(self, line):
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as ex:
+                raise CompileServerError("Request is not valid JSON: %s" % ex)
+            if not isinstance(request, dict) or 'file' not in request:
+                raise CompileServerError("Request should be an object with a file member")
+
+            cwd = request.get('cwd', os.getcwd())
+            pcl_filename = os.path.join(cwd, request['file'])
+            executor_options = dict([(str(k), v) for k, v in request.get('options', dict()).iteritems()])
+            with self.__lock:
+                original_cwd = os.getcwd()
+                os.chdir(cwd)
+                build_cache = BuildCache()
+                try:
+                    if request.get('force', False):
+                        build_cache.forget(pcl_filename)
+                    is_compiled, warnings = compile_component(pcl_filename,
+                                                              request.get('import_path', "."),
+                                                              self.__version,
+                                                              self.__loglevel,
+                                                              build_cache,
+                                                              **executor_options)
+                finally:
+                    build_cache.save()
+                    os.chdir(original_cwd)
+            return {'compiled' : is_compiled, 'warnings' : list(warnings), 'errors' : []}
+        except CompilerError as ex:
+            return {'compiled' : False,
+                    'warnings' : [],
+                    'errors' : ex.messages or ["ERROR: Failed to parse %s" % ex.pcl_filename]}
+        except Exception as ex:
+            return {'compiled' : False, 'warnings' : [], 'errors' : ["ERROR: %s" % ex]}
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def remove_stale_socket(socket_path):
+    """Removes a socket file left behind by a server which is no longer running. Raises CompileServerError if a server is listening on it."""
+    if not os.path.exists(socket_path):
+        return
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error as ex:
+        if ex.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+            raise CompileServerError("Cannot use socket %s: %s" % (socket_path, ex))
+        os.unlink(socket_path)
+    else:
+        raise CompileServerError("A server is already listening on %s" % socket_path)
+    finally:
+        sock.close()
+
+
+def serve(socket_path, version, loglevel):
+    """Serves compilation requests on a Unix domain socket until interrupted."""
+    server = CompileServer(socket_path, version, loglevel)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def request_compilation(socket_path, pcl_filename, pcl_import_path, is_forced, **executor_options):
+    """Asks the server listening on the socket to compile a PCL file into the working directory. Returns the decoded response object."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path)
+        except socket.error as ex:
+            raise CompileServerError("Cannot connect to %s: %s" % (socket_path, ex))
+        request = {'file' : os.path.abspath(pcl_filename),
+                   'cwd' : os.getcwd(),
+                   'import_path' : pcl_import_path,
+                   'options' : executor_options,
+                   'force' : is_forced}
+        sock.sendall(json.dumps(request) + "\n")
+        rfile = sock.makefile("rb")
+        try:
+            line = rfile.readline()
+        finally:
+            rfile.close()
+        if not line:
+            raise CompileServerError("Server closed the connection")
+        return json.loads(line)
+    finally:
+        sock.close()
@@ -0,0 +1,169 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import multiprocessing
+import os
+import Queue
+import re
+
+from cache import BuildCache
+from compiler import CompilerError, compile_component
+
+
+class MakeError(Exception):
+    """Components failed to compile. The messages are the errors reported."""
+    def __init__(self, messages):
+        Exception.__init__(self, "Failed to make components")
+        self.messages = messages
+
+
+__IMPORT_PATTERN = re.compile(r"^\s*import\s+(?P<module_name>[A-Za-z_][\w.]*)\s+as\s+\w+", re.MULTILINE)
+
+
+def find_pcl_imports(pcl_filename, pcl_import_paths):
+    """Returns the PCL files imported by a PCL file. Imports are looked for in the import paths and the PCL file's directory; imports of modules that are not PCL files, e.g., runtime Python modules, are ignored."""
+    with open(pcl_filename, "r") as f:
+        source = "\n".join([l for l in f.read().splitlines() if not l.lstrip().startswith("#")])
+
+    search_paths = list(pcl_import_paths) + [os.path.dirname(os.path.abspath(pcl_filename))]
+    imports = list()
+    for m in __IMPORT_PATTERN.finditer(source):
+        relative_filename = os.path.join(*m.group('module_name').split(".")) + ".pcl"
+        for path in search_paths:
+            filename = os.path.abspath(os.path.join(path, relative_filename))
+            if os.path.isfile(filename):
+                if filename not in imports:
+                    imports.append(filename)
+                break
+    return imports
+
+
+def find_import_graph(root_filename, pcl_import_path):
+    """Returns a dictionary of every PCL file reachable from the root to the PCL files it imports."""
+    pcl_import_paths = [os.path.abspath(p) for p in pcl_import_path.split(":") if p] + [os.getcwd()]
+    graph = dict()
+    to_visit = [os.path.abspath(root_filename)]
+    while to_visit:
+        pcl_filename = to_visit.pop()
+        if pcl_filename in graph:
+            continue
+        graph[pcl_filename] = find_pcl_imports(pcl_filename, pcl_import_paths)
+        to_visit.extend(graph[pcl_filename])
+    return graph
+
+
+def topological_order(graph):
+    """Sorts an import graph into dependency order. Raises MakeError if the imports are circular."""
+    remaining = dict([(f, set(deps)) for f, deps in graph.iteritems()])
+    order = list()
+    while remaining:
+        ready = sorted([f for f, deps in remaining.iteritems() if not deps])
+        if not ready:
+            raise MakeError(["ERROR: Circular imports between %s" % ", ".join(sorted(remaining.keys()))])
+        order.extend(ready)
+        for f in ready:
+            del remaining[f]
+        for deps in remaining.itervalues():
+            deps.difference_update(ready)
+    return order
+
+
+def _compile_in_directory(pcl_filename, pcl_import_path, version, loglevel, is_forced, executor_options):
+    # Every failure is returned, since make only hears of the results a
+    # worker returns
+    try:
+        # Generated modules are written next to their PCL files
+        os.chdir(os.path.dirname(pcl_filename))
+        build_cache = BuildCache()
+    except Exception as ex:
+        return (pcl_filename, False, [], ["ERROR: Failed to compile %s: %s" % (pcl_filename, ex)])
+    try:
+        if is_forced:
+            build_cache.forget(pcl_filename)
+        is_compiled, warnings = compile_component(pcl_filename,
+                                                  pcl_import_path,
+                                                  version,
+                                                  loglevel,
+                                                  build_cache,
+                                                  **executor_options)
+        result = (pcl_filename, is_compiled, list(warnings), None)
+    except CompilerError as ex:
+        result = (pcl_filename, False, [], ex.messages or ["ERROR: Failed to parse %s" % pcl_filename])
+    except Exception as ex:
+        result = (pcl_filename, False, [], ["ERROR: Failed to compile %s: %s" % (pcl_filename, ex)])
+    try:
+        build_cache.save()
+    except Exception as ex:
+        result[2].append("WARNING: Failed to save the build cache for %s: %s" % (pcl_filename, ex))
+    return result
+
+
+def make(root_filename, pcl_import_path, version, loglevel, no_workers, is_forced = False, **executor_options):
+    """Compiles a PCL file and every PCL file it imports, directly or indirectly, in dependency order. Each generated module is written next to its PCL file. Files whose imports are compiled are compiled concurrently by a pool of processes. After the first failure no more files are started, and a MakeError reporting every failure is raised once running compilations finish. Returns a list of (PCL file, is compiled, warnings) triples."""
+    graph = find_import_graph(root_filename, pcl_import_path)
+    order = topological_order(graph)
+
+    # Compilations run in the directories of the PCL files, so the import
+    # path, including the current directory, is made absolute
+    pcl_import_path = ":".join([os.path.abspath(p) for p in pcl_import_path.split(":") if p] + [os.getcwd()])
+
+    results = list()
+    errors = list()
+    waiting = dict([(f, set(graph[f])) for f in order])
+    completed = Queue.Queue()
+    running = dict()
+    pool = multiprocessing.Pool(no_workers)
+    try:
+        while waiting or running:
+            if not errors:
+                ready = [f for f in order if f in waiting and not waiting[f]]
+                for pcl_filename in ready:
+                    del waiting[pcl_filename]
+                    running[pcl_filename] = pool.apply_async(_compile_in_directory,
+                                                             (pcl_filename, pcl_import_path, version, loglevel, is_forced, executor_options),
+                                                             callback = completed.put)
+            elif not running:
+                break
+
+            # Wait for the next compilation to finish. Waiting with a
+            # timeout lets the wait be interrupted.
+            try:
+                pcl_filename, is_compiled, warnings, messages = completed.get(True, 1)
+            except Queue.Empty:
+                # The callback is not called for compilations which raised,
+                # e.g., whose results could not be returned from the worker
+                for pcl_filename in [f for f, r in running.iteritems() if r.ready() and not r.successful()]:
+                    try:
+                        running.pop(pcl_filename).get(0)
+                    except Exception as ex:
+                        errors.append("ERROR: Failed to compile %s: %s" % (pcl_filename, ex))
+                continue
+            del running[pcl_filename]
+            if messages:
+                errors.extend(messages)
+            else:
+                results.append((pcl_filename, is_compiled, warnings))
+                for deps in waiting.itervalues():
+                    deps.discard(pcl_filename)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    if errors:
+        raise MakeError(errors)
+    return results
@@ -0,0 +1,119 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import imp
+import inspect
+import os
+
+from store import SharedStore, file_signature
+
+
+def find_module_filename(module_name):
+    """Returns the file a module would be imported from, without importing it or its packages, or None if it cannot be found, e.g., built-in modules or packages which extend their path when imported."""
+    path = None
+    filename = None
+    for name in module_name.split("."):
+        if filename is not None and path is None:
+            # A module, not a package, has no sub-modules
+            return None
+        try:
+            f, filename, description = imp.find_module(name, path)
+        except ImportError:
+            return None
+        if f is not None:
+            f.close()
+        if description[2] == imp.PKG_DIRECTORY:
+            path = [filename]
+        elif description[2] in (imp.PY_SOURCE, imp.PY_COMPILED, imp.C_EXTENSION):
+            path = None
+        else:
+            return None
+
+    if path is not None:
+        # The module is a package so its code is in __init__
+        try:
+            f, filename, description = imp.find_module("__init__", path)
+        except ImportError:
+            return None
+        if f is not None:
+            f.close()
+    return os.path.abspath(filename)
+
+
+class SignatureIndex(object):
+    """Records the signatures of the functions in runtime Python modules, so that a module need not be imported to check calls to it. An entry is keyed by module name and holds the file the module is imported from, and the files defining its functions, by size, modification time and content hash. An entry is only used while the module would be imported from the same file and none of the files have changed. Several processes may share an index; only the entries each changed are saved."""
+    def __init__(self, filename):
+        self.__store = SharedStore(filename)
+
+    def lookup(self, module_name):
+        """Returns the file a module is imported from and a list of its functions' names and argument specifications, or None if the module is not indexed or has changed."""
+        entry = self.__store.entries.get(module_name)
+        if entry is None or find_module_filename(module_name) != entry['filename']:
+            return None
+
+        for filename, signature in entry['sources'].iteritems():
+            current = file_signature(filename, signature)
+            if current is None or current['hash'] != signature['hash']:
+                return None
+
+        # Default values are not kept, only how many there are
+        funcs_and_specs = [(name, inspect.ArgSpec(args, varargs, keywords, (None,) * no_defaults or None)) \
+                           for name, args, varargs, keywords, no_defaults in entry['functions']]
+        return (entry['filename'], funcs_and_specs)
+
+    def record(self, module_name, module, funcs_and_specs):
+        """Records the functions' names and argument specifications of an imported module. Modules, or functions, not defined in files are not recorded."""
+        filename = find_module_filename(module_name)
+        if filename is None or \
+           getattr(module, '__name__', None) != module_name or \
+           os.path.splitext(filename)[0] != os.path.splitext(os.path.abspath(getattr(module, '__file__', "")))[0]:
+            return
+
+        sources = dict()
+        for source_filename in [filename] + [getattr(module, name).func_code.co_filename for name, spec in funcs_and_specs]:
+            source_filename = os.path.abspath(source_filename)
+            if source_filename not in sources:
+                sources[source_filename] = file_signature(source_filename)
+                if sources[source_filename] is None:
+                    return
+
+        entry = {'filename' : filename,
+                 'sources' : sources,
+                 'functions' : [(name, spec.args, spec.varargs, spec.keywords, len(spec.defaults or ())) \
+                                for name, spec in funcs_and_specs]}
+        self.__store.put(module_name, entry)
+
+    def save(self):
+        """Writes the changed entries to the index, atomically."""
+        self.__store.save()
+
+
+INDEX_FILENAME = ".pclc_signatures"
+
+__signature_indexes = dict()
+
+def get_signature_index():
+    """Returns the signature index kept in the current directory, next to the build cache, or in the file named by the PCLC_SIGNATURE_INDEX environment variable. An empty PCLC_SIGNATURE_INDEX disables the index."""
+    filename = os.getenv("PCLC_SIGNATURE_INDEX", INDEX_FILENAME)
+    if not filename:
+        return None
+    filename = os.path.abspath(filename)
+    signature_index = __signature_indexes.get(filename)
+    if signature_index is None:
+        signature_index = __signature_indexes[filename] = SignatureIndex(filename)
+    return signature_index
@@ -0,0 +1,96 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+
+
+def file_signature(filename, previous = None):
+    """Returns the size, modification time and content hash of a file, or None if the file cannot be found. A file whose size and modification time match the previous signature's is not read, and the previous signature is returned."""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    stat = [st.st_size, st.st_mtime]
+    if previous is not None and previous['stat'] == stat:
+        return previous
+
+    sha = hashlib.sha1()
+    with open(filename, "rb") as f:
+        sha.update(f.read())
+    return {'stat' : stat, 'hash' : sha.hexdigest()}
+
+
+class SharedStore(object):
+    """A dictionary of entries kept in a JSON file, which several processes may share. Only the entries a process changed are saved: they are merged with the entries other processes saved, under a lock, and the file is replaced atomically."""
+    def __init__(self, filename):
+        self.__filename = filename
+        self.entries = self.__load()
+        self.__changes = dict()
+
+    def __load(self):
+        try:
+            with open(self.__filename, "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return dict()
+
+    def put(self, key, entry):
+        """Adds, or replaces, an entry."""
+        self.entries[key] = entry
+        self.__changes[key] = entry
+
+    def remove(self, key):
+        """Removes an entry, if there is one."""
+        self.entries.pop(key, None)
+        self.__changes[key] = None
+
+    def save(self):
+        """Writes the changed entries to the file, atomically."""
+        if not self.__changes:
+            return
+        store_dir = os.path.dirname(os.path.abspath(self.__filename))
+        if not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+        with open(self.__filename + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            # Merge with entries saved by other processes
+            entries = self.__load()
+            for key, entry in self.__changes.iteritems():
+                if entry is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = entry
+
+            fd, tmp_filename = tempfile.mkstemp(dir = store_dir)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(entries, f)
+                os.rename(tmp_filename, self.__filename)
+            except (IOError, OSError):
+                try:
+                    os.unlink(tmp_filename)
+                except OSError:
+                    pass
+                raise
+        self.entries = entries
+        self.__changes = dict()
@@ -0,0 +1,145 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import sys
+import time
+
+from cache import BuildCache
+from compiler import CompilerError, compile_component
+from make import MakeError, find_pcl_imports, topological_order
+
+
+class Watcher(object):
+    """Keeps the PCL files in a directory tree compiled. The tree is polled for changed, new and removed PCL files; changed files and the files which import them, directly or indirectly, are recompiled in dependency order. Compilation happens in this process so the parser and imported modules stay loaded. Generated modules are written next to their PCL files."""
+    def __init__(self, directory, pcl_import_path, version, loglevel, **executor_options):
+        self.__directory = os.path.abspath(directory)
+        self.__pcl_import_paths = [os.path.abspath(p) for p in pcl_import_path.split(":") if p] + [os.getcwd()]
+        self.__pcl_import_path = ":".join(self.__pcl_import_paths)
+        self.__version = version
+        self.__loglevel = loglevel
+        self.__executor_options = executor_options
+        self.__mtimes = dict()
+        self.__graph = dict()
+
+    def __scan(self):
+        mtimes = dict()
+        for dirpath, dirnames, filenames in os.walk(self.__directory):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if filename.endswith(".pcl"):
+                    pcl_filename = os.path.join(dirpath, filename)
+                    try:
+                        mtimes[pcl_filename] = os.path.getmtime(pcl_filename)
+                    except OSError:
+                        pass
+        return mtimes
+
+    def __dependants(self, pcl_filenames):
+        affected = set(pcl_filenames)
+        is_growing = True
+        while is_growing:
+            is_growing = False
+            for pcl_filename, imports in self.__graph.iteritems():
+                if pcl_filename not in affected and affected.intersection(imports):
+                    affected.add(pcl_filename)
+                    is_growing = True
+        return affected
+
+    def __compile(self, pcl_filename):
+        # Every failure is reported, so that the files keep being watched
+        cwd = os.getcwd()
+        try:
+            os.chdir(os.path.dirname(pcl_filename))
+            build_cache = BuildCache()
+        except Exception as ex:
+            os.chdir(cwd)
+            return (False, ["ERROR: Failed to compile %s: %s" % (pcl_filename, ex)])
+        try:
+            is_compiled, warnings = compile_component(pcl_filename,
+                                                      self.__pcl_import_path,
+                                                      self.__version,
+                                                      self.__loglevel,
+                                                      build_cache,
+                                                      **self.__executor_options)
+            result = (True, list(warnings) + (["Compiled %s" % pcl_filename] if is_compiled else []))
+        except CompilerError as ex:
+            result = (False, ex.messages or ["ERROR: Failed to parse %s" % pcl_filename])
+        except Exception as ex:
+            result = (False, ["ERROR: Failed to compile %s: %s" % (pcl_filename, ex)])
+        try:
+            build_cache.save()
+        except Exception as ex:
+            result[1].append("WARNING: Failed to save the build cache for %s: %s" % (pcl_filename, ex))
+        finally:
+            os.chdir(cwd)
+        return result
+
+    def update(self):
+        """Compiles the changed PCL files and their dependants. Returns a list of (PCL file, is successful, messages) triples."""
+        mtimes = self.__scan()
+        changed = [f for f in mtimes if self.__mtimes.get(f) != mtimes[f]]
+        removed = [f for f in self.__mtimes if f not in mtimes]
+        self.__mtimes = mtimes
+        if not changed and not removed:
+            return []
+
+        for pcl_filename in removed:
+            self.__graph.pop(pcl_filename, None)
+        for pcl_filename in changed:
+            try:
+                self.__graph[pcl_filename] = find_pcl_imports(pcl_filename, self.__pcl_import_paths)
+            except (IOError, OSError):
+                self.__graph.pop(pcl_filename, None)
+
+        affected = self.__dependants(changed + removed)
+        subgraph = dict([(f, [i for i in self.__graph[f] if i in affected]) \
+                         for f in affected if f in self.__graph])
+        try:
+            order = topological_order(subgraph)
+        except MakeError as ex:
+            return [(self.__directory, False, ex.messages)]
+
+        results = list()
+        failed = set()
+        for pcl_filename in order:
+            # Dependants of a file which failed to compile are not compiled
+            if failed.intersection(self.__graph[pcl_filename]):
+                failed.add(pcl_filename)
+                continue
+            is_ok, messages = self.__compile(pcl_filename)
+            if not is_ok:
+                failed.add(pcl_filename)
+            results.append((pcl_filename, is_ok, messages))
+        return results
+
+    def watch(self, poll_interval, stream = sys.stderr):
+        """Polls the directory tree, compiling as files change, until interrupted."""
+        try:
+            while True:
+                try:
+                    results = self.update()
+                except Exception as ex:
+                    results = [(self.__directory, False, ["ERROR: Failed to update %s: %s" % (self.__directory, ex)])]
+                for pcl_filename, is_ok, messages in results:
+                    for message in messages:
+                        print >> stream, message
+                    stream.flush()
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
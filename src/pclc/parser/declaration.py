@@ -19,11 +19,18 @@
 from entity import Entity
 
 class Declaration(Entity):
-    def __init__(self, filename, lineno, identifier, component_alias, configuration_mappings):
+    def __init__(self, filename, lineno, identifier, component_alias, configuration_mappings, origin = None):
         Entity.__init__(self, filename, lineno)
         self.identifier = identifier
         self.component_alias = component_alias
         self.configuration_mappings = configuration_mappings
+        # The path of declarations, e.g., i1.lowercase, a declaration
+        # inlined by the linker was made from
+        self.origin = origin
+
+    def get_path(self):
+        """Returns the path of declarations this declaration was made from, or its identifier if it was not inlined."""
+        return self.origin or str(self.identifier)
 
     def accept(self, visitor):
         visitor.visit(self)
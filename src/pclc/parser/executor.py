@@ -16,15 +16,31 @@
 # You should have received a copy of the GNU General Public License
 # along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
 #
+from optimiser import Optimiser
 from visitors.pcl_executor_visitor import PCLExecutorVisitor
 from visitors.do_executor_visitor import DoExecutorVisitor
 
 class Executor(object):
-    def __init__(self, filename_root, is_instrumented = False):
+    def __init__(self, filename_root, is_instrumented = False, is_cached = False, is_journalled = False, is_scheduled = False, is_optimised = False):
         self.__filename_root = filename_root
         self.__is_instrumented = is_instrumented
+        self.__is_cached = is_cached
+        self.__is_journalled = is_journalled
+        self.__is_scheduled = is_scheduled
+        self.__is_optimised = is_optimised
+        self.__optimiser = Optimiser()
 
     def execute(self, component):
+        if self.__is_optimised:
+            self.__optimiser.optimise(component)
         executor = DoExecutorVisitor(self.__filename_root, self.__is_instrumented) if component.definition.is_leaf \
-                   else PCLExecutorVisitor(self.__filename_root, self.__is_instrumented)
+                   else PCLExecutorVisitor(self.__filename_root,
+                                           self.__is_instrumented,
+                                           self.__is_cached,
+                                           self.__is_journalled,
+                                           self.__is_scheduled,
+                                           self.__is_optimised)
         component.accept(executor)
+
+    def get_warnings(self):
+        return self.__optimiser.get_warnings()
@@ -23,6 +23,9 @@ from pcl_lexer import PCLLexer
 from pcl_parser import PCLParser
 
 
+__parsers = dict()
+
+
 def parse_component(filename, loglevel = "WARNING"):
     valid_loglevels = filter(lambda k: k in ('CRITICAL', 'ERROR', 'WARNING', 'WARN', 'INFO', 'DEBUG'),
                              logging.__dict__.keys())
@@ -39,8 +42,13 @@ def parse_component(filename, loglevel = "WARNING"):
         )
     logger = logging.getLogger()
 
-    lexer = PCLLexer(logger, debug = 1)
-    parser = PCLParser(lexer, logger, debug = 1, write_tables = 0)
-    ast = parser.parseFile(filename)
+    # Table generation and debugging output is expensive, so tables are
+    # cached and debugging is only done when asked for. Parsers are kept
+    # for long running compilers.
+    if loglevel not in __parsers:
+        is_debug = 1 if loglevel == 'DEBUG' else 0
+        lexer = PCLLexer(logger, debug = is_debug, optimize = 1)
+        __parsers[loglevel] = PCLParser(lexer, logger, debug = is_debug, write_tables = 1)
+    ast = __parsers[loglevel].parseFile(filename)
 
     return ast
@@ -0,0 +1,266 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import copy
+import os
+
+from conditional_expressions import ConditionalExpression, \
+     UnaryConditionalExpression, \
+     TerminalConditionalExpression
+from declaration import Declaration
+from expressions import StateIdentifier, \
+     Identifier, \
+     UnaryExpression, \
+     BinaryExpression, \
+     MergeExpression, \
+     WireExpression, \
+     WireTupleExpression, \
+     IfExpression, \
+     IdentifierExpression
+from helpers import parse_component
+from import_spec import Import
+from mappings import Mapping
+from resolver import Resolver
+
+
+class Linker(object):
+    """Inlines the PCL node components a resolved node component declares. A declaration of an imported node component is replaced by the declarations the imported component makes, and each use of it by the imported component's arrow expression, with the imported component's configuration substituted by the declaration's configuration mappings. Imported components are linked first, so the linked component is a single arrow graph of leaf components and Python modules. An inlined declaration, or import, is named after the declaration it was inlined through and its name in the imported component, separated by a double underscore, e.g., i1__lowercase, with a numeric suffix, e.g., i1__lowercase_1, if that name is already taken. The declaration records the path it was made from, e.g., i1.lowercase, which traces and messages use."""
+    def __init__(self, pcl_import_path, loglevel = "WARNING"):
+        self.__pcl_import_path = pcl_import_path
+        self.__pcl_import_paths = [p for p in pcl_import_path.split(":") if p] + ["."] \
+                                  if pcl_import_path else ["."]
+        self.__loglevel = loglevel
+        self.__warnings = list()
+        self.__dependencies = list()
+        self.__linking = list()
+
+    def link(self, module):
+        component = module.definition
+        if component.is_leaf:
+            return
+        declarations = module.resolution_symbols['components']
+        taken = set([str(d.identifier) for d in declarations] + \
+                    [str(a) for a in module.resolution_symbols['imports']])
+
+        self.__linking.append(os.path.abspath(module.filename))
+        inlined = dict()
+        for decl in [d for d in component.declarations if d in declarations]:
+            imported = self.__load(module, decl)
+            if imported is not None:
+                inlined[str(decl.identifier)] = (imported, self.__inline_declarations(module, decl, imported, taken))
+        self.__linking.pop()
+
+        if inlined:
+            component.definition = Linker.__link_expression(component.definition, inlined)
+            component.definition.parent = None
+            Linker.__forget_imports(module)
+
+    def get_warnings(self):
+        return tuple(self.__warnings)
+
+    def get_dependencies(self):
+        """Returns the PCL files inlined, and the source files of the modules they import."""
+        return tuple(self.__dependencies)
+
+    def __find_pcl_file(self, module_name, imported_module):
+        # Compiled modules are generated next to their PCL file
+        filename = getattr(imported_module, '__file__', None)
+        if filename:
+            pcl_filename = os.path.splitext(filename)[0] + ".pcl"
+            if os.path.isfile(pcl_filename):
+                return os.path.abspath(pcl_filename)
+        relative_filename = os.path.join(*module_name.split(".")) + ".pcl"
+        for path in self.__pcl_import_paths:
+            pcl_filename = os.path.join(path, relative_filename)
+            if os.path.isfile(pcl_filename):
+                return os.path.abspath(pcl_filename)
+        return None
+
+    def __load(self, module, decl):
+        module_spec = module.resolution_symbols['imports'].get(decl.component_alias, dict())
+        if 'module' not in module_spec:
+            return None
+        pcl_filename = self.__find_pcl_file(str(module_spec['module_name_id']), module_spec['module'])
+        if pcl_filename is None or pcl_filename in self.__linking:
+            return None
+
+        imported = parse_component(pcl_filename, self.__loglevel)
+        if not imported or imported.definition.is_leaf:
+            return None
+        resolver = Resolver(self.__pcl_import_path)
+        resolver.resolve(imported)
+        if resolver.has_errors():
+            self.__warnings.append("WARNING: %(filename)s at line %(lineno)d, component %(component)s is not linked " \
+                                   "since %(pcl_filename)s failed to resolve" % \
+                                   {'filename' : decl.filename,
+                                    'lineno' : decl.lineno,
+                                    'component' : decl.identifier,
+                                    'pcl_filename' : pcl_filename})
+            return None
+
+        self.__add_dependencies([pcl_filename] + list(resolver.get_dependencies()))
+        self.link(imported)
+        return imported
+
+    def __add_dependencies(self, filenames):
+        for filename in filenames:
+            if filename not in self.__dependencies:
+                self.__dependencies.append(filename)
+
+    def __inline_declarations(self, module, decl, imported, taken):
+        # The imported component's configuration is what the declaration maps to it
+        substitutions = dict([(str(cm.to), cm.from_) for cm in decl.configuration_mappings])
+
+        # Modules already imported are not imported again. Other imports, and
+        # the declarations, are prefixed with the declaration's identifier
+        module_aliases = dict([(str(i.module_name), i.alias) for i in module.imports])
+        aliases = dict()
+        for an_import in imported.imports:
+            if str(an_import.module_name) in module_aliases:
+                aliases[str(an_import.alias)] = module_aliases[str(an_import.module_name)]
+                continue
+            alias = Identifier(an_import.alias.filename,
+                               an_import.alias.lineno,
+                               Linker.__unique_name("%s__%s" % (decl.identifier, an_import.alias), taken))
+            aliases[str(an_import.alias)] = alias
+            module_aliases[str(an_import.module_name)] = alias
+            linked_import = Import(an_import.filename, an_import.lineno, an_import.module_name, alias)
+            linked_import.module = module
+            module.imports.append(linked_import)
+            module.resolution_symbols['imports'][alias] = imported.resolution_symbols['imports'][an_import.alias]
+
+        names = dict()
+        for inner_decl in [d for d in imported.definition.declarations \
+                           if d in imported.resolution_symbols['components']]:
+            identifier = Identifier(inner_decl.identifier.filename,
+                                    inner_decl.identifier.lineno,
+                                    Linker.__unique_name("%s__%s" % (decl.identifier, inner_decl.identifier), taken))
+            names[str(inner_decl.identifier)] = identifier
+            mappings = [Mapping(cm.filename, cm.lineno, Linker.__substitute_configuration(cm.from_, substitutions), cm.to) \
+                        for cm in inner_decl.configuration_mappings]
+            linked_decl = Declaration(inner_decl.filename,
+                                      inner_decl.lineno,
+                                      identifier,
+                                      aliases[str(inner_decl.component_alias)],
+                                      mappings,
+                                      "%s.%s" % (decl.identifier, inner_decl.get_path()))
+            module.definition.declarations.append(linked_decl)
+            module.resolution_symbols['components'][linked_decl] = linked_decl
+
+        module.definition.declarations.remove(decl)
+        del module.resolution_symbols['components'][decl]
+
+        return (names, substitutions)
+
+    @staticmethod
+    def __unique_name(name, taken):
+        unique_name = name
+        idx = 1
+        while unique_name in taken:
+            unique_name = "%s_%d" % (name, idx)
+            idx += 1
+        taken.add(unique_name)
+        return unique_name
+
+    @staticmethod
+    def __substitute_configuration(from_, substitutions):
+        # Configuration is mapped from identifiers, or literals
+        if isinstance(from_, Identifier):
+            return substitutions[str(from_)]
+        return from_
+
+    @staticmethod
+    def __substitute_condition(cond_expr, substitutions):
+        linked_cond_expr = copy.copy(cond_expr)
+        if isinstance(cond_expr, ConditionalExpression):
+            linked_cond_expr.left = Linker.__substitute_condition(cond_expr.left, substitutions)
+            linked_cond_expr.right = Linker.__substitute_condition(cond_expr.right, substitutions)
+        elif isinstance(cond_expr, UnaryConditionalExpression):
+            linked_cond_expr.expression = Linker.__substitute_condition(cond_expr.expression, substitutions)
+        elif isinstance(cond_expr, TerminalConditionalExpression) and \
+             isinstance(cond_expr.terminal, StateIdentifier):
+            substitute = substitutions[cond_expr.terminal.identifier]
+            linked_cond_expr.terminal = StateIdentifier(cond_expr.terminal.filename,
+                                                        cond_expr.terminal.lineno,
+                                                        substitute.identifier) \
+                                        if isinstance(substitute, Identifier) else substitute
+        return linked_cond_expr
+
+    @staticmethod
+    def __link_expression(expr, inlined):
+        if isinstance(expr, IdentifierExpression):
+            if str(expr.identifier) in inlined:
+                imported, (names, substitutions) = inlined[str(expr.identifier)]
+                return Linker.__copy_expression(imported.definition.definition, names, substitutions)
+        elif isinstance(expr, UnaryExpression):
+            expr.expression = Linker.__link_expression(expr.expression, inlined)
+            expr.expression.parent = expr
+        elif isinstance(expr, BinaryExpression):
+            expr.left = Linker.__link_expression(expr.left, inlined)
+            expr.right = Linker.__link_expression(expr.right, inlined)
+            expr.left.parent = expr.right.parent = expr
+        elif isinstance(expr, IfExpression):
+            expr.then = Linker.__link_expression(expr.then, inlined)
+            expr.else_ = Linker.__link_expression(expr.else_, inlined)
+            expr.then.parent = expr.else_.parent = expr
+        return expr
+
+    @staticmethod
+    def __copy_expression(expr, names, substitutions):
+        # An imported component may be used more than once, so each use is a copy
+        linked_expr = copy.copy(expr)
+        linked_expr.resolution_symbols = dict(expr.resolution_symbols)
+        if isinstance(expr, IdentifierExpression):
+            linked_expr.identifier = names[str(expr.identifier)]
+        elif isinstance(expr, UnaryExpression):
+            linked_expr.expression = Linker.__copy_expression(expr.expression, names, substitutions)
+            linked_expr.expression.parent = linked_expr
+        elif isinstance(expr, BinaryExpression):
+            linked_expr.left = Linker.__copy_expression(expr.left, names, substitutions)
+            linked_expr.right = Linker.__copy_expression(expr.right, names, substitutions)
+            linked_expr.left.parent = linked_expr.right.parent = linked_expr
+        elif isinstance(expr, IfExpression):
+            linked_expr.condition = Linker.__substitute_condition(expr.condition, substitutions)
+            linked_expr.then = Linker.__copy_expression(expr.then, names, substitutions)
+            linked_expr.else_ = Linker.__copy_expression(expr.else_, names, substitutions)
+            linked_expr.then.parent = linked_expr.else_.parent = linked_expr
+        elif isinstance(expr, WireExpression):
+            linked_expr.mapping = Linker.__copy_mappings(expr.mapping, linked_expr)
+        elif isinstance(expr, WireTupleExpression):
+            linked_expr.top_mapping = Linker.__copy_mappings(expr.top_mapping, linked_expr)
+            linked_expr.bottom_mapping = Linker.__copy_mappings(expr.bottom_mapping, linked_expr)
+        elif isinstance(expr, MergeExpression):
+            linked_expr.top_mapping = Linker.__copy_mappings(expr.top_mapping, linked_expr)
+            linked_expr.bottom_mapping = Linker.__copy_mappings(expr.bottom_mapping, linked_expr)
+            linked_expr.literal_mapping = Linker.__copy_mappings(expr.literal_mapping, linked_expr)
+        return linked_expr
+
+    @staticmethod
+    def __copy_mappings(mappings, parent):
+        linked_mappings = [copy.copy(m) for m in mappings]
+        for m in linked_mappings:
+            m.parent = parent
+        return linked_mappings
+
+    @staticmethod
+    def __forget_imports(module):
+        # Imports of inlined components are no longer used
+        aliases = frozenset([str(d.component_alias) for d in module.resolution_symbols['components']])
+        for an_import in [i for i in module.imports if str(i.alias) not in aliases]:
+            module.imports.remove(an_import)
+            del module.resolution_symbols['imports'][an_import.alias]
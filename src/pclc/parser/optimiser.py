@@ -0,0 +1,342 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+from conditional_expressions import ConditionalExpression, \
+     UnaryConditionalExpression, \
+     TerminalConditionalExpression
+from expressions import StateIdentifier, \
+     Identifier, \
+     UnaryExpression, \
+     CompositionExpression, \
+     ParallelWithTupleExpression, \
+     ParallelWithScalarExpression, \
+     FirstExpression, \
+     SecondExpression, \
+     SplitExpression, \
+     MergeExpression, \
+     WireExpression, \
+     WireTupleExpression, \
+     IfExpression, \
+     IdentifierExpression
+from mappings import Mapping, TopMapping, BottomMapping, LiteralMapping
+from pypeline.core.types.just import Just
+
+
+class Optimiser(object):
+    """Rewrites the resolved arrow expression of a node component into an equivalent expression with fewer arrows. Composition chains are flattened, adjacent wires, splits and merges are fused into single wires or merges, and identity wires are dropped. Ports which do not flow to the component's outputs are pruned from wires and merges, and declared components none of whose outputs are used are not evaluated."""
+    def __init__(self):
+        self.__warnings = list()
+        self.__pruned_declarations = set()
+        self.__paths = dict()
+
+    def optimise(self, module):
+        component = module.definition
+        if component.is_leaf:
+            return
+        # Components are named by their declaration paths in warnings
+        self.__paths = dict([(str(decl.identifier), decl.get_path()) \
+                             for decl in module.resolution_symbols['components']])
+        expr = Optimiser.__optimise_expression(component.definition, True)
+        expr = self.__prune(expr, Optimiser.__names(component.outputs))[0]
+        # Pruned wires may pass on fewer ports than they are given, so
+        # identity wires are no longer dropped
+        expr = Optimiser.__optimise_expression(expr, False)
+        expr.parent = None
+        component.definition = expr
+        Optimiser.__forget_unused_declarations(module, self.__pruned_declarations)
+
+    def get_warnings(self):
+        return tuple(self.__warnings)
+
+    @staticmethod
+    def __optimise_expression(expr, is_dropping_identities):
+        # Parentheses only group
+        if expr.__class__ is UnaryExpression:
+            return Optimiser.__optimise_expression(expr.expression, is_dropping_identities)
+        elif isinstance(expr, CompositionExpression):
+            chain = [Optimiser.__optimise_expression(e, is_dropping_identities) for e in Optimiser.__flatten(expr)]
+            return Optimiser.__compose(Optimiser.__fuse(chain, is_dropping_identities))
+        elif isinstance(expr, ParallelWithTupleExpression):
+            left = Optimiser.__optimise_expression(expr.left, is_dropping_identities)
+            right = Optimiser.__optimise_expression(expr.right, is_dropping_identities)
+            if isinstance(left, WireExpression) and isinstance(right, WireExpression):
+                return Optimiser.__resolved(WireTupleExpression(expr.filename, expr.lineno, left.mapping, right.mapping),
+                                            expr.resolution_symbols['inputs'],
+                                            expr.resolution_symbols['outputs'])
+            expr.left, expr.right = left, right
+            left.parent = right.parent = expr
+        elif isinstance(expr, ParallelWithScalarExpression):
+            expr.left = Optimiser.__optimise_expression(expr.left, is_dropping_identities)
+            expr.right = Optimiser.__optimise_expression(expr.right, is_dropping_identities)
+            expr.left.parent = expr.right.parent = expr
+        elif isinstance(expr, (FirstExpression, SecondExpression)):
+            expr.expression = Optimiser.__optimise_expression(expr.expression, is_dropping_identities)
+            expr.expression.parent = expr
+        elif isinstance(expr, IfExpression):
+            expr.then = Optimiser.__optimise_expression(expr.then, is_dropping_identities)
+            expr.else_ = Optimiser.__optimise_expression(expr.else_, is_dropping_identities)
+            expr.then.parent = expr.else_.parent = expr
+        return expr
+
+    @staticmethod
+    def __flatten(expr):
+        if expr.__class__ is UnaryExpression:
+            return Optimiser.__flatten(expr.expression)
+        elif isinstance(expr, CompositionExpression):
+            return Optimiser.__flatten(expr.left) + Optimiser.__flatten(expr.right)
+        else:
+            return [expr]
+
+    @staticmethod
+    def __compose(chain):
+        expr = chain[0]
+        for right in chain[1:]:
+            expr = Optimiser.__resolved(CompositionExpression(right.filename, right.lineno, expr, right),
+                                        expr.resolution_symbols.get('inputs'),
+                                        right.resolution_symbols.get('outputs'))
+        return expr
+
+    @staticmethod
+    def __fuse(chain, is_dropping_identities):
+        # Rewrite adjacent pairs until none can be, stepping back after each
+        # rewrite as the result may fuse with its predecessor
+        idx = 0
+        while idx < len(chain) - 1:
+            following = chain[idx + 2] if idx + 2 < len(chain) else None
+            fused = Optimiser.__fuse_pair(chain[idx], chain[idx + 1], following, is_dropping_identities)
+            if fused is None:
+                idx += 1
+            else:
+                chain[idx:idx + 2] = fused
+                idx = max(0, idx - 1)
+        return chain
+
+    @staticmethod
+    def __fuse_pair(left, right, following, is_dropping_identities):
+        if is_dropping_identities and Optimiser.__is_identity(left):
+            return [right]
+        elif is_dropping_identities and Optimiser.__is_identity(right):
+            return [left]
+
+        inputs = left.resolution_symbols.get('inputs')
+        outputs = right.resolution_symbols.get('outputs')
+        if isinstance(left, WireExpression) and isinstance(right, WireExpression):
+            mapping = Optimiser.__compose_mappings(left.mapping, right.mapping)
+            fused = WireExpression(left.filename, left.lineno, mapping) if mapping is not None else None
+        elif isinstance(left, WireTupleExpression) and isinstance(right, WireTupleExpression):
+            top_mapping = Optimiser.__compose_mappings(left.top_mapping, right.top_mapping)
+            bottom_mapping = Optimiser.__compose_mappings(left.bottom_mapping, right.bottom_mapping)
+            fused = WireTupleExpression(left.filename, left.lineno, top_mapping, bottom_mapping) \
+                    if top_mapping is not None and bottom_mapping is not None else None
+        elif isinstance(left, MergeExpression) and isinstance(right, WireExpression):
+            mapping = Optimiser.__compose_mappings(left.top_mapping + left.bottom_mapping + left.literal_mapping,
+                                                   right.mapping)
+            fused = MergeExpression(left.filename, left.lineno, list(mapping)) if mapping is not None else None
+        elif isinstance(left, WireTupleExpression) and isinstance(right, MergeExpression):
+            top_mapping = Optimiser.__compose_mappings(left.top_mapping, right.top_mapping, TopMapping)
+            bottom_mapping = Optimiser.__compose_mappings(left.bottom_mapping, right.bottom_mapping, BottomMapping)
+            fused = MergeExpression(right.filename, right.lineno, list(top_mapping) + list(bottom_mapping) + list(right.literal_mapping)) \
+                    if top_mapping is not None and bottom_mapping is not None else None
+        elif isinstance(left, SplitExpression) and isinstance(right, MergeExpression):
+            # Both sides of the split are the split's input
+            mapping = [Mapping(m.filename, m.lineno, m.from_, m.to) \
+                       for m in right.top_mapping + right.bottom_mapping \
+                       if str(m.to) != '_'] + list(right.literal_mapping)
+            fused = WireExpression(right.filename, right.lineno, tuple(mapping))
+        elif isinstance(left, WireExpression) and isinstance(right, SplitExpression) and \
+             isinstance(following, (WireTupleExpression, MergeExpression)):
+            # Wire before the split on both sides, so it fuses with what follows
+            split = Optimiser.__resolved(SplitExpression(right.filename, right.lineno),
+                                         inputs,
+                                         left.resolution_symbols.get('outputs') >= (lambda outs: Just((outs, outs))))
+            wires = WireTupleExpression(left.filename, left.lineno, list(left.mapping), list(left.mapping))
+            return [split, Optimiser.__resolved(wires, split.resolution_symbols['outputs'], outputs)]
+        else:
+            fused = None
+
+        return [Optimiser.__resolved(fused, inputs, outputs)] if fused is not None else None
+
+    @staticmethod
+    def __compose_mappings(first_mapping, second_mapping, mapping_class = None):
+        """Returns the mapping of the second mapping's targets to the first mapping's sources, or None if a source cannot be found. Sources which are mappings keep their class unless one is given."""
+        sources = dict([(str(m.to), m) for m in first_mapping if str(m.to) != '_'])
+        mapping = list()
+        for m in second_mapping:
+            if str(m.to) == '_':
+                continue
+            elif isinstance(m, LiteralMapping):
+                mapping.append(LiteralMapping(m.filename, m.lineno, m.literal, m.to))
+                continue
+
+            source = sources.get(str(m.from_))
+            if source is None:
+                return None
+            elif isinstance(source, LiteralMapping):
+                mapping.append(LiteralMapping(m.filename, m.lineno, source.literal, m.to))
+            else:
+                mapping.append((mapping_class or source.__class__)(m.filename, m.lineno, source.from_, m.to))
+        return tuple(mapping)
+
+    @staticmethod
+    def __is_identity(expr):
+        is_identity_mapping = lambda mapping: len(mapping) > 0 and \
+                                              all([isinstance(m, Mapping) and \
+                                                   str(m.to) != '_' and \
+                                                   m.from_ == m.to for m in mapping])
+        if isinstance(expr, WireExpression):
+            return is_identity_mapping(expr.mapping)
+        elif isinstance(expr, WireTupleExpression):
+            return is_identity_mapping(expr.top_mapping) and is_identity_mapping(expr.bottom_mapping)
+        return False
+
+    @staticmethod
+    def __resolved(expr, inputs, outputs):
+        expr.resolution_symbols['inputs'] = inputs
+        expr.resolution_symbols['outputs'] = outputs
+        return expr
+
+    def __prune(self, expr, live):
+        """Prunes the ports of an expression's outputs which are not live. Returns the pruned expression and its live inputs. Live ports are a set of names, or a pair of sets for tuple types."""
+        if isinstance(expr, CompositionExpression):
+            expr.right, right_live = self.__prune(expr.right, live)
+            expr.left, left_live = self.__prune(expr.left, right_live)
+            expr.left.parent = expr.right.parent = expr
+            return (expr, left_live)
+        elif isinstance(expr, (ParallelWithTupleExpression, ParallelWithScalarExpression)):
+            expr.left, top_live = self.__prune(expr.left, live[0])
+            expr.right, bottom_live = self.__prune(expr.right, live[1])
+            expr.left.parent = expr.right.parent = expr
+            return (expr, (top_live, bottom_live) if isinstance(expr, ParallelWithTupleExpression) \
+                          else Optimiser.__union(top_live, bottom_live))
+        elif isinstance(expr, FirstExpression):
+            expr.expression, top_live = self.__prune(expr.expression, live[0])
+            expr.expression.parent = expr
+            return (expr, (top_live, live[1]))
+        elif isinstance(expr, SecondExpression):
+            expr.expression, bottom_live = self.__prune(expr.expression, live[1])
+            expr.expression.parent = expr
+            return (expr, (live[0], bottom_live))
+        elif isinstance(expr, UnaryExpression):
+            expr.expression, live = self.__prune(expr.expression, live)
+            expr.expression.parent = expr
+            return (expr, live)
+        elif isinstance(expr, SplitExpression):
+            return (expr, Optimiser.__union(live[0], live[1]))
+        elif isinstance(expr, MergeExpression):
+            is_live = lambda m: str(m.to) in live
+            expr.top_mapping = filter(is_live, expr.top_mapping)
+            expr.bottom_mapping = filter(is_live, expr.bottom_mapping)
+            expr.literal_mapping = filter(is_live, expr.literal_mapping)
+            return (expr, (Optimiser.__mapping_inputs(expr.top_mapping), Optimiser.__mapping_inputs(expr.bottom_mapping)))
+        elif isinstance(expr, WireExpression):
+            expr.mapping = tuple([m for m in expr.mapping if str(m.to) in live])
+            return (expr, Optimiser.__mapping_inputs(expr.mapping))
+        elif isinstance(expr, WireTupleExpression):
+            expr.top_mapping = tuple([m for m in expr.top_mapping if str(m.to) in live[0]])
+            expr.bottom_mapping = tuple([m for m in expr.bottom_mapping if str(m.to) in live[1]])
+            return (expr, (Optimiser.__mapping_inputs(expr.top_mapping), Optimiser.__mapping_inputs(expr.bottom_mapping)))
+        elif isinstance(expr, IfExpression):
+            expr.then, then_live = self.__prune(expr.then, live)
+            expr.else_, else_live = self.__prune(expr.else_, live)
+            expr.then.parent = expr.else_.parent = expr
+            live = Optimiser.__union(then_live, else_live)
+            return (expr, live.union(Optimiser.__condition_inputs(expr.condition)) if isinstance(live, frozenset) else live)
+        elif isinstance(expr, IdentifierExpression):
+            inputs = Optimiser.__names(expr.resolution_symbols['inputs'] >= (lambda ins: ins))
+            outputs = Optimiser.__names(expr.resolution_symbols['outputs'] >= (lambda outs: outs))
+            if Optimiser.__is_empty(live) and not Optimiser.__is_empty(outputs):
+                # Wires without mappings stand in for the component
+                if isinstance(outputs, frozenset):
+                    replacement = WireExpression(expr.filename, expr.lineno, tuple())
+                elif isinstance(inputs, tuple):
+                    replacement = WireTupleExpression(expr.filename, expr.lineno, tuple(), tuple())
+                else:
+                    return (expr, inputs)
+                self.__warnings.append("WARNING: %(filename)s at line %(lineno)d, none of the outputs of component " \
+                                       "%(component)s are used so it is not evaluated" % \
+                                       {'filename' : expr.filename,
+                                        'lineno' : expr.lineno,
+                                        'component' : self.__paths.get(str(expr.identifier), expr.identifier)})
+                self.__pruned_declarations.add(str(expr.identifier))
+                return (Optimiser.__resolved(replacement, expr.resolution_symbols['inputs'], Just(Optimiser.__empty(outputs))),
+                        Optimiser.__empty(inputs))
+            return (expr, inputs)
+        return (expr, live)
+
+    @staticmethod
+    def __forget_unused_declarations(module, identifiers):
+        """Removes the declarations, of the given identifiers, which are no longer used from the module's components, so they are not constructed."""
+        used = set()
+        exprs = [module.definition.definition]
+        while exprs:
+            expr = exprs.pop()
+            if isinstance(expr, IdentifierExpression):
+                used.add(str(expr.identifier))
+            elif isinstance(expr, UnaryExpression):
+                exprs.append(expr.expression)
+            elif isinstance(expr, IfExpression):
+                exprs.extend([expr.then, expr.else_])
+            elif isinstance(expr, (CompositionExpression, ParallelWithTupleExpression, ParallelWithScalarExpression)):
+                exprs.extend([expr.left, expr.right])
+
+        components = module.resolution_symbols['components']
+        for decl in components.keys():
+            if str(decl.identifier) in identifiers and str(decl.identifier) not in used:
+                del components[decl]
+
+    @staticmethod
+    def __condition_inputs(cond_expr):
+        if isinstance(cond_expr, TerminalConditionalExpression):
+            terminal = cond_expr.terminal
+            return frozenset([str(terminal)]) \
+                   if isinstance(terminal, Identifier) and not isinstance(terminal, StateIdentifier) \
+                   else frozenset()
+        elif isinstance(cond_expr, ConditionalExpression):
+            return Optimiser.__condition_inputs(cond_expr.left).union(Optimiser.__condition_inputs(cond_expr.right))
+        elif isinstance(cond_expr, UnaryConditionalExpression):
+            return Optimiser.__condition_inputs(cond_expr.expression)
+        return frozenset()
+
+    @staticmethod
+    def __mapping_inputs(mapping):
+        return frozenset([str(m.from_) for m in mapping if isinstance(m, Mapping)])
+
+    @staticmethod
+    def __names(ports):
+        if isinstance(ports, tuple):
+            return (Optimiser.__names(ports[0]), Optimiser.__names(ports[1]))
+        return frozenset([str(p) for p in ports])
+
+    @staticmethod
+    def __empty(ports):
+        return (frozenset(), frozenset()) if isinstance(ports, tuple) else frozenset()
+
+    @staticmethod
+    def __is_empty(ports):
+        if isinstance(ports, tuple):
+            return len(ports[0]) == 0 and len(ports[1]) == 0
+        return len(ports) == 0
+
+    @staticmethod
+    def __union(first_ports, second_ports):
+        if isinstance(first_ports, tuple) and isinstance(second_ports, tuple):
+            return (first_ports[0].union(second_ports[0]), first_ports[1].union(second_ports[1]))
+        elif isinstance(first_ports, tuple) or isinstance(second_ports, tuple):
+            # Mismatched types have been reported by the resolver
+            return first_ports
+        return first_ports.union(second_ports)
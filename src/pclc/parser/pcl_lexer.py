@@ -19,6 +19,7 @@
 #
 # Pipeline Creation Language Lexical Analysis
 #
+import os
 import sys
 import ply.lex as lex
 
@@ -140,8 +141,36 @@ class PCLLexer(object):
             kwargs['debuglog'] = logger
         if 'errorlog' not in kwargs:
             kwargs['errorlog'] = logger
+        if kwargs.get('optimize'):
+            PCLLexer.__prepare_lextab(kwargs)
         self.__lexer = lex.lex(module = self, **kwargs)
 
+    @staticmethod
+    def __prepare_lextab(kwargs):
+        # Optimised lexers are built from a table, next to this module,
+        # which PLY does not check against the token rules. Regenerate it
+        # when this module is newer.
+        outputdir = os.path.dirname(os.path.abspath(__file__))
+        kwargs.setdefault('lextab', __name__.rpartition('.')[0] + '.pcl_lextab' if '.' in __name__ else 'pcl_lextab')
+        kwargs.setdefault('outputdir', outputdir)
+
+        lextab_filename = os.path.join(kwargs['outputdir'], kwargs['lextab'].split('.')[-1] + '.py')
+        lexer_filename = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+        try:
+            if os.path.exists(lextab_filename) and \
+               os.path.getmtime(lextab_filename) < os.path.getmtime(lexer_filename):
+                for filename in (lextab_filename, lextab_filename + 'c'):
+                    if os.path.exists(filename):
+                        os.unlink(filename)
+        except OSError:
+            # A stale table which cannot be removed must not be used
+            kwargs['optimize'] = 0
+            return
+
+        # Fall back to an unoptimised lexer if the table cannot be written
+        if not os.path.exists(lextab_filename) and not os.access(kwargs['outputdir'], os.W_OK):
+            kwargs['optimize'] = 0
+
     def input(self, input):
         self.__lexer.input(input)
 
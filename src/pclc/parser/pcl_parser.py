@@ -19,6 +19,7 @@
 #
 # Pipeline Creation Language Parser
 #
+import os
 import ply.yacc as yacc
 import sys
 
@@ -548,10 +549,17 @@ class PCLParser(object):
             kwargs['debuglog'] = logger
         if 'errorlog' not in kwargs:
             kwargs['errorlog'] = logger
+        # The parser tables are kept next to this module. PLY regenerates
+        # them when the grammar's signature changes.
+        kwargs.setdefault('tabmodule', __name__.rpartition('.')[0] + '.pcl_parsetab' if '.' in __name__ else 'pcl_parsetab')
+        kwargs.setdefault('outputdir', os.path.dirname(os.path.abspath(__file__)))
+        if not os.access(kwargs['outputdir'], os.W_OK):
+            kwargs['write_tables'] = 0
         self.__parser = yacc.yacc(**kwargs)
 
     def parseFile(self, filename, **kwargs):
         self.__parser.filename = filename
+        self.__lexer.getLexer().lineno = 1
         f = open(filename, "r")
         return self.__parser.parse(input = f.read(),
                                    lexer = self.__lexer,
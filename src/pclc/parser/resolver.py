@@ -31,6 +31,9 @@ class Resolver(object):
         for visitor in self.__visitors:
             ast.accept(visitor)
 
+    def get_dependencies(self):
+        return self.__visitors[0].get_dependencies()
+
     def has_warnings(self):
         return reduce(lambda acc, r: acc + int(r.has_warnings()),
                       self.__visitors,
@@ -17,17 +17,20 @@
 # You should have received a copy of the GNU General Public License
 # along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
 #
+import multiprocessing
 import os
+import socket
 import sys
-import traceback
 
+from build.cache import BuildCache
+from build.compiler import CompilerError, compile_component
+from build.daemon import CompileServerError, request_compilation, serve
+from build.make import MakeError, make
+from build.watch import Watcher
 from optparse import OptionParser
-from parser.helpers import parse_component
-from parser.resolver import Resolver
-from parser.executor import Executor
 
 
-__VERSION = "1.2.0"
+__VERSION = "1.3.0"
 
 
 if __name__ == '__main__':
@@ -44,12 +47,82 @@ if __name__ == '__main__':
                       default = False,
                       dest = "is_instrumented",
                       help = "Generated code shall instrument components")
+    parser.add_option("-c",
+                      "--cache",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_cached",
+                      help = "Generated code shall cache the outputs of declared components")
+    parser.add_option("-j",
+                      "--journal",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_journalled",
+                      help = "Generated code shall journal the outputs of declared components so runs can be resumed")
+    parser.add_option("-s",
+                      "--schedule",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_scheduled",
+                      help = "Generated code shall wait for the resources required by declared components")
+    parser.add_option("-O",
+                      "--optimise",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_optimised",
+                      help = "Generated code shall fuse adjacent wires, splits and merges, drop identity wires, not compute unused outputs " \
+                             "and choose the branches of if-expressions on configuration once")
+    parser.add_option("-L",
+                      "--link",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_linked",
+                      help = "Generated code shall inline imported PCL components, so the pipeline is a single arrow graph")
     parser.add_option("-v",
                       "--version",
                       action = "store_true",
                       default = False,
                       dest = "version",
                       help = "show version and exit")
+    parser.add_option("-f",
+                      "--force",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_forced",
+                      help = "compile even if the generated module is up to date")
+    parser.add_option("-m",
+                      "--make",
+                      action = "store_true",
+                      default = False,
+                      dest = "is_make",
+                      help = "compile the PCL file and every PCL file it imports, in dependency order, " \
+                             "writing each generated module next to its PCL file")
+    parser.add_option("-w",
+                      "--workers",
+                      type = "int",
+                      default = multiprocessing.cpu_count(),
+                      dest = "no_workers",
+                      help = "number of concurrent compilations with --make [default: %default]")
+    parser.add_option("--watch",
+                      default = None,
+                      dest = "watch_dir",
+                      metavar = "DIR",
+                      help = "keep the PCL files under DIR compiled, recompiling changed files and their importers")
+    parser.add_option("--poll-interval",
+                      type = "float",
+                      default = 1.0,
+                      dest = "poll_interval",
+                      help = "seconds between checks for changed files with --watch [default: %default]")
+    parser.add_option("--daemon",
+                      default = None,
+                      dest = "daemon_socket",
+                      metavar = "SOCKET",
+                      help = "serve compilation requests on a Unix domain socket, keeping the compiler loaded")
+    parser.add_option("--connect",
+                      default = None,
+                      dest = "connect_socket",
+                      metavar = "SOCKET",
+                      help = "compile the PCL file using the compiler serving requests on a Unix domain socket")
     (options, args) = parser.parse_args()
 
     # Show version?
@@ -57,6 +130,35 @@ if __name__ == '__main__':
         print __VERSION
         sys.exit(0)
 
+    executor_options = {'is_instrumented' : options.is_instrumented,
+                        'is_cached' : options.is_cached,
+                        'is_journalled' : options.is_journalled,
+                        'is_scheduled' : options.is_scheduled,
+                        'is_optimised' : options.is_optimised,
+                        'is_linked' : options.is_linked}
+
+    # Keep a directory tree compiled?
+    if options.watch_dir is not None:
+        if os.path.isdir(options.watch_dir) is False:
+            print >> sys.stderr, "ERROR: Cannot find directory %s" % options.watch_dir
+            sys.exit(1)
+        watcher = Watcher(options.watch_dir,
+                          os.getenv("PCL_IMPORT_PATH", "."),
+                          __VERSION,
+                          options.loglevel,
+                          **executor_options)
+        watcher.watch(max(0.1, options.poll_interval))
+        sys.exit(0)
+
+    # Serve compilation requests?
+    if options.daemon_socket is not None:
+        try:
+            serve(options.daemon_socket, __VERSION, options.loglevel)
+        except (CompileServerError, socket.error) as ex:
+            print >> sys.stderr, "ERROR: %s" % ex
+            sys.exit(1)
+        sys.exit(0)
+
     # Check we've got at least one command line argument
     if len(args) < 1:
         print >> sys.stderr, "ERROR: no input file"
@@ -75,28 +177,63 @@ if __name__ == '__main__':
         print >> sys.stderr, "ERROR: Cannot find file %s" % pcl_filename
         sys.exit(1)
 
-    # Parse...
-    ast = parse_component(pcl_filename, options.loglevel)
-    if not ast:
-        sys.exit(1)
+    # Compile using a compiler daemon?
+    if options.connect_socket is not None:
+        try:
+            response = request_compilation(options.connect_socket,
+                                           pcl_filename,
+                                           os.getenv("PCL_IMPORT_PATH", "."),
+                                           options.is_forced,
+                                           **executor_options)
+        except (CompileServerError, socket.error) as ex:
+            print >> sys.stderr, "ERROR: %s" % ex
+            sys.exit(1)
+        for message in response['warnings'] + response['errors']:
+            print >> sys.stderr, message
+        sys.exit(1 if response['errors'] else 0)
 
-    # Resolve...
-    resolver = Resolver(os.getenv("PCL_IMPORT_PATH", "."))
-    resolver.resolve(ast)
-    for warning in resolver.get_warnings():
-        print >> sys.stderr, warning
-    if resolver.has_errors():
-        for error in resolver.get_errors():
-            print >> sys.stderr, error
-        sys.exit(1)
+    # Compile the whole import graph?
+    if options.is_make:
+        try:
+            for filename, is_compiled, warnings in make(pcl_filename,
+                                                        os.getenv("PCL_IMPORT_PATH", "."),
+                                                        __VERSION,
+                                                        options.loglevel,
+                                                        max(1, options.no_workers),
+                                                        options.is_forced,
+                                                        **executor_options):
+                for warning in warnings:
+                    print >> sys.stderr, warning
+        except MakeError as ex:
+            for message in ex.messages:
+                print >> sys.stderr, message
+            sys.exit(1)
+        except IOError as ex:
+            print >> sys.stderr, "ERROR: %s" % ex
+            sys.exit(1)
+        sys.exit(0)
 
-    # Execute.
-    executor = Executor(basename_bits[0], options.is_instrumented)
+    # Compile, unless nothing has changed since the last compilation
+    build_cache = BuildCache()
+    if options.is_forced:
+        build_cache.forget(pcl_filename)
     try:
-        executor.execute(ast)
-    except Exception as ex:
-        print >> sys.stderr, traceback.format_exc()
-        print >> sys.stderr, "ERROR: Code generation failed: %s" % ex
+        is_compiled, warnings = compile_component(pcl_filename,
+                                                  os.getenv("PCL_IMPORT_PATH", "."),
+                                                  __VERSION,
+                                                  options.loglevel,
+                                                  build_cache,
+                                                  **executor_options)
+        for warning in warnings:
+            print >> sys.stderr, warning
+    except CompilerError as ex:
+        for message in ex.messages:
+            print >> sys.stderr, message
         sys.exit(1)
+    finally:
+        try:
+            build_cache.save()
+        except (IOError, OSError) as ex:
+            print >> sys.stderr, "WARNING: Failed to save build cache: %s" % ex
 
     sys.exit(0)
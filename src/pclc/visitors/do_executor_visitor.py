@@ -173,12 +173,15 @@ class IntermediateRepresentation(object):
             scope = function['scope']
 
             if is_instrumented:
-                code.append(("____instr_command_begin('%s', %d, '%s', a, s)" % (function.filename, function.lineno, function),
+                code.append(("____instr_span = ____instr_command_begin('%s', %d, '%s', a, s)" % (function.filename, function.lineno, function),
                              ""))
 
             tmp_var = self.__var_name_generator.get_name(function, scope)
             code.append(("%s = %s" % (tmp_var, generate_function_call(function, scope)),
                          ""))
+            if is_instrumented:
+                code.append(("____instr_command_end(____instr_span)",
+                             ""))
             code.append(("return %s" % tmp_var,
                          ""))
         elif isinstance(node, IntermediateRepresentation.IRCommandNode):
@@ -188,6 +191,9 @@ class IntermediateRepresentation(object):
 
             code.append(("def %s(a, s):" % self.__func_name_generator.get_name(command),
                          "+"))
+            if is_instrumented:
+                code.append(("____instr_span = ____instr_command_begin('%s', %d, '%s', a, s)" % (command.filename, command.lineno, command),
+                             ""))
             if command.identifier:
                 code.append(("%s = %s" % (self.__var_name_generator.get_name(command.identifier, scope), \
                                           generate_function_call(command.function, scope)),
@@ -195,6 +201,9 @@ class IntermediateRepresentation(object):
             else:
                 code.append((generate_function_call(command.function, scope),
                              ""))
+            if is_instrumented:
+                code.append(("____instr_command_end(____instr_span)",
+                             ""))
 
             for child in node.children:
                 more_code = self.__generate_code(child,
@@ -204,17 +213,8 @@ class IntermediateRepresentation(object):
                 code.extend(more_code)
 
             code.append((None, "-"))
-            if is_instrumented:
-                value_var = self.__var_name_generator.get_name(command, scope)
-                code.append(("____instr_command_begin('%s', %d, '%s', a, s)" % (command.filename, command.lineno, command),
-                             ""))
-                code.append(("%s = %s(a, s)" % (value_var, self.__func_name_generator.lookup_name(command)),
-                             ""))
-                code.append(("return %s" % value_var,
-                             ""))
-            else:
-                code.append(("return %s(a, s)" % self.__func_name_generator.lookup_name(command),
-                             ""))
+            code.append(("return %s(a, s)" % self.__func_name_generator.lookup_name(command),
+                         ""))
         elif isinstance(node, IntermediateRepresentation.IRIfNode):
             # If command action code generation
             if_command = node.object
@@ -294,8 +294,18 @@ class IntermediateRepresentation(object):
 @multimethodclass
 class DoExecutorVisitor(ExecutorVisitor):
     __INSTRUMENTATION_FUNCTION = "import sys, threading, datetime\n" \
+                                 "try:\n" \
+                                 "  import pcl.runtime.trace as ____trace\n" \
+                                 "except ImportError:\n" \
+                                 "  ____trace = None\n" \
                                  "def ____instr_command_begin(filename, lineno, cmd_type, a, s):\n" \
-                                 "  print >> sys.stderr, '%s: %s: Component %s begining %s, at line %d (%s), with input %s and state %s' % (datetime.datetime.now().strftime('%x %X.%f'), threading.current_thread().name, get_name(), cmd_type, lineno, filename, a, {skey : s[skey] for skey in filter(lambda k: k != '____prev_', s.keys())})\n"
+                                 "  tracer = ____trace.get_tracer() if ____trace else None\n" \
+                                 "  if tracer is not None:\n" \
+                                 "    return tracer.begin_command(get_name(), filename, lineno, cmd_type)\n" \
+                                 "  print >> sys.stderr, '%s: %s: Component %s begining %s, at line %d (%s), with input %s and state %s' % (datetime.datetime.now().strftime('%x %X.%f'), threading.current_thread().name, get_name(), cmd_type, lineno, filename, a, {skey : s[skey] for skey in filter(lambda k: k != '____prev_', s.keys())})\n" \
+                                 "def ____instr_command_end(span):\n" \
+                                 "  if span is not None:\n" \
+                                 "    span.end()\n"
 
     __VAR_NAME_PREFIX = "____tmp"
     __FUNC_NAME_PREFIX = "____func"
@@ -364,6 +374,10 @@ class DoExecutorVisitor(ExecutorVisitor):
                                                         for i in self._module.resolution_symbols['configuration']]),
                              ["args"])
 
+        # The parallel width function: a leaf component's commands are sequential
+        self._write_function("get_parallel_width",
+                             "return 1")
+
     @multimethod(object)
     def visit(self, nowt):
         func_defs = self.__ir.generate_code(self, self._is_instrumented)
@@ -23,6 +23,7 @@ import os
 import sys
 import types
 
+from build.signatures import find_module_filename, get_signature_index
 from multimethod import multimethod, multimethodclass
 from parser.import_spec import Import
 from parser.command import Function, Command, Return, IfCommand, LetCommand
@@ -91,14 +92,99 @@ type_formatting_fn = lambda c: "(%s), (%s)" % (", ".join([i.identifier for i in
 
 @multimethodclass
 class FirstPassResolverVisitor(ResolverVisitor):
+    # Imported modules, and the function specifications of runtime modules,
+    # are kept, by the absolute filename of their source, with its
+    # modification time. Long running compilers re-import a module only
+    # when it changes, and same named modules in other directories are not
+    # mistaken for one another.
+    __imported_modules = dict()
+
     def __init__(self, pcl_import_path = []):
         ResolverVisitor.__init__(self)
+        self.__dependencies = list()
         self.__pcl_import_paths = list()
         if pcl_import_path is not None:
             if pcl_import_path:
                 self.__pcl_import_paths.extend(pcl_import_path.split(":"))
             self.__pcl_import_paths.append(".")
-            sys.path.extend(self.__pcl_import_paths)
+            self.__pcl_import_paths = [os.path.abspath(p) for p in self.__pcl_import_paths]
+
+    def __extend_sys_path(self):
+        """Adds the import paths to the Python path, whilst resolving an import, and returns the paths added."""
+        added_paths = list()
+        for p in self.__pcl_import_paths:
+            if p not in sys.path:
+                sys.path.append(p)
+                added_paths.append(p)
+        return added_paths
+
+    @staticmethod
+    def __restore_sys_path(added_paths):
+        for p in added_paths:
+            if p in sys.path:
+                sys.path.remove(p)
+
+    @staticmethod
+    def __source_filename(filename):
+        return os.path.splitext(os.path.abspath(filename))[0] if filename else None
+
+    @staticmethod
+    def __source_mtime(module):
+        filename = getattr(module, '__file__', None)
+        if filename:
+            if filename.endswith(('.pyc', '.pyo')):
+                filename = filename[:-1]
+            try:
+                return os.path.getmtime(filename)
+            except OSError:
+                pass
+        return None
+
+    @staticmethod
+    def __forget_other_modules(module_name):
+        # Drop loaded modules, and their packages, of the same name which
+        # are not the ones on the import path, e.g., those imported whilst
+        # compiling in another directory
+        names = module_name.split(".")
+        for i in xrange(len(names), 0, -1):
+            name = ".".join(names[:i])
+            loaded = sys.modules.get(name)
+            if loaded is not None and \
+               FirstPassResolverVisitor.__source_filename(getattr(loaded, '__file__', None)) != \
+               FirstPassResolverVisitor.__source_filename(find_module_filename(name)):
+                del sys.modules[name]
+
+    @staticmethod
+    def __import_module(module_name, import_fn):
+        filename = find_module_filename(module_name)
+        key = FirstPassResolverVisitor.__source_filename(filename) or module_name
+        entry = FirstPassResolverVisitor.__imported_modules.get(key)
+        if entry is not None:
+            sys.modules[module_name] = entry['module']
+            if FirstPassResolverVisitor.__source_mtime(entry['module']) == entry['mtime']:
+                return entry
+            module = reload(entry['module'])
+        else:
+            if filename is not None:
+                FirstPassResolverVisitor.__forget_other_modules(module_name)
+            module = import_fn()
+
+        entry = {'module' : module,
+                 'mtime' : FirstPassResolverVisitor.__source_mtime(module)}
+        FirstPassResolverVisitor.__imported_modules[key] = entry
+        return entry
+
+    def get_dependencies(self):
+        """Returns the source files of the imported modules."""
+        return tuple(self.__dependencies)
+
+    def __add_dependency(self, filename):
+        if filename:
+            if filename.endswith(('.pyc', '.pyo')):
+                filename = filename[:-1]
+            filename = os.path.abspath(filename)
+            if filename not in self.__dependencies:
+                self.__dependencies.append(filename)
 
     @staticmethod
     def __check_scalar_or_tuple_collection(collection):
@@ -227,8 +313,13 @@ class FirstPassResolverVisitor(ResolverVisitor):
                                         'lineno' : i.lineno,
                                         'alias' : i.alias})
         else:
-            # Resolve the import
-            module_spec = self.__resolve_import(an_import)
+            # Resolve the import, with the import paths on the Python path
+            # only whilst doing so
+            added_paths = self.__extend_sys_path()
+            try:
+                module_spec = self.__resolve_import(an_import)
+            finally:
+                FirstPassResolverVisitor.__restore_sys_path(added_paths)
 
             # Always add the module alias as a key to the import dictionary
             import_symbol_dict[an_import.alias] = module_spec
@@ -237,9 +328,22 @@ class FirstPassResolverVisitor(ResolverVisitor):
             self._module.resolution_symbols['used_imports'][an_import.alias] = (an_import, False)
 
     def __resolve_runtime_import(self, an_import):
+        module_name = str(an_import.module_name)
+
+        # Use the recorded function signatures, if the module is unchanged,
+        # rather than importing it
+        signature_index = get_signature_index()
+        indexed = signature_index.lookup(module_name) if signature_index else None
+        if indexed is not None:
+            filename, funcs_and_specs = indexed
+            self.__add_dependency(filename)
+            return self.__build_runtime_module_spec(an_import, funcs_and_specs)
+
         imported_module = None
         try:
-            imported_module = __import__(str(an_import.module_name), globals(), locals(), ['*'], -1)
+            imported_entry = FirstPassResolverVisitor.__import_module(module_name,
+                                                                      lambda: __import__(module_name, globals(), locals(), ['*'], -1))
+            imported_module = imported_entry['module']
         except Exception as ie:
             self._add_errors("ERROR: %(filename)s at line %(lineno)d, error importing " \
                              "module %(module_name)s: %(exception)s",
@@ -249,24 +353,38 @@ class FirstPassResolverVisitor(ResolverVisitor):
                                         'module_name' : i.module_name,
                                         'exception' : str(ie)})
 
+        if not imported_module:
+            return {}
+
+        self.__add_dependency(getattr(imported_module, '__file__', None))
+        if 'funcs_and_specs' not in imported_entry:
+            imported_entry['funcs_and_specs'] = [(o[0], inspect.getargspec(o[1])) \
+                                                 for o in inspect.getmembers(imported_module, \
+                                                                             lambda t: inspect.isfunction(t))]
+            if signature_index:
+                signature_index.record(module_name, imported_module, imported_entry['funcs_and_specs'])
+                try:
+                    signature_index.save()
+                except (IOError, OSError):
+                    # The index only saves imports; compile regardless
+                    pass
+        return self.__build_runtime_module_spec(an_import, imported_entry['funcs_and_specs'])
+
+    def __build_runtime_module_spec(self, an_import, funcs_and_specs):
         module_spec = {}
-        if imported_module:
-            funcs_and_specs = [(o[0], inspect.getargspec(o[1])) \
-                               for o in inspect.getmembers(imported_module, \
-                                                           lambda t: inspect.isfunction(t))]
-            for k, v in funcs_and_specs:
-                if v.keywords:
-                    self._add_warnings("WARNING: %(filename)s at line %(lineno)d, " \
-                                       "dropping function %(func_name)s imported " \
-                                       "from module %(module_name)s since arguments " \
-                                       "are unsupported.",
-                                       [k],
-                                       lambda n: {'filename' : an_import.filename,
-                                                  'lineno' : an_import.lineno,
-                                                  'func_name' : k,
-                                                  'module_name' : an_import.module_name})
-                else:
-                    module_spec[k] = v
+        for k, v in funcs_and_specs:
+            if v.keywords:
+                self._add_warnings("WARNING: %(filename)s at line %(lineno)d, " \
+                                   "dropping function %(func_name)s imported " \
+                                   "from module %(module_name)s since arguments " \
+                                   "are unsupported.",
+                                   [k],
+                                   lambda n: {'filename' : an_import.filename,
+                                              'lineno' : an_import.lineno,
+                                              'func_name' : k,
+                                              'module_name' : an_import.module_name})
+            else:
+                module_spec[k] = v
 
         return module_spec
 
@@ -275,12 +393,13 @@ class FirstPassResolverVisitor(ResolverVisitor):
         module_spec = {'module_name_id' : an_import.module_name}
         imported_module = None
         try:
-            imported_module = __import__(str(an_import.module_name),
-                                         fromlist = ['get_inputs',
-                                                     'get_outputs',
-                                                     'get_configuration',
-                                                     'configure',
-                                                     'initialise'])
+            imported_module = FirstPassResolverVisitor.__import_module(str(an_import.module_name),
+                                                                       lambda: __import__(str(an_import.module_name),
+                                                                                          fromlist = ['get_inputs',
+                                                                                                      'get_outputs',
+                                                                                                      'get_configuration',
+                                                                                                      'configure',
+                                                                                                      'initialise']))['module']
         except Exception as ie:
             self._add_errors("ERROR: %(filename)s at line %(lineno)d, error importing " \
                              "module %(module_name)s: %(exception)s",
@@ -298,6 +417,7 @@ class FirstPassResolverVisitor(ResolverVisitor):
         # Was the module imported?
         if imported_module:
             # Yes!
+            self.__add_dependency(getattr(imported_module, '__file__', None))
             try:
                 get_inputs_fn = getattr(imported_module, 'get_inputs')
             except AttributeError:
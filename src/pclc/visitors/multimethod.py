@@ -21,12 +21,21 @@
 #
 registry = {}
 class_registry = {}
+dispatch_cache = {}
 
 def __make_key(klass, types):
     keys = [klass]
     keys.extend(types)
     return tuple(keys)
 
+def __find_method(target_class, arg_types):
+    for klass in target_class.__mro__:
+        keys = __make_key(klass, arg_types)
+        if registry.has_key(keys):
+            return registry[keys]
+    raise LookupError("Method not registered on class %s for type %s" % \
+                      (target_class, list(arg_types)))
+
 #
 # Decorate methods with this, whose arguments are the types
 #
@@ -35,19 +44,26 @@ def multimethod(*types):
         global class_registry
         class_registry[types] = method
         def wrapper(target_obj, *args, **kwargs):
-            global registry
-            target_method = None
-            for klass in target_obj.__class__.__mro__:
-                keys = __make_key(klass, [arg.__class__ for arg in args])
-                if registry.has_key(keys):
-                    target_method = registry[keys]
-                    return target_method(target_obj, *args, **kwargs)
-            if not target_method:
-                raise LookupError("Method not registered on class %s for type %s" % \
-                                  (type(target_obj), [arg.__class__ for arg in args]))
+            # The method for a target and argument class pair is looked up once
+            if len(args) == 1:
+                key = (target_obj.__class__, args[0].__class__)
+            else:
+                key = (target_obj.__class__,) + tuple([arg.__class__ for arg in args])
+            try:
+                target_method = dispatch_cache[key]
+            except KeyError:
+                target_method = __find_method(key[0], key[1:])
+                dispatch_cache[key] = target_method
+            return target_method(target_obj, *args, **kwargs)
         return wrapper
     return decorator
 
+#
+# Forget the methods looked up by the multi-method decorator
+#
+def clear_dispatch_cache():
+    dispatch_cache.clear()
+
 #
 # Decorate the class whose methods are decorated with the multi-method decorator
 #
@@ -56,4 +72,6 @@ def multimethodclass(klass):
     registrations = {__make_key(klass, types) : class_registry[types] for types in class_registry}
     registry.update(registrations)
     class_registry = {}
+    # New registrations may override methods already looked up for subclasses
+    clear_dispatch_cache()
     return klass
@@ -60,29 +60,80 @@ from executor_visitor import ExecutorVisitor
 from scoped_name_generator import ScopedNameGenerator
 
 
+# Decorator to generate the arrows of the branches of if-expressions, whose
+# conditions are on configuration, in functions which are only called for
+# the branch taken
+def specialise_branches(method):
+    def specialise_branches_wrapper(target_obj, expr):
+        target_obj._begin_expression(expr)
+        method(target_obj, expr)
+        target_obj._end_expression(expr)
+
+    return specialise_branches_wrapper
+
+
 @multimethodclass
 class PCLExecutorVisitor(ExecutorVisitor):
     __IMPORTS = "from pypeline.helpers.parallel_helpers import cons_function_component, cons_wire, cons_split_wire, cons_unsplit_wire, cons_if_component\n" \
                 "from pypeline.core.arrows.kleisli_arrow import KleisliArrow\n" \
                 "from pypeline.core.arrows.kleisli_arrow_choice import KleisliArrowChoice\n" \
                 "from pypeline.core.types.either import Left, Right\n" \
-                "from pypeline.core.types.state import return_\n"
+                "from pypeline.core.types.state import State, return_\n"
     __INSTRUMENTATION_FUNCTIONS = "import sys, threading, datetime\n" \
-                                  "def ____instr_component(component_decl_id, component_id, event, a, s):\n" \
-                                  "  print >> sys.stderr, '%s: %s: Component %s is %s %s (id = %s) with input %s and state %s' % (datetime.datetime.now().strftime('%x %X.%f'), threading.current_thread().name, get_name(), event, component_decl_id, component_id, a, {skey : s[skey] for skey in filter(lambda k: k != '____prev_', s.keys())})\n" \
-                                  "  return a\n"\
+                                  "try:\n" \
+                                  "  import pcl.runtime.trace as ____trace\n" \
+                                  "except ImportError:\n" \
+                                  "  ____trace = None\n" \
+                                  "def ____instr_component_begin(component_decl_id, component_id, a, s):\n" \
+                                  "  tracer = ____trace.get_tracer() if ____trace else None\n" \
+                                  "  if tracer is not None:\n" \
+                                  "    return (a, tracer.begin_component(get_name(), component_decl_id, component_id), s)\n" \
+                                  "  print >> sys.stderr, '%s: %s: Component %s is %s %s (id = %s) with input %s and state %s' % (datetime.datetime.now().strftime('%x %X.%f'), threading.current_thread().name, get_name(), 'starting', component_decl_id, component_id, a, {skey : s[skey] for skey in filter(lambda k: k != '____prev_', s.keys())})\n" \
+                                  "  return (a, None, s)\n" \
+                                  "def ____instr_component_end(component_decl_id, component_id, t, b):\n" \
+                                  "  if b[1] is not None:\n" \
+                                  "    b[1].end()\n" \
+                                  "  else:\n" \
+                                  "    print >> sys.stderr, '%s: %s: Component %s is %s %s (id = %s) with input %s and state %s' % (datetime.datetime.now().strftime('%x %X.%f'), threading.current_thread().name, get_name(), 'finishing', component_decl_id, component_id, t, {skey : b[2][skey] for skey in filter(lambda k: k != '____prev_', b[2].keys())})\n" \
+                                  "  return t\n" \
                                   "def ____instr_component_construction(component_decl_id, component_id, component_config, invoked_component, decl_line_no):\n" \
                                   "  print >> sys.stderr, '%s: %s: Component %s is constructing %s (id = %s) with configuration %s (%s instance declared at line %d)' % (datetime.datetime.now().strftime('%x %X.%f'), threading.current_thread().name, get_name(), component_decl_id, component_id, component_config, invoked_component, decl_line_no)\n"
 
+    # Evaluates an arrow in the state mapped from the current state, which is
+    # then restored, in one arrow without keeping the current state in the
+    # mapped one
+    __SCOPED_STATE_FUNCTIONS = "def ____scope_state(state_mutator, arrow):\n" \
+                               "  return KleisliArrow(return_, lambda a: State(lambda s: (State.evalState(KleisliArrow.runKleisli(arrow, a), state_mutator(s)), s)))\n"
+
+    __CACHE_IMPORTS = "import pcl.runtime.cache as ____cache\n"
+    __JOURNAL_IMPORTS = "import pcl.runtime.journal as ____journal\n"
+    __SCHEDULER_IMPORTS = "import pcl.runtime.scheduler as ____scheduler\n"
+
     __COMP_NAME_PREFIX = "____comp"
+    __BRANCH_NAME_PREFIX = "____branch"
 
-    def __init__(self, filename_root, is_instrumented = False):
+    def __init__(self, filename_root, is_instrumented = False, is_cached = False, is_journalled = False, is_scheduled = False, is_specialised = False):
         self.__comp_name_generator = ScopedNameGenerator(PCLExecutorVisitor.__COMP_NAME_PREFIX)
+        self.__branch_name_generator = ScopedNameGenerator(PCLExecutorVisitor.__BRANCH_NAME_PREFIX)
         ExecutorVisitor.__init__(self,
                                  filename_root,
                                  self.__comp_name_generator,
-                                 PCLExecutorVisitor.__IMPORTS,
+                                 PCLExecutorVisitor.__IMPORTS + \
+                                 (PCLExecutorVisitor.__CACHE_IMPORTS if is_cached else "") + \
+                                 (PCLExecutorVisitor.__JOURNAL_IMPORTS if is_journalled else "") + \
+                                 (PCLExecutorVisitor.__SCHEDULER_IMPORTS if is_scheduled else ""),
                                  is_instrumented)
+        self.__is_cached = is_cached
+        self.__is_journalled = is_journalled
+        self.__is_scheduled = is_scheduled
+        self.__is_specialised = is_specialised
+        # Branches of if-expressions with conditions on configuration: the
+        # branches starting at an expression, the branch function names and
+        # the declarations only constructed in a branch
+        self.__branch_starts = dict()
+        self.__branch_names = dict()
+        self.__branch_declarations = dict()
+        self.__declaration_statements = dict()
         if self._is_instrumented:
             self._write_line(PCLExecutorVisitor.__INSTRUMENTATION_FUNCTIONS)
         self._write_line()
@@ -112,6 +163,11 @@ class PCLExecutorVisitor(ExecutorVisitor):
                                                             [str(i) for i in c[1]])) \
                                              if isinstance(c, tuple) else str([str(i) for i in c]))
 
+        # Declarations with configuration mappings are evaluated in their own state
+        if [decl for decl in self._module.resolution_symbols['components'] if decl.configuration_mappings]:
+            self._write_line()
+            self._write_line(PCLExecutorVisitor.__SCOPED_STATE_FUNCTIONS)
+
         # The get name function. This is not strictly needed but is included for completeness
         self._write_line()
         self._write_line()
@@ -148,9 +204,7 @@ class PCLExecutorVisitor(ExecutorVisitor):
                                                                (cm.to, \
                                                                 "config['%s']" % cm.from_ \
                                                                 if isinstance(cm.from_, Identifier) \
-                                                                else cm.from_.value.__repr__() \
-                                                                if isinstance(cm.from_.value, str) \
-                                                                else m.literal) \
+                                                                else cm.from_.value.__repr__()) \
                                                                 for cm in decl.configuration_mappings]))) \
                                          for decl in self._module.resolution_symbols['components']]
         # The initialise function
@@ -164,16 +218,31 @@ class PCLExecutorVisitor(ExecutorVisitor):
                                  "else cons_function_component(%(id)s)" % \
                                  {'id' : decl.identifier} \
                                  for decl in self._module.resolution_symbols['components']]
+        # Wait for the resources the declaration requires
+        component_scheduler_wrappers = ["%(id)s = ____scheduler.schedule_component(get_name(), '%(id)s', %(id)s)" % \
+                                        {'id' : decl.identifier} \
+                                        if self.__is_scheduled else None \
+                                        for decl in self._module.resolution_symbols['components']]
+        # Look up outputs in the component cache
+        component_cache_wrappers = ["%(id)s = ____cache.cache_component(get_name(), '%(id)s', ____%(comp_alias)s, %(id)s_configuration, %(id)s)" % \
+                                    {'id' : decl.identifier,
+                                     'comp_alias' : decl.component_alias} \
+                                    if self.__is_cached else None \
+                                    for decl in self._module.resolution_symbols['components']]
+        # Record, and replay, outputs in the run's journal
+        component_journal_wrappers = ["%(id)s = ____journal.journal_component(get_name(), '%(id)s', ____%(comp_alias)s, %(id)s_configuration, %(id)s)" % \
+                                      {'id' : decl.identifier,
+                                       'comp_alias' : decl.component_alias} \
+                                      if self.__is_journalled else None \
+                                      for decl in self._module.resolution_symbols['components']]
         # Wrap this component with any state conversion components
-        state_wrappers = ["%(id)s = ((cons_function_component(lambda a, s: a, state_mutator = lambda s: {%(state)s, '____prev_' : s})) >> %(id)s) >> cons_function_component(lambda a, s: a, state_mutator = lambda s: s['____prev_'])" % \
+        state_wrappers = ["%(id)s = ____scope_state(lambda s: {%(state)s}, %(id)s)" % \
                           {'id' : decl.identifier,
                            'state' : "%s" % (", ".join(["'%s' : %s" % \
                                                         (cm.to, \
                                                         "s['%s']" % cm.from_ \
                                                         if isinstance(cm.from_, Identifier) \
-                                                        else cm.from_.value.__repr__() \
-                                                        if isinstance(cm.from_.value, str) \
-                                                        else m.literal) \
+                                                        else cm.from_.value.__repr__()) \
                                                         for cm in decl.configuration_mappings]))} if decl.configuration_mappings else ""
                           for decl in self._module.resolution_symbols['components']]
         # Do we generate instrumented code?
@@ -183,16 +252,22 @@ class PCLExecutorVisitor(ExecutorVisitor):
                                   {'id' : decl.identifier} \
                                   for decl in self._module.resolution_symbols['components']]
             # Instrument component construction
-            component_init_instrumentation_exprs = ["____instr_component_construction('%(id)s', %(id)s_id, %(id)s_configuration, ____%(comp_alias)s.get_name(), %(decl_line_no)d)" % \
+            component_init_instrumentation_exprs = ["____instr_component_construction('%(path)s', %(id)s_id, %(id)s_configuration, ____%(comp_alias)s.get_name(), %(decl_line_no)d)" % \
                                                     {'id' : decl.identifier,
+                                                     'path' : decl.get_path(),
                                                      'comp_alias' : decl.component_alias,
                                                      'decl_line_no' : decl.lineno} \
                                                     for decl in self._module.resolution_symbols['components']]
-            # Wrap with instrumentation
-            component_instrumentation_exprs = ["%(id)s = ((cons_function_component(lambda a, s: ____instr_component('%(id)s', %(id)s_id, 'starting', a, s)) >> " \
-                                               "%(id)s) >> " \
-                                               "cons_function_component(lambda a, s: ____instr_component('%(id)s', %(id)s_id, 'finishing', a, s)))" % \
+            # Wrap with instrumentation. The start of the evaluation,
+            # (inputs, span, state), is split around the component so that it
+            # is paired with its finish. Spans of components which fail are
+            # ended by the tracer, see pcl.runtime.trace.
+            component_instrumentation_exprs = ["%(id)s = (cons_function_component(lambda a, s: ____instr_component_begin('%(path)s', %(id)s_id, a, s)) >> " \
+                                               "cons_split_wire() >> " \
+                                               "(cons_function_component(lambda l, s: l[0]) >> %(id)s).first() >> " \
+                                               "cons_unsplit_wire(lambda t, b: ____instr_component_end('%(path)s', %(id)s_id, t, b)))" % \
                                                {'id' : decl.identifier,
+                                                'path' : decl.get_path(),
                                                 'comp_alias' : decl.component_alias,
                                                 'decl_line_no' : decl.lineno} \
                                                for decl in self._module.resolution_symbols['components']]
@@ -200,6 +275,9 @@ class PCLExecutorVisitor(ExecutorVisitor):
             decl_zipper = zip(component_configuration_exprs,
                               component_initialisations,
                               component_decl_guards,
+                              component_scheduler_wrappers,
+                              component_cache_wrappers,
+                              component_journal_wrappers,
                               component_id_exprs,
                               component_init_instrumentation_exprs,
                               component_instrumentation_exprs,
@@ -208,8 +286,20 @@ class PCLExecutorVisitor(ExecutorVisitor):
             decl_zipper = zip(component_configuration_exprs,
                               component_initialisations,
                               component_decl_guards,
+                              component_scheduler_wrappers,
+                              component_cache_wrappers,
+                              component_journal_wrappers,
                               state_wrappers)
-        initialise_fn = [t for triple in decl_zipper for t in triple]
+        # Declarations used in only one branch of an if-expression on
+        # configuration are constructed in that branch
+        if self.__is_specialised:
+            self.__find_configuration_branches(self._module.definition.definition)
+        initialise_fn = list()
+        for decl, statements in zip(self._module.resolution_symbols['components'], decl_zipper):
+            if str(decl.identifier) in self.__declaration_statements:
+                self.__declaration_statements[str(decl.identifier)] = statements
+            else:
+                initialise_fn.extend(statements)
         # Store variables in variable table
         for decl in self._module.resolution_symbols['components']:
             self._variable_generator.register_name(IdentifierExpression(None,
@@ -227,19 +317,150 @@ class PCLExecutorVisitor(ExecutorVisitor):
 
     @multimethod(object)
     def visit(self, nowt):
-        for expr in self._variable_generator.iter_names():
-            if expr.parent == None:
-                self._write_line()
-                self._write_line("return %s" % self._variable_generator.lookup_name(expr))
-                break        
+        # The root expression may be a declared component, e.g., once
+        # optimised, so look it up rather than search for it
+        self._write_line()
+        self._write_line("return %s" % self._variable_generator.lookup_name(self._module.definition.definition))
+
+        # The arrow graph function: the structure of the component's arrow
+        # expression for run-time analysis
+        self._write_line()
+        # Components are named by their declaration paths, as they are traced
+        paths = dict([(str(decl.identifier), decl.get_path()) \
+                      for decl in self._module.resolution_symbols['components']])
+        self._write_function("get_arrow_graph",
+                             "return %s" % \
+                             repr(PCLExecutorVisitor.__build_arrow_graph(self._module.definition.definition, paths)))
+
+        # The parallel width function: the maximum number of components
+        # which can be evaluated at once, including imported components
+        aliases = dict([(str(decl.identifier), decl.component_alias) \
+                        for decl in self._module.resolution_symbols['components']])
+        self._write_function("get_parallel_width",
+                             "return max(1, %s)" % \
+                             PCLExecutorVisitor.__build_parallel_width(self._module.definition.definition, aliases))
         self._object_file.close()
 
+    @staticmethod
+    def __build_parallel_width(expr, aliases):
+        if isinstance(expr, IdentifierExpression):
+            # Modules compiled by earlier versions of pclc have no width
+            return "getattr(____%s, 'get_parallel_width', lambda: 1)()" % aliases[str(expr.identifier)]
+        elif isinstance(expr, (CompositionExpression, IfExpression)):
+            operands = (expr.left, expr.right) if isinstance(expr, CompositionExpression) else (expr.then, expr.else_)
+            return "max(%s)" % ", ".join([PCLExecutorVisitor.__build_parallel_width(e, aliases) for e in operands])
+        elif isinstance(expr, (ParallelWithTupleExpression, ParallelWithScalarExpression)):
+            return "(%s + %s)" % (PCLExecutorVisitor.__build_parallel_width(expr.left, aliases),
+                                  PCLExecutorVisitor.__build_parallel_width(expr.right, aliases))
+        elif isinstance(expr, UnaryExpression):
+            return PCLExecutorVisitor.__build_parallel_width(expr.expression, aliases)
+        else:
+            # Wires, splits and merges are not counted
+            return "0"
+
+    @staticmethod
+    def __build_arrow_graph(expr, paths):
+        if isinstance(expr, IdentifierExpression):
+            return ('component', paths.get(str(expr.identifier), str(expr.identifier)))
+        elif isinstance(expr, CompositionExpression):
+            operator = '>>>'
+        elif isinstance(expr, ParallelWithTupleExpression):
+            operator = '***'
+        elif isinstance(expr, ParallelWithScalarExpression):
+            operator = '&&&'
+        elif isinstance(expr, FirstExpression):
+            return ('first', PCLExecutorVisitor.__build_arrow_graph(expr.expression, paths))
+        elif isinstance(expr, SecondExpression):
+            return ('second', PCLExecutorVisitor.__build_arrow_graph(expr.expression, paths))
+        elif isinstance(expr, UnaryExpression):
+            return PCLExecutorVisitor.__build_arrow_graph(expr.expression, paths)
+        elif isinstance(expr, IfExpression):
+            return ('if',
+                    PCLExecutorVisitor.__build_arrow_graph(expr.then, paths),
+                    PCLExecutorVisitor.__build_arrow_graph(expr.else_, paths))
+        elif isinstance(expr, SplitExpression):
+            return ('split',)
+        elif isinstance(expr, MergeExpression):
+            return ('merge',)
+        else:
+            return ('wire',)
+
+        return (operator,
+                PCLExecutorVisitor.__build_arrow_graph(expr.left, paths),
+                PCLExecutorVisitor.__build_arrow_graph(expr.right, paths))
+
+    def __find_configuration_branches(self, root_expr):
+        references = dict()
+        self.__walk_configuration_branches(root_expr, [], references)
+        # A declaration is constructed in the innermost branch which
+        # contains all its uses
+        for identifier, uses in references.iteritems():
+            branches = uses[0]
+            for use in uses[1:]:
+                idx = 0
+                while idx < min(len(branches), len(use)) and branches[idx] is use[idx]:
+                    idx += 1
+                branches = branches[:idx]
+            if branches:
+                self.__branch_declarations.setdefault(id(branches[-1]), list()).append(identifier)
+                self.__declaration_statements[identifier] = None
+
+    def __walk_configuration_branches(self, expr, branches, references):
+        if isinstance(expr, IfExpression) and PCLExecutorVisitor.__is_configuration_condition(expr.condition):
+            for branch in (expr.then, expr.else_):
+                first_expr = branch
+                while isinstance(first_expr, (UnaryExpression, CompositionExpression, ParallelWithTupleExpression, ParallelWithScalarExpression, IfExpression)):
+                    first_expr = first_expr.expression if isinstance(first_expr, UnaryExpression) \
+                                 else first_expr.then if isinstance(first_expr, IfExpression) \
+                                 else first_expr.left
+                self.__branch_starts.setdefault(id(first_expr), list()).append(branch)
+                self.__walk_configuration_branches(branch, branches + [branch], references)
+        elif isinstance(expr, IfExpression):
+            self.__walk_configuration_branches(expr.then, branches, references)
+            self.__walk_configuration_branches(expr.else_, branches, references)
+        elif isinstance(expr, (CompositionExpression, ParallelWithTupleExpression, ParallelWithScalarExpression)):
+            self.__walk_configuration_branches(expr.left, branches, references)
+            self.__walk_configuration_branches(expr.right, branches, references)
+        elif isinstance(expr, UnaryExpression):
+            self.__walk_configuration_branches(expr.expression, branches, references)
+        elif isinstance(expr, IdentifierExpression):
+            references.setdefault(str(expr.identifier), list()).append(branches)
+
+    @staticmethod
+    def __is_configuration_condition(cond_expr):
+        if isinstance(cond_expr, TerminalConditionalExpression):
+            return isinstance(cond_expr.terminal, (StateIdentifier, Literal))
+        elif isinstance(cond_expr, ConditionalExpression):
+            return PCLExecutorVisitor.__is_configuration_condition(cond_expr.left) and \
+                   PCLExecutorVisitor.__is_configuration_condition(cond_expr.right)
+        elif isinstance(cond_expr, UnaryConditionalExpression):
+            return PCLExecutorVisitor.__is_configuration_condition(cond_expr.expression)
+        return False
+
+    def _begin_expression(self, expr):
+        # Open the functions of the branches starting at this expression
+        for branch in self.__branch_starts.get(id(expr), tuple()):
+            self.__branch_names[id(branch)] = self.__branch_name_generator.get_name(branch)
+            self._write_line("def %s():" % self.__branch_names[id(branch)])
+            self._incr_indent_level()
+            for identifier in self.__branch_declarations.get(id(branch), tuple()):
+                self._write_lines([(smt, "") for smt in self.__declaration_statements[identifier]])
+
+    def _end_expression(self, expr):
+        # Close the function of the branch this expression is
+        if id(expr) in self.__branch_names:
+            self._write_line("return %s" % self._variable_generator.lookup_name(expr))
+            self._decr_indent_level()
+            self._write_line()
+
     @multimethod(UnaryExpression)
+    @specialise_branches
     def visit(self, unary_expr):
         var_name = self._variable_generator.remove_name(unary_expr.expression)
         self._variable_generator.register_name(unary_expr, var_name)
 
     @multimethod(CompositionExpression)
+    @specialise_branches
     def visit(self, comp_expr):
         self._write_line("%s = %s >> %s" % \
                          (self._variable_generator.get_name(comp_expr),
@@ -247,6 +468,7 @@ class PCLExecutorVisitor(ExecutorVisitor):
                           self._variable_generator.lookup_name(comp_expr.right)))
 
     @multimethod(ParallelWithTupleExpression)
+    @specialise_branches
     def visit(self, para_tuple_expr):
         self._write_line("%s = %s ** %s" % \
                          (self._variable_generator.get_name(para_tuple_expr),
@@ -254,6 +476,7 @@ class PCLExecutorVisitor(ExecutorVisitor):
                           self._variable_generator.lookup_name(para_tuple_expr.right)))
         
     @multimethod(ParallelWithScalarExpression)
+    @specialise_branches
     def visit(self, para_scalar_expr):
         self._write_line("%s = %s & %s" % \
                          (self._variable_generator.get_name(para_scalar_expr),
@@ -261,23 +484,27 @@ class PCLExecutorVisitor(ExecutorVisitor):
                           self._variable_generator.lookup_name(para_scalar_expr.right)))
 
     @multimethod(FirstExpression)
+    @specialise_branches
     def visit(self, first_expr):
         self._write_line("%s = %s.first()" % \
                          (self._variable_generator.get_name(first_expr),
                           self._variable_generator.lookup_name(first_expr.expression)))
 
     @multimethod(SecondExpression)
+    @specialise_branches
     def visit(self, second_expr):
         self._write_line("%s = %s.second()" % \
                          (self._variable_generator.get_name(second_expr),
                           self._variable_generator.lookup_name(second_expr.expression)))
 
     @multimethod(SplitExpression)
+    @specialise_branches
     def visit(self, split_expr):
         self._write_line("%s = cons_split_wire()" % \
                          self._variable_generator.get_name(split_expr))
 
     @multimethod(MergeExpression)
+    @specialise_branches
     def visit(self, merge_expr):
         top_mappings = ["'%s' : t['%s']" % (m.to, m.from_) \
                         for m in merge_expr.top_mapping \
@@ -302,11 +529,13 @@ class PCLExecutorVisitor(ExecutorVisitor):
         return "cons_wire(lambda a, s: {%s})" % (", ".join(dict_repr))
     
     @multimethod(WireExpression)
+    @specialise_branches
     def visit(self, wire_expr):
         self._write_line("%s = %s" % (self._variable_generator.get_name(wire_expr),
                                       PCLExecutorVisitor.__build_wire_expr(wire_expr.mapping)))
 
     @multimethod(WireTupleExpression)
+    @specialise_branches
     def visit(self, wire_tuple_expr):
         self._write_line("%s = %s ** %s" % \
                          (self._variable_generator.get_name(wire_tuple_expr),
@@ -314,7 +543,17 @@ class PCLExecutorVisitor(ExecutorVisitor):
                           PCLExecutorVisitor.__build_wire_expr(wire_tuple_expr.bottom_mapping)))
 
     @multimethod(IfExpression)
+    @specialise_branches
     def visit(self, if_expr):
+        if id(if_expr.then) in self.__branch_names:
+            # Configuration is the state, so the branch is taken once
+            self._write_line("%s = %s() if (lambda s: %s)(config) else %s()" % \
+                             (self._variable_generator.get_name(if_expr),
+                              self.__branch_names[id(if_expr.then)],
+                              self._generate_condition(if_expr.condition),
+                              self.__branch_names[id(if_expr.else_)]))
+            return
+
         self._write_line("%s = cons_if_component(lambda a, s: %s, %s, %s)" % \
                          (self._variable_generator.get_name(if_expr),
                           self._generate_condition(if_expr.condition),
@@ -382,5 +621,6 @@ class PCLExecutorVisitor(ExecutorVisitor):
         pass
 
     @multimethod(IdentifierExpression)
+    @specialise_branches
     def visit(self, iden_expr):
         pass
@@ -0,0 +1,290 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import cPickle
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import types
+
+from pypeline.helpers.parallel_helpers import cons_function_component, cons_if_component, cons_split_wire, cons_unsplit_wire
+
+
+#
+# A content addressed cache of component outputs. A component's outputs
+# are stored on disk keyed by a hash of the component's identity, its
+# configuration and its inputs. Inputs which name files are hashed by
+# content. The cache is enabled when a component is compiled with
+# pclc --cache, and is controlled at run-time by the environment:
+#
+#   PCL_CACHE_DIR  - cache directory [default: ~/.pcl/cache]
+#   PCL_CACHE_SIZE - maximum size of the cache in bytes, with an optional
+#                    K, M or G suffix [default: 1G]
+#   PCL_NO_CACHE   - disables the cache if set to a non-empty value
+#
+__DEFAULT_CACHE_DIR = os.path.join("~", ".pcl", "cache")
+__DEFAULT_CACHE_SIZE = "1G"
+
+
+def parse_size(size):
+    """Converts a size, e.g., 512M, to bytes."""
+    m = re.match(r"^\s*(\d+)\s*([KMG]?)B?\s*$", str(size), re.IGNORECASE)
+    if m is None:
+        raise ValueError("Invalid cache size: %s" % size)
+    return int(m.group(1)) * {'' : 1, 'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30}[m.group(2).upper()]
+
+
+class FileHasher(object):
+    """Hashes file contents. Hashes are remembered by path, size and modification time so unchanged files are read once."""
+    def __init__(self):
+        self.__hashes = dict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def stat(path):
+        st = os.stat(path)
+        return (st.st_size, st.st_mtime)
+
+    def hash(self, path):
+        path = os.path.abspath(path)
+        signature = FileHasher.stat(path)
+        with self.__lock:
+            entry = self.__hashes.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        sha = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), ""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with self.__lock:
+            self.__hashes[path] = (signature, digest)
+        return digest
+
+
+class ComponentCache(object):
+    """A size bounded, least recently used, store of component outputs in a directory. A maximum size of None never evicts entries. Entries are written atomically so several processes may share a cache directory."""
+    __ENTRY_SUFFIX = ".entry"
+
+    def __init__(self, cache_dir, max_size):
+        self.__cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.__max_size = max_size
+        self.__file_hasher = FileHasher()
+        self.__lock = threading.Lock()
+        if not os.path.isdir(self.__cache_dir):
+            os.makedirs(self.__cache_dir)
+
+    def __canonical(self, value):
+        if isinstance(value, dict):
+            return "{%s}" % ", ".join(["%s: %s" % (self.__canonical(k), self.__canonical(value[k])) \
+                                       for k in sorted(value.keys())])
+        elif isinstance(value, (list, tuple)):
+            # Delimited, so nested sequences are not confused
+            return "%s(%s)" % (type(value).__name__,
+                               ", ".join([self.__canonical(v) for v in value]))
+        elif isinstance(value, basestring) and os.path.isfile(value):
+            return "file(%s)" % self.__file_hasher.hash(value)
+        elif isinstance(value, basestring) and os.path.isdir(value):
+            return "dir(%r, %r)" % (os.path.abspath(value), os.stat(value).st_mtime)
+        else:
+            return repr(value)
+
+    def make_key(self, identity, configuration, inputs):
+        """Returns the cache key of a component invocation."""
+        sha = hashlib.sha1()
+        for part in (identity, configuration, inputs):
+            sha.update(self.__canonical(part))
+            sha.update("\0")
+        return sha.hexdigest()
+
+    def __entry_filename(self, key):
+        return os.path.join(self.__cache_dir, key + ComponentCache.__ENTRY_SUFFIX)
+
+    def __output_files(self, value):
+        if isinstance(value, dict):
+            return [f for v in value.itervalues() for f in self.__output_files(v)]
+        elif isinstance(value, (list, tuple)):
+            return [f for v in value for f in self.__output_files(v)]
+        elif isinstance(value, basestring) and os.path.isfile(value):
+            return [(os.path.abspath(value), FileHasher.stat(value))]
+        return []
+
+    def get(self, key):
+        """Returns a (found, outputs) pair. An entry is only found if the files named in its outputs are unchanged since it was stored."""
+        filename = self.__entry_filename(key)
+        try:
+            with open(filename, "rb") as f:
+                output_files, outputs = cPickle.load(f)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return (False, None)
+
+        for path, signature in output_files:
+            try:
+                if FileHasher.stat(path) != signature:
+                    return (False, None)
+            except OSError:
+                return (False, None)
+
+        # Most recently used
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+        return (True, outputs)
+
+    def put(self, key, outputs):
+        """Stores the outputs of a component invocation and evicts least recently used entries if the cache is too big."""
+        try:
+            data = cPickle.dumps((self.__output_files(outputs), outputs), cPickle.HIGHEST_PROTOCOL)
+        except (cPickle.PicklingError, TypeError) as ex:
+            print >> sys.stderr, "WARNING: Component outputs cannot be cached: %s" % ex
+            return
+
+        fd, tmp_filename = tempfile.mkstemp(dir = self.__cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.rename(tmp_filename, self.__entry_filename(key))
+        except (IOError, OSError) as ex:
+            print >> sys.stderr, "WARNING: Failed to write cache entry: %s" % ex
+            try:
+                os.unlink(tmp_filename)
+            except OSError:
+                pass
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in its maximum size."""
+        if self.__max_size is None:
+            return
+
+        with self.__lock:
+            entries = list()
+            for filename in os.listdir(self.__cache_dir):
+                if not filename.endswith(ComponentCache.__ENTRY_SUFFIX):
+                    continue
+                path = os.path.join(self.__cache_dir, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+            total_size = sum([e[1] for e in entries])
+            for mtime, size, path in sorted(entries):
+                if total_size <= self.__max_size:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                total_size -= size
+
+
+__cache = None
+__cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the process' component cache, or None if caching is disabled."""
+    global __cache
+    if os.getenv("PCL_NO_CACHE"):
+        return None
+    with __cache_lock:
+        if __cache is None:
+            __cache = ComponentCache(os.getenv("PCL_CACHE_DIR", __DEFAULT_CACHE_DIR),
+                                     parse_size(os.getenv("PCL_CACHE_SIZE", __DEFAULT_CACHE_SIZE)))
+    return __cache
+
+
+# Modules installed with Python, e.g., the standard library and
+# site-packages, are assumed not to change between runs
+__PYTHON_PREFIXES = tuple(set([os.path.join(os.path.abspath(p), "") for p in (sys.prefix, sys.exec_prefix)]))
+
+
+def __module_source(module):
+    source_filename = getattr(module, "__file__", None)
+    if not source_filename:
+        return None
+    if source_filename.endswith((".pyc", ".pyo")):
+        source_filename = source_filename[:-1]
+    return os.path.abspath(source_filename)
+
+
+def component_sources(component_module):
+    """Returns the source files of a component's module and of the modules it uses, directly or indirectly, e.g., the modules of its child components and their Python helpers. Modules installed with Python are not included."""
+    sources = set()
+    visited = set()
+    to_visit = [component_module]
+    while to_visit:
+        module = to_visit.pop()
+        if id(module) in visited:
+            continue
+        visited.add(id(module))
+        source_filename = __module_source(module)
+        if source_filename is None or source_filename.startswith(__PYTHON_PREFIXES):
+            continue
+        sources.add(source_filename)
+        for value in vars(module).itervalues():
+            if isinstance(value, types.ModuleType):
+                to_visit.append(value)
+            elif isinstance(value, (types.FunctionType, types.ClassType, type)) and \
+                 getattr(value, "__module__", None) in sys.modules:
+                to_visit.append(sys.modules[value.__module__])
+    return sorted(sources)
+
+
+def component_identity(parent_name, decl_id, component_module):
+    """Returns the identity of a declared component: its parent component's name, its declaration identifier, the imported module and the source files it uses. The source files are hashed by content in cache keys, so a change to the component, or to any module it uses, changes its keys."""
+    return {'parent' : parent_name,
+            'declaration' : decl_id,
+            'module' : component_module.__name__,
+            'sources' : component_sources(component_module)}
+
+
+def cons_cached_component(cache, identity, configuration, arrow):
+    """Returns an arrow which looks up its inputs in the cache, evaluating and storing the outputs of the wrapped arrow on a miss."""
+    # Look up the inputs once: (inputs, key, (found, outputs))
+    def lookup(a, s):
+        key = cache.make_key(identity, configuration, a)
+        return (a, key, cache.get(key))
+
+    hit = cons_function_component(lambda l, s: l[2][1])
+    miss = cons_split_wire() >> \
+           (cons_function_component(lambda l, s: l[0]) >> arrow).first() >> \
+           cons_unsplit_wire(lambda t, b: cache.put(b[1], t) or t)
+    return cons_function_component(lookup) >> \
+           cons_if_component(lambda l, s: l[2][0], hit, miss)
+
+
+def cache_component(parent_name, decl_id, component_module, configuration, arrow):
+    """Wraps a declared component's arrow so its outputs are looked up in, and stored to, the component cache."""
+    cache = get_cache()
+    if cache is None:
+        return arrow
+
+    return cons_cached_component(cache,
+                                 component_identity(parent_name, decl_id, component_module),
+                                 configuration,
+                                 arrow)
@@ -0,0 +1,73 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import threading
+
+from cache import ComponentCache, component_identity, cons_cached_component
+
+
+#
+# A journal of the component outputs of one pipeline run. A run killed
+# part way through can be resumed: components whose outputs were
+# journalled are replayed from the journal rather than evaluated again.
+# The journal is enabled when a component is compiled with pclc --journal
+# and is written by pcl-run, which sets:
+#
+#   PCL_JOURNAL_DIR - directory of run journals [default: ~/.pcl/journal]
+#   PCL_RUN_ID      - identifier of the run; no journal is kept if unset
+#
+# The journal of a run is kept in PCL_JOURNAL_DIR/PCL_RUN_ID.
+#
+__DEFAULT_JOURNAL_DIR = os.path.join("~", ".pcl", "journal")
+
+__journals = dict()
+__journals_lock = threading.Lock()
+
+
+def get_journal_dir(run_id, journal_dir = None):
+    """Returns the directory in which a run's journal is kept."""
+    if journal_dir is None:
+        journal_dir = os.getenv("PCL_JOURNAL_DIR", __DEFAULT_JOURNAL_DIR)
+    return os.path.join(os.path.abspath(os.path.expanduser(journal_dir)), run_id)
+
+
+def get_journal():
+    """Returns the journal of the current run, or None if no journal is kept."""
+    run_id = os.getenv("PCL_RUN_ID")
+    if not run_id:
+        return None
+    with __journals_lock:
+        journal = __journals.get(run_id)
+        if journal is None:
+            # Journal entries are never evicted
+            journal = ComponentCache(get_journal_dir(run_id), None)
+            __journals[run_id] = journal
+    return journal
+
+
+def journal_component(parent_name, decl_id, component_module, configuration, arrow):
+    """Wraps a declared component's arrow so its outputs are recorded in the run's journal, and replayed from it when the run is resumed. Evaluations are identified by declaration and by their inputs, so each evaluation of a component is journalled separately."""
+    journal = get_journal()
+    if journal is None:
+        return arrow
+
+    return cons_cached_component(journal,
+                                 component_identity(parent_name, decl_id, component_module),
+                                 configuration,
+                                 arrow)
@@ -0,0 +1,150 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import multiprocessing
+import threading
+
+from cache import parse_size
+from concurrent.futures import ThreadPoolExecutor
+from pypeline.helpers.parallel_helpers import cons_function_component, eval_pipeline
+
+
+#
+# Resource aware dispatch of declared components. Capacities name the
+# resources available to a run, e.g., cpu=32,mem=64G,gpu-free-decoder=1,
+# and declarations are tagged with the resources they need whilst they
+# are evaluated, e.g., cpu=8,mem=16G,slots=gpu-free-decoder. A slots tag
+# takes one unit of each named resource. A component whose resources are
+# not available waits, holding its worker thread, whilst the rest of the
+# pipeline continues. A component holding resources is evaluated by its own
+# executor, so it finishes, and releases them, even if every worker of the
+# pipeline is waiting for resources.
+#
+# The scheduler is used by components compiled with pclc --schedule. It
+# must be configured, e.g., by pcl-run, before the components are
+# initialised.
+#
+class SchedulerError(Exception):
+    pass
+
+
+def parse_resources(text):
+    """Parses comma separated name=amount resources. Amounts may have a K, M or G suffix. The slots name may list several resource names, separated by '+', each needing one unit."""
+    resources = dict()
+    for item in [i.strip() for i in text.split(",") if i.strip()]:
+        if "=" not in item:
+            raise SchedulerError("Invalid resource %s, expected name=amount" % item)
+        name, amount = [i.strip() for i in item.split("=", 1)]
+        if name == "slots":
+            for slot in [s.strip() for s in amount.split("+") if s.strip()]:
+                resources[slot] = resources.get(slot, 0) + 1
+        else:
+            try:
+                resources[name] = resources.get(name, 0) + parse_size(amount)
+            except ValueError:
+                raise SchedulerError("Invalid amount of resource %s: %s" % (name, amount))
+    return resources
+
+
+class Scheduler(object):
+    """Grants resources to components while they are available."""
+    class Grant(object):
+        def __init__(self, scheduler, requirements):
+            self.__scheduler = scheduler
+            self.__requirements = requirements
+
+        def release(self):
+            self.__scheduler._release(self.__requirements)
+
+    def __init__(self, capacities, requirements):
+        self.__available = dict(capacities)
+        self.__requirements = dict()
+        self.__condition = threading.Condition()
+
+        for decl, required in requirements.iteritems():
+            unknown = [r for r in required if r not in capacities]
+            if unknown:
+                raise SchedulerError("Declaration %s requires unknown resources: %s" % (decl, ", ".join(unknown)))
+            exceeded = [r for r in required if required[r] > capacities[r]]
+            if exceeded:
+                raise SchedulerError("Declaration %s requires more resources than are available: %s" % \
+                                     (decl, ", ".join(exceeded)))
+            self.__requirements[decl] = required
+
+    def get_requirements(self, parent_name, decl_id):
+        """Returns the resources a declaration requires, by qualified, i.e., parent.declaration, or bare declaration identifier."""
+        return self.__requirements.get("%s.%s" % (parent_name, decl_id),
+                                       self.__requirements.get(decl_id))
+
+    def acquire(self, requirements):
+        """Waits until the resources are available and returns a grant to release them."""
+        with self.__condition:
+            while [r for r in requirements if self.__available[r] < requirements[r]]:
+                self.__condition.wait()
+            for r in requirements:
+                self.__available[r] -= requirements[r]
+        return Scheduler.Grant(self, requirements)
+
+    def _release(self, requirements):
+        with self.__condition:
+            for r in requirements:
+                self.__available[r] += requirements[r]
+            self.__condition.notify_all()
+
+
+__scheduler = None
+
+
+def configure(capacities, requirements):
+    """Configures the scheduler with the capacities of the resources and the requirements of declarations. Both are dictionaries of resource names to amounts; requirements are keyed by declaration."""
+    global __scheduler
+    __scheduler = Scheduler(capacities, requirements)
+    return __scheduler
+
+
+def get_scheduler():
+    """Returns the configured scheduler, or None."""
+    return __scheduler
+
+
+def cons_scheduled_component(scheduler, requirements, arrow):
+    """Returns an arrow which evaluates the wrapped arrow once the resources it requires are granted, and releases them when it finishes or fails."""
+    def evaluate(a, s):
+        grant = scheduler.acquire(requirements)
+        try:
+            executor = ThreadPoolExecutor(max_workers = multiprocessing.cpu_count())
+            try:
+                return eval_pipeline(executor, arrow, a, s)
+            finally:
+                executor.shutdown(False)
+        finally:
+            grant.release()
+
+    return cons_function_component(evaluate)
+
+
+def schedule_component(parent_name, decl_id, arrow):
+    """Wraps a declared component's arrow so it is only evaluated when the resources required by its declaration are available."""
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return arrow
+    requirements = scheduler.get_requirements(parent_name, decl_id)
+    if not requirements:
+        return arrow
+
+    return cons_scheduled_component(scheduler, requirements, arrow)
@@ -0,0 +1,156 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import itertools
+import json
+import os
+import threading
+import time
+
+
+#
+# Records the evaluation of instrumented components, i.e., compiled with
+# pclc -i, as Chrome trace events. Load the written JSON in chrome://tracing
+# or Perfetto. Do command function calls are complete events on the thread
+# which made them. Components are asynchronous events, since a component's
+# arrows can be evaluated on several threads, nested by their declarations.
+# A component's span is only ended when its evaluation succeeds; spans of
+# components which failed are ended with end_unfinished.
+#
+class Tracer(object):
+    class Span(object):
+        def __init__(self, tracer, event):
+            self.__tracer = tracer
+            self.__event = event
+
+        def end(self):
+            self.__tracer._end(self.__event)
+
+    def __init__(self):
+        self.__events = list()
+        self.__lock = threading.Lock()
+        self.__ids = itertools.count(1)
+        self.__unfinished = dict()
+        self.__threads = dict()
+        self.__pid = os.getpid()
+        self.__start_time = time.time()
+
+    def __now(self):
+        return int((time.time() - self.__start_time) * 1000000)
+
+    def __tid(self):
+        thread = threading.current_thread()
+        with self.__lock:
+            return self.__threads.setdefault(thread.ident, (len(self.__threads) + 1, thread.name))[0]
+
+    def __record(self, event):
+        with self.__lock:
+            self.__events.append(event)
+
+    def begin_component(self, parent_name, decl_id, component_id):
+        """Records the start of an evaluation of a declared component. Call end on the returned span when the evaluation finishes."""
+        event = {'name' : "%s.%s" % (parent_name, decl_id),
+                 'cat' : "component",
+                 'ph' : "b",
+                 'id' : next(self.__ids),
+                 'pid' : self.__pid,
+                 'tid' : self.__tid(),
+                 'ts' : self.__now(),
+                 'args' : {'component' : parent_name,
+                           'declaration' : decl_id,
+                           'instance' : component_id}}
+        with self.__lock:
+            self.__events.append(event)
+            self.__unfinished[event['id']] = event
+        return Tracer.Span(self, event)
+
+    def begin_command(self, component_name, filename, lineno, command):
+        """Records the start of a do command in a leaf component. Call end on the returned span, on the same thread, when the command finishes."""
+        event = {'name' : command,
+                 'cat' : "command",
+                 'ph' : "X",
+                 'pid' : self.__pid,
+                 'tid' : self.__tid(),
+                 'ts' : self.__now(),
+                 'args' : {'component' : component_name,
+                           'filename' : filename,
+                           'line' : lineno}}
+        return Tracer.Span(self, event)
+
+    def _end(self, event):
+        if event['ph'] == "X":
+            event['dur'] = self.__now() - event['ts']
+            self.__record(event)
+        else:
+            with self.__lock:
+                self.__unfinished.pop(event['id'], None)
+            self.__record(self.__make_end_event(event))
+
+    def __make_end_event(self, event):
+        return {'name' : event['name'],
+                'cat' : event['cat'],
+                'ph' : "e",
+                'id' : event['id'],
+                'pid' : self.__pid,
+                'tid' : self.__tid(),
+                'ts' : self.__now()}
+
+    def end_unfinished(self):
+        """Ends the spans of components whose evaluation has not finished, e.g., because it failed, marking them as failed. Returns the number of spans ended."""
+        with self.__lock:
+            unfinished = self.__unfinished.values()
+            self.__unfinished.clear()
+        for event in unfinished:
+            end_event = self.__make_end_event(event)
+            end_event['args'] = {'failed' : True}
+            self.__record(end_event)
+        return len(unfinished)
+
+    def get_events(self):
+        with self.__lock:
+            events = list(self.__events)
+            threads = self.__threads.items()
+        return events + [{'name' : "thread_name",
+                          'ph' : "M",
+                          'pid' : self.__pid,
+                          'tid' : tid,
+                          'args' : {'name' : name}} \
+                         for ident, (tid, name) in threads]
+
+    def write(self, filename):
+        """Writes the recorded events as Chrome trace event JSON."""
+        with open(filename, "w") as f:
+            json.dump({'traceEvents' : self.get_events(),
+                       'displayTimeUnit' : "ms"},
+                      f,
+                      default = str)
+
+
+__tracer = None
+
+
+def start_tracing():
+    """Starts recording instrumented components, in this process, and returns the tracer."""
+    global __tracer
+    __tracer = Tracer()
+    return __tracer
+
+
+def get_tracer():
+    """Returns the current tracer, or None if not tracing."""
+    return __tracer
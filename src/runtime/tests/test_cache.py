@@ -0,0 +1,81 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pcl.runtime.cache import ComponentCache, component_identity
+
+
+class ComponentCacheKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix = "pcl-cache-test-")
+        self.cache = ComponentCache(self.cache_dir, None)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors = True)
+
+    def test_nested_sequences_have_different_keys(self):
+        identity = {'parent' : 'p', 'declaration' : 'd', 'module' : 'm', 'sources' : []}
+        self.assertNotEqual(self.cache.make_key(identity, {}, {'x' : (('a',), 'b')}),
+                            self.cache.make_key(identity, {}, {'x' : (('a', 'b'),)}))
+        self.assertNotEqual(self.cache.make_key(identity, {}, {'x' : [[], []]}),
+                            self.cache.make_key(identity, {}, {'x' : [[[]]]}))
+
+    def test_equal_inputs_have_equal_keys(self):
+        identity = {'parent' : 'p', 'declaration' : 'd', 'module' : 'm', 'sources' : []}
+        self.assertEqual(self.cache.make_key(identity, {'c' : 1}, {'x' : (('a',), 'b'), 'y' : [1, 2]}),
+                         self.cache.make_key(identity, {'c' : 1}, {'y' : [1, 2], 'x' : (('a',), 'b')}))
+
+
+class ComponentIdentityTest(unittest.TestCase):
+    def setUp(self):
+        self.module_dir = tempfile.mkdtemp(prefix = "pcl-identity-test-")
+        self.cache = ComponentCache(os.path.join(self.module_dir, "cache"), None)
+        self.write("parent_component", "import child_component\n")
+        self.write("child_component", "from helper import double\n")
+        self.write("helper", "def double(x):\n  return 2 * x\n")
+        sys.path.insert(0, self.module_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.module_dir)
+        for name in ("parent_component", "child_component", "helper"):
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.module_dir, ignore_errors = True)
+
+    def write(self, module_name, source):
+        with open(os.path.join(self.module_dir, module_name + ".py"), "w") as f:
+            f.write(source)
+
+    def make_key(self):
+        module = __import__("parent_component")
+        return self.cache.make_key(component_identity("p", "d", module), {}, {'x' : 1})
+
+    def test_changed_transitive_imports_change_keys(self):
+        key = self.make_key()
+        self.write("helper", "def double(x):\n  return x + x  # Changed\n")
+        self.assertNotEqual(self.make_key(), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from concurrent.futures import ThreadPoolExecutor
+from pcl.runtime.scheduler import Scheduler, cons_scheduled_component
+from pypeline.helpers.parallel_helpers import cons_function_component, eval_pipeline
+
+
+class ScheduledComponentTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler({'gpu' : 1}, {'d' : {'gpu' : 1}})
+
+    def evaluate(self, arrow, value):
+        executor = ThreadPoolExecutor(max_workers = 1)
+        try:
+            return eval_pipeline(executor, arrow, value, None)
+        finally:
+            executor.shutdown(True)
+
+    def test_resources_are_released_when_component_fails(self):
+        def fail(a, s):
+            raise RuntimeError("component failed")
+        arrow = cons_scheduled_component(self.scheduler, {'gpu' : 1}, cons_function_component(fail))
+        self.assertRaises(RuntimeError, self.evaluate, arrow, 1)
+        # The single gpu must be available again, otherwise this waits forever
+        self.scheduler.acquire({'gpu' : 1}).release()
+
+    def test_components_are_evaluated_whilst_every_worker_waits(self):
+        arrow = cons_scheduled_component(self.scheduler,
+                                         {'gpu' : 1},
+                                         cons_function_component(lambda a, s: a + 1) >> \
+                                         cons_function_component(lambda a, s: a * 2))
+        self.assertEqual(self.evaluate(arrow >> arrow, 1), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#
+# Copyright Capita Translation and Interpreting 2013
+#
+# This file is part of Pipeline Creation Language (PCL).
+# 
+# Pipeline Creation Language (PCL) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# Pipeline Creation Language (PCL) is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with Pipeline Creation Language (PCL).  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pcl.runtime.trace import Tracer
+
+
+class TracerTest(unittest.TestCase):
+    def test_unfinished_components_are_ended_as_failed(self):
+        tracer = Tracer()
+        tracer.begin_component("p", "finished", 1).end()
+        tracer.begin_component("p", "failed", 2)
+        self.assertEqual(tracer.end_unfinished(), 1)
+        self.assertEqual(tracer.end_unfinished(), 0)
+
+        ends = [e for e in tracer.get_events() if e['ph'] == "e"]
+        self.assertEqual([(e['name'], e.get('args')) for e in ends],
+                         [("p.finished", None), ("p.failed", {'failed' : True})])
+
+
+if __name__ == '__main__':
+    unittest.main()